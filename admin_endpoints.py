@@ -1,8 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
+from typing import List, Optional
+import archive
 import models
 import schemas
-from auth import get_db, get_current_active_user as get_current_user, hash_password
+import admin_schemas
+from auth import Principal, get_db, get_current_active_user as get_current_user, get_current_admin, hash_password
+from database import slow_query_log
+from config import settings
 
 router = APIRouter()
 
@@ -10,7 +15,7 @@ router = APIRouter()
 def create_user_admin(
     user_data: schemas.AdminUserCreate,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Crear un nuevo usuario (Solo Admin)
@@ -53,3 +58,41 @@ def create_user_admin(
     db.refresh(new_user)
     
     return new_user
+
+
+@router.get("/admin/slow-queries", tags=["Admin"], response_model=List[admin_schemas.SlowQuery])
+def get_slow_queries(
+    limit: int = 50,
+    current_user: Principal = Depends(get_current_admin)
+):
+    """
+    Consultas más lentas de esta instancia, agrupadas por huella (solo admin)
+    
+    Solo se registran las que superan SLOW_QUERY_THRESHOLD_MS. Ordenadas por p95.
+    """
+    return slow_query_log.snapshot()[:limit]
+
+
+@router.delete("/admin/slow-queries", tags=["Admin"])
+def reset_slow_queries(current_user: Principal = Depends(get_current_admin)):
+    """Vaciar el registro de consultas lentas (solo admin)"""
+    slow_query_log.clear()
+    return {"message": "Registro de consultas lentas vaciado", "threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS}
+
+
+@router.post("/admin/archive-past-events", tags=["Admin"])
+def archive_past_events(
+    retention_days: Optional[int] = None,
+    max_batches: int = 10,
+    dry_run: bool = False,
+    current_user: Principal = Depends(get_current_admin)
+):
+    """
+    Mover a TICKET_ARCHIVE / PAGO_ARCHIVE los tickets de eventos pasados (solo admin)
+    
+    Por defecto retention_days = ARCHIVE_RETENTION_DAYS. Cada llamada archiva
+    como máximo max_batches lotes: repetir hasta que devuelva 0 tickets.
+    """
+    if retention_days is not None and retention_days < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="retention_days no puede ser negativo")
+    return archive.archive_past_events(retention_days=retention_days, max_batches=max_batches, dry_run=dry_run)
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from datetime import datetime
 from typing import Optional
 import schemas
 
@@ -31,3 +32,14 @@ class UserStatistics(BaseModel):
     promotor_count: int
     owner_count: int
     admin_count: int
+
+
+class SlowQuery(BaseModel):
+    """Estadísticas de una huella de consulta lenta (tiempos en ms)"""
+    fingerprint: str
+    count: int
+    total_ms: float
+    p50_ms: float
+    p95_ms: float
+    max_ms: float
+    last_seen: datetime
@@ -0,0 +1,202 @@
+"""
+Archivo de tickets y pagos de eventos pasados
+
+TICKET solo crece, y las consultas calientes (escaneo, recuentos, mis
+entradas) cargan con las entradas de eventos que terminaron hace meses. Los
+tickets de eventos anteriores a ARCHIVE_RETENTION_DAYS se mueven a
+TICKET_ARCHIVE, y sus pagos a PAGO_ARCHIVE:
+
+- Por lotes de ARCHIVE_BATCH_SIZE tickets, cada lote en su transacción
+  (copiar + borrar): un fallo a mitad no duplica ni pierde tickets
+- Los ids se conservan: PAGO_ARCHIVE.ticket_id sigue apuntando a su ticket
+- En Postgres cada lote toma un advisory lock: dos ejecuciones a la vez no
+  archivan el mismo lote
+- El contador de EVENT_CARD no cambia (las entradas siguen vendidas)
+
+Lecturas que incluyen el histórico: tickets_sold_counts() / count_tickets()
+/ scan_times() para contadores y estadísticas, ticket_code_exists() para
+no repetir códigos de ticket, y /tickets/my-tickets?include_history=true.
+
+Uso:
+    python archive.py [--retention-days 90] [--batch-size 5000] [--dry-run]
+"""
+import argparse
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import DateTime, delete, func, insert, literal, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+import cache
+import models
+from config import settings
+from database import engine
+
+logger = logging.getLogger("njoy.archive")
+
+tickets = models.Ticket.__table__
+pagos = models.Pago.__table__
+tickets_archive = models.TicketArchive.__table__
+pagos_archive = models.PagoArchive.__table__
+eventos = models.Evento.__table__
+
+# Clave del pg_advisory_xact_lock de cada lote
+_PG_LOCK_KEY = 7_204_118_292
+
+
+# ============================================
+# ARCHIVADO POR LOTES
+# ============================================
+
+def _pending(conn: Connection, cutoff: datetime):
+    """Tickets de eventos anteriores a cutoff que se pueden archivar"""
+    stmt = (
+        select(tickets.c.id)
+        .select_from(tickets.join(eventos, eventos.c.id == tickets.c.evento_id))
+        .where(eventos.c.fechayhora < cutoff)
+    )
+    if conn.dialect.name == "sqlite":
+        # Sin AUTOINCREMENT, SQLite reutiliza el id más alto si se borra su
+        # fila. Los ids de TICKET y PAGO se copian a las claves del archivo:
+        # el ticket con el id más alto y el del pago con el id más alto se
+        # quedan en sus tablas para no repetir ids del archivo
+        top_pago = select(func.max(pagos.c.id)).scalar_subquery()
+        stmt = stmt.where(
+            tickets.c.id < select(func.max(tickets.c.id)).scalar_subquery(),
+            ~select(pagos.c.id).where(pagos.c.ticket_id == tickets.c.id, pagos.c.id == top_pago).exists(),
+        )
+    return stmt
+
+
+def _batch_ids(conn: Connection, cutoff: datetime, batch_size: int) -> List[int]:
+    stmt = _pending(conn, cutoff).order_by(tickets.c.id).limit(batch_size)
+    return list(conn.scalars(stmt))
+
+
+def _copy(source, target, where, now: datetime):
+    columns = [column.name for column in source.columns]
+    rows = select(*source.columns, literal(now, DateTime)).where(where)
+    return insert(target).from_select(columns + ["archived_at"], rows)
+
+
+def _archive_batch(conn: Connection, ids: List[int], now: datetime) -> tuple:
+    """Mover a las tablas de archivo los tickets dados y sus pagos"""
+    conn.execute(_copy(tickets, tickets_archive, tickets.c.id.in_(ids), now))
+    conn.execute(_copy(pagos, pagos_archive, pagos.c.ticket_id.in_(ids), now))
+    moved_pagos = conn.execute(delete(pagos).where(pagos.c.ticket_id.in_(ids))).rowcount
+    moved_tickets = conn.execute(delete(tickets).where(tickets.c.id.in_(ids))).rowcount
+    # Escritura con Core: el listener de cache.py no la ve
+    cache.bump_tables(conn, tickets.name)
+    return moved_tickets, moved_pagos
+
+
+def archive_past_events(
+    target_engine: Engine = engine,
+    retention_days: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    max_batches: Optional[int] = None,
+    dry_run: bool = False,
+) -> dict:
+    """
+    Archivar los tickets (y pagos) de eventos que terminaron hace más de
+    retention_days días
+
+    max_batches limita el trabajo de una llamada (p. ej. desde el endpoint
+    de admin, con el tiempo máximo de una función de Vercel); la siguiente
+    llamada sigue por donde se quedó.
+    """
+    retention_days = settings.ARCHIVE_RETENTION_DAYS if retention_days is None else retention_days
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    result = {"cutoff": cutoff.isoformat(timespec="seconds"), "tickets": 0, "pagos": 0, "lotes": 0}
+
+    if dry_run:
+        with target_engine.connect() as conn:
+            result["tickets"] = conn.scalar(select(func.count()).select_from(_pending(conn, cutoff).subquery()))
+        return result
+
+    while max_batches is None or result["lotes"] < max_batches:
+        now = datetime.now()
+        with target_engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _PG_LOCK_KEY})
+            ids = _batch_ids(conn, cutoff, batch_size)
+            if not ids:
+                break
+            moved_tickets, moved_pagos = _archive_batch(conn, ids, now)
+        result["tickets"] += moved_tickets
+        result["pagos"] += moved_pagos
+        result["lotes"] += 1
+        logger.info("Lote %d archivado: %d tickets, %d pagos", result["lotes"], moved_tickets, moved_pagos)
+    return result
+
+
+def delete_event_history(db: Session, evento_id: int) -> None:
+    """Borrar los tickets y pagos archivados de un evento (al eliminar el evento)"""
+    archived = select(tickets_archive.c.id).where(tickets_archive.c.evento_id == evento_id)
+    db.execute(delete(pagos_archive).where(pagos_archive.c.ticket_id.in_(archived)))
+    db.execute(delete(tickets_archive).where(tickets_archive.c.evento_id == evento_id))
+
+
+# ============================================
+# LECTURAS QUE INCLUYEN EL HISTÓRICO
+# ============================================
+
+def tickets_sold_counts(db: Session, evento_ids: Iterable[int]) -> Dict[int, int]:
+    """Tickets vendidos por evento (activos + archivados), dos consultas en total"""
+    evento_ids = list(evento_ids)
+    counts: Dict[int, int] = defaultdict(int)
+    if not evento_ids:
+        return counts
+    for table in (tickets, tickets_archive):
+        stmt = (
+            select(table.c.evento_id, func.count())
+            .where(table.c.evento_id.in_(evento_ids))
+            .group_by(table.c.evento_id)
+        )
+        for evento_id, count in db.execute(stmt):
+            counts[evento_id] += count
+    return counts
+
+
+def count_tickets(db: Session, evento_id: int, only_scanned: bool = False) -> int:
+    """Tickets de un evento (activos + archivados); only_scanned: los ya escaneados"""
+    total = 0
+    for table in (tickets, tickets_archive):
+        stmt = select(func.count()).select_from(table).where(table.c.evento_id == evento_id)
+        if only_scanned:
+            stmt = stmt.where(table.c.activado.is_(False))
+        total += db.scalar(stmt)
+    return total
+
+
+def scan_times(db: Session, evento_id: int) -> List[datetime]:
+    """Momentos de escaneo de los tickets de un evento (activos + archivados)"""
+    times = []
+    for table in (tickets, tickets_archive):
+        stmt = select(table.c.scanned_at).where(table.c.evento_id == evento_id, table.c.scanned_at.is_not(None))
+        times.extend(db.scalars(stmt))
+    return times
+
+
+def ticket_code_exists(db: Session, code: str) -> bool:
+    """Código ya usado por un ticket activo o archivado"""
+    return any(
+        db.scalar(select(table.c.id).where(table.c.codigo_ticket == code).limit(1)) is not None
+        for table in (tickets, tickets_archive)
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--retention-days", type=int, default=None, help="Por defecto ARCHIVE_RETENTION_DAYS")
+    parser.add_argument("--batch-size", type=int, default=None, help="Por defecto ARCHIVE_BATCH_SIZE")
+    parser.add_argument("--dry-run", action="store_true", help="Solo contar los tickets a archivar")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    summary = archive_past_events(retention_days=args.retention_days, batch_size=args.batch_size, dry_run=args.dry_run)
+    verb = "Por archivar" if args.dry_run else "Archivados"
+    print(f"{verb} (eventos anteriores a {summary['cutoff']}): {summary['tickets']} tickets, {summary['pagos']} pagos")
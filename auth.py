@@ -1,31 +1,125 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 import models
-from database import SessionLocal
+from cache import TTLCache
+from database import (
+    SessionLocal,
+    ThreadpoolSession,
+    get_async_sessionmaker,
+    read_async_session,
+    read_session,
+    replicas,
+)
 from config import settings
 
+logger = logging.getLogger("njoy.auth")
+
 # Configuración de bcrypt para hash de contraseñas
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt se ejecuta en un pool propio y acotado para que una ráfaga de logins
+# no ocupe todos los hilos del threadpool que comparten los endpoints síncronos
+_password_pool = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="bcrypt",
+)
+_password_slots = threading.BoundedSemaphore(
+    settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_DEPTH
+)
+
 # Esquema de seguridad Bearer Token
 security = HTTPBearer()
 
-def get_db():
+def get_db(request: Request):
     """Dependency para obtener sesión de base de datos"""
     db = SessionLocal()
+    if replicas.replicas:
+        # Para que las lecturas siguientes de este usuario vean lo que escriba (ver database.py)
+        db.info["user_id"] = _request_user_id(request)
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    """
+    Dependency async: AsyncSession (asyncpg / aiosqlite)
+
+    Sin motor async disponible se entrega una ThreadpoolSession: la misma
+    interfaz run_sync, pero ejecutando en el threadpool con la sesión síncrona.
+    """
+    session_factory = get_async_sessionmaker()
+    db = session_factory() if session_factory is not None else ThreadpoolSession(SessionLocal())
+    try:
+        yield db
+    finally:
+        await db.close()
+
+def _request_user_id(request: Request) -> Optional[int]:
+    """Id del usuario del token Bearer, sin consultar la BD (None si no hay o no es válido)"""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return int(decode_token_cached(token).get("sub"))
+    except Exception:
+        return None
+
+def get_read_db(request: Request):
+    """
+    Dependency de solo lectura: sesión en una réplica (ver database.ReplicaSet)
+
+    Sin réplicas sanas, o si el usuario acaba de comprar, se usa el primario.
+    """
+    db = read_session(_request_user_id(request))
     try:
         yield db
     finally:
         db.close()
 
+async def get_async_read_db(request: Request):
+    """Como get_read_db, para endpoints async (AsyncSession o ThreadpoolSession)"""
+    db = await read_async_session(_request_user_id(request))
+    try:
+        yield db
+    finally:
+        await db.close()
+
+def _run_password_job(fn, *args):
+    """
+    Ejecutar una operación bcrypt en el pool dedicado y esperar el resultado
+    
+    Raises:
+        HTTPException: 503 si ya hay workers + cola operaciones en curso
+    """
+    if not _password_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servidor ocupado, inténtalo de nuevo en unos segundos",
+            headers={"Retry-After": str(settings.PASSWORD_HASH_RETRY_AFTER_SECONDS)},
+        )
+    try:
+        future = _password_pool.submit(fn, *args)
+    except BaseException:
+        _password_slots.release()
+        raise
+    future.add_done_callback(lambda _: _password_slots.release())
+    return future.result()
+
 def hash_password(password: str) -> str:
     """
-    Hash de contraseña usando bcrypt
+    Hash de contraseña usando bcrypt (en el pool dedicado)
     
     Args:
         password: Contraseña en texto plano
@@ -33,11 +127,11 @@ def hash_password(password: str) -> str:
     Returns:
         Hash de la contraseña
     """
-    return pwd_context.hash(password)
+    return _run_password_job(pwd_context.hash, password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
-    Verifica que la contraseña coincida con el hash
+    Verifica que la contraseña coincida con el hash (en el pool dedicado)
     
     Args:
         plain_password: Contraseña en texto plano
@@ -46,7 +140,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Returns:
         True si coinciden, False en caso contrario
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    return _run_password_job(pwd_context.verify, plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
@@ -119,62 +213,179 @@ def decode_token(token: str) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+# ============================================
+# CACHÉ DEL USUARIO AUTENTICADO
+# ============================================
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Datos del usuario autenticado que necesitan los endpoints y los permisos
+
+    Es lo que devuelve get_current_user: no es un objeto ORM, así que no se
+    puede modificar ni guardar. Para el usuario completo, consultar por id.
+    """
+    id: int
+    nombre: str
+    apellidos: str
+    email: str
+    role: str
+    is_active: bool
+    is_banned: bool
+
+    @classmethod
+    def from_user(cls, user: models.Usuario) -> "Principal":
+        return cls(
+            id=user.id,
+            nombre=user.nombre,
+            apellidos=user.apellidos,
+            email=user.email,
+            role=user.role,
+            is_active=user.is_active,
+            is_banned=user.is_banned,
+        )
+
+
+# Payloads de tokens ya verificados (hasta su expiración) y principals por id de usuario
+_token_cache = TTLCache(maxsize=settings.PRINCIPAL_CACHE_MAX_ENTRIES, ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS)
+_principal_cache = TTLCache(maxsize=settings.PRINCIPAL_CACHE_MAX_ENTRIES, ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+def decode_token_cached(token: str) -> dict:
+    """decode_token con caché: la firma de cada token se verifica una sola vez"""
+    payload = _token_cache.get(token)
+    if payload is not None:
+        if payload.get("exp", 0) > time.time():
+            return payload
+    payload = decode_token(token)
+    exp = payload.get("exp")
+    ttl = settings.PRINCIPAL_CACHE_TTL_SECONDS if exp is None else min(settings.PRINCIPAL_CACHE_TTL_SECONDS, exp - time.time())
+    if ttl > 0:
+        _token_cache.set(token, payload, ttl=ttl)
+    return payload
+
+
+def get_principal(db: Session, user_id: int) -> Optional[Principal]:
+    """Principal del usuario desde la caché o, si no está, desde la base de datos"""
+    principal = _principal_cache.get(user_id)
+    if principal is None:
+        user = db.query(models.Usuario).filter(models.Usuario.id == user_id).first()
+        if user is None:
+            return None
+        principal = Principal.from_user(user)
+        _principal_cache.set(user_id, principal)
+    return principal
+
+
+def get_principal_from_token(token: str, db: Session) -> Principal:
+    """
+    Validar un token de acceso y devolver su Principal
+
+    Raises:
+        HTTPException: Si el token es inválido o el usuario no existe
+    """
+    payload = decode_token_cached(token)
+    user_id = payload.get("sub")
+    if user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    principal = get_principal(db, int(user_id))
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Usuario no encontrado",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return principal
+
+
+def cached_role(user_id: int) -> Optional[str]:
+    """Rol del usuario si su principal está en caché (sin consultar la base de datos)"""
+    principal = _principal_cache.get(user_id)
+    return principal.role if principal is not None else None
+
+
+def invalidate_principal(user_id: int) -> None:
+    """Olvidar el principal cacheado de un usuario"""
+    _principal_cache.pop(user_id)
+
+
+_CHANGED_USERS_KEY = "principal_changed_users"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    """Anotar los usuarios modificados o borrados (ban, rol, perfil...)"""
+    changed = [
+        obj.id for obj in list(session.dirty) + list(session.deleted)
+        if isinstance(obj, models.Usuario)
+    ]
+    if changed:
+        session.info.setdefault(_CHANGED_USERS_KEY, set()).update(changed)
+
+
+@event.listens_for(Session, "after_bulk_update")
+@event.listens_for(Session, "after_bulk_delete")
+def _collect_bulk_user_changes(context):
+    """query(Usuario).update()/delete() no dice qué filas toca: se vacía toda la caché"""
+    if context.mapper.class_ is models.Usuario:
+        context.session.info[_CHANGED_USERS_KEY] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    # Se invalida tras el commit: si se hiciera en el flush, otra petición
+    # podría volver a cachear los datos anteriores antes de confirmarse
+    if _CHANGED_USERS_KEY not in session.info:
+        return
+    changed = session.info.pop(_CHANGED_USERS_KEY)
+    if changed is None:
+        _principal_cache.clear()
+    else:
+        for user_id in changed:
+            invalidate_principal(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session):
+    session.info.pop(_CHANGED_USERS_KEY, None)
+
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
-) -> models.Usuario:
+) -> Principal:
     """
     Dependency para obtener el usuario actual desde el token JWT
     
+    El token decodificado y el usuario se cachean (ver Principal), así que
+    la mayoría de peticiones no consultan la base de datos aquí.
+    
     Args:
         credentials: Credenciales del header Authorization
         db: Sesión de base de datos
         
     Returns:
-        Usuario autenticado
+        Principal del usuario autenticado
         
     Raises:
         HTTPException: Si el token es inválido o el usuario no existe
     """
     try:
-        token = credentials.credentials
-        
-        try:
-            payload = decode_token(token)
-            user_id: str = payload.get("sub")
-            
-            if user_id is None:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Token inválido",
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
-        except JWTError:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="No se pudo validar las credenciales",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        user = db.query(models.Usuario).filter(models.Usuario.id == int(user_id)).first()
-        
-        if user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Usuario no encontrado",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        return user
-    except Exception as e:
-        print(f"ERROR in get_current_user: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise e
+        return get_principal_from_token(credentials.credentials, db)
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Error en get_current_user")
+        raise
 
 def get_current_active_user(
-    current_user: models.Usuario = Depends(get_current_user)
-) -> models.Usuario:
+    current_user: Principal = Depends(get_current_user)
+) -> Principal:
     """
     Dependency para verificar que el usuario esté activo
     
@@ -202,7 +413,9 @@ def get_current_active_user(
     
     return current_user
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[models.Usuario]:
+def authenticate_user(
+    db: Session, email: str, password: str, release_connection: bool = False
+) -> Optional[models.Usuario]:
     """
     Autentica un usuario con email y contraseña
     
@@ -210,6 +423,8 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[models
         db: Sesión de base de datos
         email: Email del usuario
         password: Contraseña en texto plano
+        release_connection: Devolver la conexión al pool antes de bcrypt
+            (solo si la sesión no tiene nada pendiente: se hace rollback)
         
     Returns:
         Usuario si las credenciales son correctas, None en caso contrario
@@ -219,14 +434,21 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[models
     if not user:
         return None
     
+    if release_connection:
+        # Sin esto, una ráfaga de logins agota el pool mientras espera al hash.
+        # rollback libera la conexión sin confirmar nada ni disparar los
+        # listeners de commit; el usuario queda desacoplado pero cargado.
+        db.expunge(user)
+        db.rollback()
+    
     if not verify_password(password, user.password):
         return None
     
     return user
 
 def get_current_promotor(
-    current_user: models.Usuario = Depends(get_current_active_user)
-) -> models.Usuario:
+    current_user: Principal = Depends(get_current_active_user)
+) -> Principal:
     """
     Dependency para verificar que el usuario sea promotor
     
@@ -247,8 +469,8 @@ def get_current_promotor(
     return current_user
 
 def get_current_admin(
-    current_user: models.Usuario = Depends(get_current_active_user)
-) -> models.Usuario:
+    current_user: Principal = Depends(get_current_active_user)
+) -> Principal:
     """
     Dependency para verificar que el usuario sea administrador
     
@@ -269,8 +491,8 @@ def get_current_admin(
     return current_user
 
 def get_current_owner_or_admin(
-    current_user: models.Usuario = Depends(get_current_active_user)
-) -> models.Usuario:
+    current_user: Principal = Depends(get_current_active_user)
+) -> Principal:
     """
     Dependency para verificar que el usuario sea owner o admin
     
@@ -291,8 +513,8 @@ def get_current_owner_or_admin(
     return current_user
 
 def get_current_scanner(
-    current_user: models.Usuario = Depends(get_current_active_user)
-) -> models.Usuario:
+    current_user: Principal = Depends(get_current_active_user)
+) -> Principal:
     """
     Dependency para verificar que el usuario tenga permisos de scanner
     Scanner role puede escanear tickets pero no crear/editar eventos
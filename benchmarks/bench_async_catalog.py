@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Benchmark: throughput del catálogo público con muchos clientes concurrentes
+
+Arranca la API con uvicorn y lanza CLIENTS clientes que piden en bucle
+/evento/, /evento/{id}, /evento/search y /genero/ (sin If-None-Match, para
+llegar siempre a la base de datos salvo en las cachés en memoria).
+
+Se ejecuta dos veces:
+- "threadpool": ASYNC_DB_ENABLED=false, la sesión síncrona en los hilos de anyio
+  (equivale a los antiguos handlers def)
+- "async": AsyncSession con asyncpg / aiosqlite
+
+Por defecto usa una base SQLite temporal; con --database-url se prueba contra
+Postgres (la base debe existir y estar vacía, se crean las tablas y datos).
+
+Uso:
+    python benchmarks/bench_async_catalog.py [--clients 500] [--seconds 15] [--events 200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine, text
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def prepare_database(url: str, env: dict, events: int) -> None:
+    """Crear las tablas (importando main) y un catálogo de eventos"""
+    subprocess.run([sys.executable, "-c", "import main"], cwd=ROOT, env=env, check=True)
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text('INSERT INTO "GENERO" (nombre) VALUES (:nombre)'), [{"nombre": f"Genero {i}"} for i in range(10)])
+        conn.execute(
+            text('INSERT INTO "LOCALIDAD" (ciudad, latitud, longitud) VALUES (:ciudad, :lat, :lon)'),
+            [{"ciudad": f"Ciudad {i}", "lat": 41 + i / 10, "lon": 2 + i / 10} for i in range(20)],
+        )
+        conn.execute(
+            text(
+                'INSERT INTO "EVENTO" (nombre, descripcion, localidad_id, recinto, plazas, fechayhora, tipo, precio, '
+                "genero_id, venta_pausada) VALUES (:nombre, 'Evento de prueba', :localidad, 'Recinto', 500, "
+                ":fecha, :tipo, :precio, :genero, false)"
+            ),
+            [
+                {
+                    "nombre": f"Evento {i}",
+                    "localidad": i % 20 + 1,
+                    "fecha": f"2030-{i % 12 + 1:02d}-{i % 28 + 1:02d} 20:00:00",
+                    "tipo": ("Concierto", "Festival", "Teatro")[i % 3],
+                    "precio": 10 + i % 50,
+                    "genero": i % 10 + 1,
+                }
+                for i in range(events)
+            ],
+        )
+    engine.dispose()
+
+
+async def wait_until_up(client: httpx.AsyncClient) -> None:
+    for _ in range(200):
+        try:
+            await client.get("/health")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("El servidor no ha arrancado")
+
+
+def random_path(events: int) -> str:
+    roll = random.random()
+    if roll < 0.4:
+        return f"/evento/{random.randint(1, events)}"
+    if roll < 0.7:
+        return f"/evento/?skip={random.randint(0, events // 2)}&limit=20"
+    if roll < 0.9:
+        return f"/evento/search?tipo=Festival&localidad_id={random.randint(1, 20)}"
+    return "/genero/"
+
+
+async def worker(client, deadline, events, latencies, errors):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            r = await client.get(random_path(events))
+            if r.status_code >= 500:
+                errors.append(r.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def drive(port: int, seconds: float, clients: int, events: int) -> dict:
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+        await wait_until_up(client)
+        # Calentamiento: construye las tarjetas de EVENT_CARD
+        await client.get(f"/evento/?limit={events}")
+        deadline = time.perf_counter() + seconds
+        latencies, errors = [], []
+        await asyncio.gather(*[worker(client, deadline, events, latencies, errors) for _ in range(clients)])
+    latencies.sort()
+    return {
+        "req_per_s": len(latencies) / seconds,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+        "errors": len(errors),
+    }
+
+
+def run_scenario(name: str, extra_env: dict, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        env = dict(
+            os.environ, ENV="local", DATABASE_URL=url, DEBUG="False",
+            RATE_LIMIT_ENABLED="False", LOG_LEVEL="WARNING", **extra_env,
+        )
+        prepare_database(url, env, args.events)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+             "--log-level", "warning", "--no-access-log", "--backlog", str(args.clients * 2)],
+            cwd=ROOT, env=env,
+        )
+        try:
+            result = asyncio.run(drive(args.port, args.seconds, args.clients, args.events))
+        finally:
+            server.terminate()
+            server.wait()
+            if args.database_url:
+                # Dejar la base vacía para el siguiente escenario (los ids vuelven a empezar en 1)
+                subprocess.run(
+                    [sys.executable, "-c", "import database, models; models.Base.metadata.drop_all(database.engine)"],
+                    cwd=ROOT, env=env, check=True,
+                )
+    print(
+        f"{name:<11} {result['req_per_s']:8.1f} req/s  p50 {result['p50_ms']:7.1f} ms  "
+        f"p95 {result['p95_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms  errores {result['errors']}"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--database-url", default="", help="Postgres vacío (por defecto SQLite temporal)")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    run_scenario("threadpool", {"ASYNC_DB_ENABLED": "false"}, args)
+    run_scenario("async", {"ASYNC_DB_ENABLED": "true"}, args)
+
+
+if __name__ == "__main__":
+    main()
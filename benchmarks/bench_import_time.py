@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark: tiempo de `import main` (arranque en frío)
+
+Cada medida es un proceso nuevo con la configuración de producción
+(ENV=production: sin endpoints de debug) contra una base SQLite temporal ya
+migrada, así se mide el camino normal de arranque: imports, creación de la
+app y la consulta a SCHEMA_VERSION.
+
+Falla (código 1) si:
+- la mediana supera --max-ms
+- algún módulo que debe cargarse de forma diferida (LAZY_MODULES) aparece
+  en sys.modules después de `import main`
+
+Con --top N muestra los N imports que más tardan (python -X importtime).
+
+Uso:
+    python benchmarks/bench_import_time.py [--runs 7] [--max-ms 2000] [--top 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Solo se importan al usarse (primer uso o endpoint montado)
+LAZY_MODULES = (
+    "httpx",                           # geocode_city
+    "resend",                          # email_service
+    "seed_data",                       # /seed-db (debug_endpoints)
+    "debug_endpoints",                 # DEBUG_ENDPOINTS_ENABLED
+    "sqlalchemy.dialects.postgresql",  # solo con una base Postgres
+)
+
+MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({"ms": elapsed * 1000, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+def run(env: dict, *python_args) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *python_args, "-c", MEASURE], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True,
+    )
+
+
+def top_imports(env: dict, n: int) -> list:
+    """(ms acumulados, módulo) de los imports directos más lentos"""
+    stderr = run(env, "-X", "importtime").stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit() and name.startswith("   ") and not name.startswith("    "):
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--max-ms", type=float, default=2000, help="Presupuesto para la mediana")
+    parser.add_argument("--top", type=int, default=0, help="Mostrar los N imports más lentos")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ, ENV="production", DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            LOG_LEVEL="WARNING",
+        )
+        for name in ("DEBUG_ENDPOINTS_ENABLED", "PYTHONDONTWRITEBYTECODE"):
+            env.pop(name, None)
+        # Primera ejecución: crea el esquema (y los .pyc); no cuenta
+        run(env)
+        results = [json.loads(run(env).stdout.strip().splitlines()[-1]) for _ in range(args.runs)]
+        top = top_imports(env, args.top) if args.top else []
+
+    times = sorted(r["ms"] for r in results)
+    median = statistics.median(times)
+    print(f"import main: mediana {median:.0f} ms  min {times[0]:.0f} ms  max {times[-1]:.0f} ms  ({args.runs} procesos)")
+    for ms, name in top:
+        print(f"  {ms:8.1f} ms  {name}")
+
+    failed = False
+    if median > args.max_ms:
+        print(f"FALLO: la mediana supera el presupuesto de {args.max_ms:.0f} ms")
+        failed = True
+    loaded = sorted({m for r in results for m in r["loaded"]})
+    if loaded:
+        print(f"FALLO: módulos que deberían cargarse de forma diferida: {', '.join(loaded)}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
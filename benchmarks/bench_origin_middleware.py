@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: coste por petición de la validación de origen
+
+Compara, sobre una app Starlette mínima y llamando directamente a la
+interfaz ASGI (sin red ni servidor):
+- "sin middleware": la app sola (referencia)
+- "@app.middleware": la implementación anterior (BaseHTTPMiddleware)
+- "ASGI puro": origin_validation.OriginValidationMiddleware
+
+Uso:
+    python benchmarks/bench_origin_middleware.py [--requests 20000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from origin_validation import OriginValidationMiddleware  # noqa: E402
+
+ALLOWED_ORIGINS = ["https://web-njoy.vercel.app", "http://localhost:5173", "http://localhost:3000"]
+
+
+async def endpoint(request):
+    return JSONResponse([{"id": 1, "nombre": "Rock"}])
+
+
+def base_app():
+    return Starlette(routes=[Route("/genero/", endpoint)])
+
+
+async def legacy_validate_origin(request, call_next):
+    """Copia de la lógica del antiguo validate_origin_middleware (sin logs)"""
+    origin = request.headers.get("origin")
+    if origin and origin not in ALLOWED_ORIGINS:
+        return JSONResponse(
+            status_code=403,
+            content={"detail": "Origin not allowed"},
+            headers={"Access-Control-Allow-Origin": origin},
+        )
+    if request.method == "OPTIONS":
+        return Response(status_code=200, headers={"Access-Control-Allow-Origin": origin or ALLOWED_ORIGINS[0]})
+    response = await call_next(request)
+    if origin and origin in ALLOWED_ORIGINS:
+        response.headers["Access-Control-Allow-Origin"] = origin
+        response.headers["Access-Control-Allow-Credentials"] = "true"
+    return response
+
+
+def build_apps():
+    legacy = base_app()
+    legacy.add_middleware(BaseHTTPMiddleware, dispatch=legacy_validate_origin)
+    asgi = base_app()
+    asgi.add_middleware(OriginValidationMiddleware, allowed_origins=ALLOWED_ORIGINS)
+    return {"sin middleware": base_app(), "@app.middleware": legacy, "ASGI puro": asgi}
+
+
+async def run(app, n: int, origin: bytes) -> float:
+    headers = [(b"host", b"localhost")]
+    if origin:
+        headers.append((b"origin", origin))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/genero/", "raw_path": b"/genero/", "root_path": "",
+        "query_string": b"", "headers": headers, "client": ("127.0.0.1", 1234), "server": ("localhost", 80),
+    }
+
+    never = asyncio.Event()
+
+    def make_receive():
+        # Como un servidor real: el cuerpo una vez y luego esperar a la desconexión
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await never.wait()
+
+        return receive
+
+    async def send(message):
+        pass
+
+    # Calentamiento (construcción perezosa del stack de middlewares)
+    for _ in range(200):
+        await app(dict(scope), make_receive(), send)
+    start = time.perf_counter()
+    for _ in range(n):
+        await app(dict(scope), make_receive(), send)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    apps = build_apps()
+    for label, origin in (("con Origin permitido", b"http://localhost:5173"), ("sin Origin", b"")):
+        print(label)
+        baseline = None
+        for name, app in apps.items():
+            us = asyncio.run(run(app, args.requests, origin))
+            baseline = us if baseline is None else baseline
+            print(f"  {name:<16} {us:8.1f} µs/petición  (+{us - baseline:6.1f} µs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark: throughput de /login frente a latencia del catálogo con carga mixta
+
+Arranca la API con uvicorn sobre una base SQLite temporal y lanza a la vez:
+- LOGIN_CLIENTS clientes haciendo /login en bucle (bcrypt)
+- CATALOG_CLIENTS clientes pidiendo /genero/ (lectura cacheada, sin bcrypt)
+
+Se ejecuta dos veces:
+- "sin límite": pool de bcrypt del tamaño del threadpool y cola enorme
+  (equivale a hashear en línea en los hilos de los endpoints)
+- "pool acotado": la configuración por defecto (PASSWORD_HASH_WORKERS / QUEUE_DEPTH)
+
+Uso:
+    python benchmarks/bench_password_pool.py [--seconds 10] [--login-clients 50] [--catalog-clients 10]
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from passlib.context import CryptContext
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMAIL = "bench@example.com"
+PASSWORD = "bench12345"
+
+
+def prepare_database(path: str, env: dict) -> None:
+    """Crear las tablas (importando main) y un usuario para el login"""
+    subprocess.run([sys.executable, "-c", "import main"], cwd=ROOT, env=env, check=True)
+    password_hash = CryptContext(schemes=["bcrypt"]).hash(PASSWORD)
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            'INSERT INTO "USUARIO" (nombre, apellidos, email, fecha_nacimiento, password, role, '
+            "is_active, is_banned, created_at, email_verified) "
+            "VALUES ('Bench', 'User', ?, '1990-01-01', ?, 'user', 1, 0, '2024-01-01', 1)",
+            (EMAIL, password_hash),
+        )
+        conn.executemany('INSERT INTO "GENERO" (nombre) VALUES (?)', [(f"Genero {i}",) for i in range(10)])
+
+
+async def wait_until_up(client: httpx.AsyncClient) -> None:
+    for _ in range(100):
+        try:
+            await client.get("/health")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("El servidor no ha arrancado")
+
+
+async def login_worker(client, deadline, results):
+    while time.perf_counter() < deadline:
+        r = await client.post("/login", json={"email": EMAIL, "contrasena": PASSWORD})
+        results[r.status_code] = results.get(r.status_code, 0) + 1
+        if r.status_code == 503:
+            await asyncio.sleep(float(r.headers.get("retry-after", "1")))
+
+
+async def catalog_worker(client, deadline, latencies):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await client.get("/genero/")
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def drive(port: int, seconds: float, login_clients: int, catalog_clients: int) -> dict:
+    limits = httpx.Limits(max_connections=login_clients + catalog_clients)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+        await wait_until_up(client)
+        deadline = time.perf_counter() + seconds
+        logins, latencies = {}, []
+        await asyncio.gather(
+            *[login_worker(client, deadline, logins) for _ in range(login_clients)],
+            *[catalog_worker(client, deadline, latencies) for _ in range(catalog_clients)],
+        )
+    latencies.sort()
+    return {
+        "login_ok_per_s": logins.get(200, 0) / seconds,
+        "login_503": logins.get(503, 0),
+        "catalog_p50_ms": statistics.median(latencies),
+        "catalog_p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "catalog_req_per_s": len(latencies) / seconds,
+    }
+
+
+def run_scenario(name: str, extra_env: dict, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        env = dict(os.environ, ENV="local", DATABASE_URL=f"sqlite:///{db_path}", DEBUG="False", **extra_env)
+        prepare_database(db_path, env)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+            cwd=ROOT, env=env,
+        )
+        try:
+            result = asyncio.run(drive(args.port, args.seconds, args.login_clients, args.catalog_clients))
+        finally:
+            server.terminate()
+            server.wait()
+    print(
+        f"{name:<14} login {result['login_ok_per_s']:7.1f}/s  503s {result['login_503']:5d}  "
+        f"catálogo p50 {result['catalog_p50_ms']:7.1f} ms  p95 {result['catalog_p95_ms']:7.1f} ms  "
+        f"{result['catalog_req_per_s']:7.1f} req/s"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--login-clients", type=int, default=50)
+    parser.add_argument("--catalog-clients", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    run_scenario("sin límite", {"PASSWORD_HASH_WORKERS": "40", "PASSWORD_HASH_QUEUE_DEPTH": "10000"}, args)
+    run_scenario("pool acotado", {}, args)
+
+
+if __name__ == "__main__":
+    main()
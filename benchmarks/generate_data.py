@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Generador de datos sintéticos a gran escala (para benchmarks)
+
+Volúmenes por defecto (--scale 1): 1M usuarios, 100k eventos, 20M entradas
+(con scanned_at en las de eventos pasados), 5k equipos con sus miembros,
+más localidades, géneros y organizadores. --scale multiplica los volúmenes
+grandes (--scale 0.01 para una base pequeña de pruebas); las tablas de
+referencia no cambian.
+
+- Determinista: misma --seed y misma escala, mismos datos (cada tabla usa
+  su propio generador, derivado de la semilla y el nombre de la tabla)
+- Postgres: COPY ... FROM STDIN (CSV) por lotes
+- SQLite: executemany con PRAGMAs de carga masiva (sin fsync, caché grande)
+- Otros motores: executemany
+- Los índices secundarios se borran antes de cargar y se recrean al final
+  (mucho más rápido que mantenerlos fila a fila); después ANALYZE
+
+La base debe existir y estar vacía: se aplican las migraciones (migrate.py)
+y se aborta si alguna tabla ya tiene filas. Todos los usuarios comparten la
+contraseña "password123" (un solo hash bcrypt, fijo). EVENT_CARD se queda vacía:
+la API construye las tarjetas al leerlas.
+
+Uso:
+    python benchmarks/generate_data.py --database-url sqlite:///./bench.db [--scale 0.1] [--seed 42]
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BASE_COUNTS = {
+    "localidades": 200,
+    "generos": 12,
+    "organizadores": 500,
+    "usuarios": 1_000_000,
+    "eventos": 100_000,
+    "tickets": 20_000_000,
+    "equipos": 5_000,
+}
+# Tablas de referencia: mismo tamaño a cualquier escala
+FIXED_COUNTS = ("localidades", "generos", "organizadores")
+BATCH_SIZE = 50_000
+# Hash bcrypt fijo de "password123" (un hash nuevo tendría otra sal en cada ejecución)
+PASSWORD_HASH = "$2b$12$91hzjiae2lOIeM8Y5/EKc.vZO/BE9ngmRCHXnc06A8RmukTCFHLDK"
+
+# Fecha de referencia fija (no datetime.now()): los datos no cambian entre ejecuciones
+REFERENCE = datetime(2026, 1, 1)
+
+NOMBRES = ["Ana", "Luis", "Marta", "Jordi", "Lucía", "Pau", "Carmen", "Javier", "Laia", "Sergio", "Elena", "Marc"]
+APELLIDOS = ["García", "Martínez", "López", "Puig", "Sánchez", "Ferrer", "Romero", "Vidal", "Torres", "Serra"]
+PAISES = ["España", "España", "España", "Francia", "Italia", "Portugal", "Alemania"]
+GENEROS = ["Rock", "Pop", "Jazz", "Electrónica", "Flamenco", "Indie", "Hip Hop", "Clásica", "Reggaeton", "Metal", "Blues", "Soul"]
+TIPOS = ["Concierto", "Concierto", "Festival", "Teatro", "Club", "Comedia"]
+RECINTOS = ["Sala", "Auditorio", "Estadio", "Teatro", "Club", "Pabellón", "Plaza"]
+
+# Códigos de entrada únicos de 6 caracteres: (id * _CODE_MULTIPLIER) mod 36^6
+# es una permutación (multiplicador coprimo con 36), sin colisiones hasta 2.1e9
+_CODE_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+_CODE_PAIRS = [a + b for a in _CODE_ALPHABET for b in _CODE_ALPHABET]
+_CODE_SPACE = 36 ** 6
+_CODE_MULTIPLIER = 1_000_003
+
+
+def ticket_code(ticket_id: int) -> str:
+    n = ticket_id * _CODE_MULTIPLIER % _CODE_SPACE
+    return _CODE_PAIRS[n // 1_679_616] + _CODE_PAIRS[n // 1296 % 1296] + _CODE_PAIRS[n % 1296]
+
+
+def rng(seed: int, table: str) -> random.Random:
+    return random.Random(f"{seed}:{table}")
+
+
+# ============================================
+# GENERADORES (una tupla por fila, en el orden de COLUMNS)
+# ============================================
+
+COLUMNS = {
+    "LOCALIDAD": ("id", "ciudad", "latitud", "longitud"),
+    "GENERO": ("id", "nombre"),
+    "ORGANIZADOR": ("dni", "ncompleto", "email", "telefono", "web"),
+    "USUARIO": (
+        "id", "nombre", "apellidos", "email", "fecha_nacimiento", "pais", "password", "role",
+        "is_active", "is_banned", "created_at", "email_verified",
+    ),
+    "EVENTO": (
+        "id", "nombre", "descripcion", "localidad_id", "recinto", "plazas", "fechayhora", "tipo",
+        "precio", "organizador_dni", "genero_id", "creador_id", "venta_pausada",
+    ),
+    "TICKET": ("id", "codigo_ticket", "nombre_asistente", "evento_id", "usuario_id", "activado", "scanned_at"),
+    "TEAM": ("id", "name", "leader_id", "created_at"),
+    "TEAM_MEMBER": ("id", "team_id", "user_id", "status", "invited_at", "joined_at"),
+}
+
+
+class Plan:
+    """Volúmenes y reparto de roles derivados de la escala"""
+
+    def __init__(self, scale: float, seed: int):
+        self.seed = seed
+        self.counts = {
+            name: n if name in FIXED_COUNTS else max(1, int(n * scale)) for name, n in BASE_COUNTS.items()
+        }
+        users = self.counts["usuarios"]
+        # Ids bajos: 10 admins, luego promotores (0.5%) y scanners (1%); el resto usuarios
+        self.admins = min(10, users)
+        self.promotores = max(1, users // 200)
+        self.scanners = max(1, users // 100)
+
+    def role(self, user_id: int) -> str:
+        if user_id <= self.admins:
+            return "admin"
+        if user_id <= self.admins + self.promotores:
+            return "promotor"
+        if user_id <= self.admins + self.promotores + self.scanners:
+            return "scanner"
+        return "user"
+
+    def promotor_id(self, r: random.Random) -> int:
+        return self.admins + 1 + int(r.random() * self.promotores)
+
+    def scanner_id(self, r: random.Random) -> int:
+        return self.admins + self.promotores + 1 + int(r.random() * self.scanners)
+
+
+def gen_localidades(plan: Plan):
+    r = rng(plan.seed, "LOCALIDAD")
+    for i in range(1, plan.counts["localidades"] + 1):
+        # Península Ibérica y Baleares, aproximadamente
+        yield (i, f"Ciudad {i}", round(r.uniform(36.0, 43.5), 5), round(r.uniform(-9.0, 4.3), 5))
+
+
+def gen_generos(plan: Plan):
+    for i in range(1, plan.counts["generos"] + 1):
+        yield (i, GENEROS[(i - 1) % len(GENEROS)] + ("" if i <= len(GENEROS) else f" {i}"))
+
+
+def _dni(i: int) -> str:
+    return f"{i:08d}{'TRWAGMYFPDXBNJZSQVHLCKE'[i % 23]}"
+
+
+def gen_organizadores(plan: Plan):
+    for i in range(1, plan.counts["organizadores"] + 1):
+        yield (_dni(i), f"Organizador {i}", f"organizador{i}@example.com", f"6{i:08d}", f"https://org{i}.example.com")
+
+
+def gen_usuarios(plan: Plan, password_hash: str):
+    r = rng(plan.seed, "USUARIO")
+    born = date(1960, 1, 1)
+    for i in range(1, plan.counts["usuarios"] + 1):
+        created = REFERENCE - timedelta(seconds=int(r.random() * 3 * 365 * 86400))
+        yield (
+            i, r.choice(NOMBRES), f"{r.choice(APELLIDOS)} {r.choice(APELLIDOS)}", f"user{i}@example.com",
+            (born + timedelta(days=int(r.random() * 45 * 365))).isoformat(), r.choice(PAISES), password_hash,
+            plan.role(i), True, r.random() < 0.002, str(created), r.random() < 0.8,
+        )
+
+
+def event_dates(plan: Plan) -> list:
+    """Fecha de cada evento (índice = id): de dos años antes a uno después de REFERENCE"""
+    r = rng(plan.seed, "EVENTO.fechayhora")
+    span = 3 * 365 * 86400
+    start = REFERENCE - timedelta(days=2 * 365)
+    dates = [None]
+    for _ in range(plan.counts["eventos"]):
+        moment = start + timedelta(seconds=int(r.random() * span))
+        dates.append(moment.replace(minute=(moment.minute // 15) * 15, second=0))
+    return dates
+
+
+def tickets_per_event(plan: Plan) -> list:
+    """Reparto de las entradas entre eventos (índice = id): pocos eventos muy populares"""
+    r = rng(plan.seed, "TICKET.reparto")
+    weights = [r.paretovariate(1.2) for _ in range(plan.counts["eventos"])]
+    total = sum(weights)
+    per_event = [int(w / total * plan.counts["tickets"]) for w in weights]
+    # El redondeo deja algunas sin repartir: una más a los primeros eventos
+    for i in range(plan.counts["tickets"] - sum(per_event)):
+        per_event[i % len(per_event)] += 1
+    return [0] + per_event
+
+
+def gen_eventos(plan: Plan, dates: list, sold: list):
+    r = rng(plan.seed, "EVENTO")
+    for i in range(1, plan.counts["eventos"] + 1):
+        tipo = r.choice(TIPOS)
+        precio = 0.0 if r.random() < 0.08 else round(r.uniform(5, 150), 2)
+        yield (
+            i, f"{tipo} {i}", f"{tipo} de prueba número {i}", 1 + int(r.random() * plan.counts["localidades"]),
+            f"{r.choice(RECINTOS)} {1 + int(r.random() * 50)}", sold[i] + int(r.random() * (sold[i] // 5 + 50)),
+            str(dates[i]), tipo, precio, _dni(1 + int(r.random() * plan.counts["organizadores"])),
+            1 + int(r.random() * plan.counts["generos"]), plan.promotor_id(r), r.random() < 0.01,
+        )
+
+
+def gen_tickets(plan: Plan, dates: list, sold: list):
+    r = rng(plan.seed, "TICKET")
+    users = plan.counts["usuarios"]
+    ticket_id = 0
+    for evento_id in range(1, len(sold)):
+        moment = dates[evento_id]
+        past = moment < REFERENCE
+        for _ in range(sold[evento_id]):
+            ticket_id += 1
+            # Eventos pasados: ~75% escaneadas entre 1 h antes y 3 h después del inicio
+            scanned = past and r.random() < 0.75
+            yield (
+                ticket_id, ticket_code(ticket_id), None, evento_id, 1 + int(r.random() * users), not scanned,
+                str(moment + timedelta(seconds=int(r.random() * 14400) - 3600)) if scanned else None,
+            )
+
+
+def gen_teams(plan: Plan):
+    r = rng(plan.seed, "TEAM")
+    for i in range(1, plan.counts["equipos"] + 1):
+        yield (i, f"Equipo {i}", plan.promotor_id(r), str(REFERENCE - timedelta(days=int(r.random() * 700))))
+
+
+def gen_team_members(plan: Plan):
+    r = rng(plan.seed, "TEAM_MEMBER")
+    member_id = 0
+    for team_id in range(1, plan.counts["equipos"] + 1):
+        for user_id in sorted({plan.scanner_id(r) for _ in range(2 + int(r.random() * 8))}):
+            member_id += 1
+            invited = REFERENCE - timedelta(days=int(r.random() * 600))
+            status = "accepted" if r.random() < 0.8 else r.choice(("pending", "rejected"))
+            joined = str(invited + timedelta(days=int(r.random() * 7))) if status == "accepted" else None
+            yield (member_id, team_id, user_id, status, str(invited), joined)
+
+
+# ============================================
+# ESCRITURA
+# ============================================
+
+def batches(rows, size: int = BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ExecutemanyWriter:
+    """INSERT con executemany por lotes (SQLite y motores sin COPY)"""
+
+    def __init__(self, dbapi_conn, paramstyle: str):
+        self.conn = dbapi_conn
+        self.placeholder = "?" if paramstyle == "qmark" else "%s"
+
+    def write(self, table: str, columns: tuple, rows) -> int:
+        sql = 'INSERT INTO "{}" ({}) VALUES ({})'.format(
+            table, ", ".join(columns), ", ".join([self.placeholder] * len(columns))
+        )
+        cursor = self.conn.cursor()
+        count = 0
+        for batch in batches(rows):
+            cursor.executemany(sql, batch)
+            count += len(batch)
+        self.conn.commit()
+        return count
+
+
+class SQLiteWriter(ExecutemanyWriter):
+    # Sobre los de database.SQLITE_PRAGMAS (WAL): sin fsync y caché grande
+    PRAGMAS = (
+        "PRAGMA synchronous = OFF",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA cache_size = -262144",  # 256 MB
+    )
+
+    def __init__(self, dbapi_conn):
+        super().__init__(dbapi_conn, "qmark")
+        cursor = dbapi_conn.cursor()
+        for pragma in self.PRAGMAS:
+            cursor.execute(pragma)
+
+
+class CopyWriter:
+    """COPY FROM STDIN en CSV (psycopg2), un COPY por lote"""
+
+    def __init__(self, dbapi_conn):
+        self.conn = dbapi_conn
+
+    def write(self, table: str, columns: tuple, rows) -> int:
+        sql = 'COPY "{}" ({}) FROM STDIN WITH (FORMAT csv)'.format(table, ", ".join(columns))
+        cursor = self.conn.cursor()
+        count = 0
+        for batch in batches(rows):
+            buffer = io.StringIO()
+            # None -> campo vacío sin comillas = NULL en CSV; True/False los acepta Postgres
+            csv.writer(buffer).writerows(batch)
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+            count += len(batch)
+        self.conn.commit()
+        return count
+
+
+def make_writer(engine, dbapi_conn):
+    if engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2":
+        return CopyWriter(dbapi_conn)
+    if engine.dialect.name == "sqlite":
+        return SQLiteWriter(dbapi_conn)
+    return ExecutemanyWriter(dbapi_conn, engine.dialect.paramstyle)
+
+
+# ============================================
+# CARGA
+# ============================================
+
+def secondary_indexes(models):
+    return [index for table in models.Base.metadata.sorted_tables if table.name in COLUMNS for index in table.indexes]
+
+
+def reset_sequences(conn) -> None:
+    """Postgres: los ids se han insertado a mano, las secuencias siguen en 1"""
+    from sqlalchemy import text
+
+    for table in COLUMNS:
+        if "id" in COLUMNS[table]:
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM \"{table}\"), 0) + 1, false)"
+            ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplicador de los volúmenes por defecto")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import func, select, text
+
+    import cache
+    import migrate
+    import models
+    from database import engine
+
+    migrate.run_migrations(engine)
+    with engine.connect() as conn:
+        for table in COLUMNS:
+            if conn.scalar(select(func.count()).select_from(models.Base.metadata.tables[table])):
+                sys.exit(f"La tabla {table} no está vacía: usar una base nueva")
+
+    plan = Plan(args.scale, args.seed)
+    print("Volúmenes: " + ", ".join(f"{name} {n:,}" for name, n in plan.counts.items()))
+    started = time.perf_counter()
+
+    indexes = secondary_indexes(models)
+    with engine.begin() as conn:
+        for index in indexes:
+            index.drop(conn, checkfirst=True)
+
+    dates = event_dates(plan)
+    sold = tickets_per_event(plan)
+    steps = [
+        ("LOCALIDAD", gen_localidades(plan)),
+        ("GENERO", gen_generos(plan)),
+        ("ORGANIZADOR", gen_organizadores(plan)),
+        ("USUARIO", gen_usuarios(plan, PASSWORD_HASH)),
+        ("EVENTO", gen_eventos(plan, dates, sold)),
+        ("TICKET", gen_tickets(plan, dates, sold)),
+        ("TEAM", gen_teams(plan)),
+        ("TEAM_MEMBER", gen_team_members(plan)),
+    ]
+    dbapi_conn = engine.raw_connection()
+    try:
+        writer = make_writer(engine, dbapi_conn)
+        for table, rows in steps:
+            t0 = time.perf_counter()
+            count = writer.write(table, COLUMNS[table], rows)
+            elapsed = time.perf_counter() - t0
+            print(f"{table:<12} {count:>12,} filas  {elapsed:7.1f} s  {count / max(elapsed, 1e-9):>10,.0f} filas/s")
+    finally:
+        dbapi_conn.close()
+
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        for index in indexes:
+            index.create(conn)
+        if engine.dialect.name == "postgresql":
+            reset_sequences(conn)
+        # Carga sin ORM: invalidar a mano las cachés y ETags del catálogo
+        cache.bump_tables(conn, *(table for table, _ in steps))
+    with engine.connect() as conn:
+        conn.execute(text("ANALYZE"))
+        conn.commit()
+    print(f"Índices y ANALYZE  {time.perf_counter() - t0:7.1f} s")
+    print(f"Total {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Suite de rendimiento de extremo a extremo con baselines guardados
+
+Genera una base SQLite con benchmarks/generate_data.py (o usa
+--database-url), arranca la API con uvicorn y ejecuta cada escenario con
+clientes concurrentes durante --seconds:
+
+- catalog:  navegación del catálogo (listado, detalle, géneros, facetas)
+- search:   búsqueda con filtros y calendario
+- purchase: ráfaga de compras sobre unos pocos eventos en venta
+- scan:     control de acceso (validate-ticket + activate-ticket)
+- stats:    el promotor refrescando las estadísticas de sus eventos
+- login:    oleada de logins (bcrypt)
+
+Por escenario se guarda throughput, p50/p95/p99, errores (5xx o fallos de
+conexión), 4xx (ningún escenario debería recibirlos: suelen indicar datos
+de prueba rotos, p. ej. tokens caducados o eventos cerrados, que hacen que
+el escenario mida respuestas de error) y rechazadas (503 del pool de
+bcrypt, ver PASSWORD_HASH_QUEUE_DEPTH) en JSON. Con --baseline se compara
+con benchmarks/baselines/<nombre>.json y sale con código 1 si algún
+escenario empeora más de --tolerance: p95 más alto, menos peticiones por
+segundo, más errores, más 4xx o más rechazadas.
+
+Los baselines dependen de la máquina: guardar uno por entorno
+(--save-baseline) y comparar siempre en el mismo.
+
+Uso:
+    python benchmarks/perf_suite.py --save-baseline local
+    python benchmarks/perf_suite.py --baseline local [--tolerance 0.25]
+    python benchmarks/perf_suite.py --scenarios catalog,search --seconds 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES_DIR = os.path.join(ROOT, "benchmarks", "baselines")
+PASSWORD = "password123"  # La de generate_data.py
+
+# Eventos que se ponen a la venta para las compras y el escaneo
+ON_SALE_EVENTS = 20
+
+
+# ============================================
+# PREPARACIÓN DE DATOS
+# ============================================
+
+def prepare_context(seed: int) -> dict:
+    """
+    Datos de los escenarios, leídos de la base (DATABASE_URL ya configurada)
+
+    Los eventos con más entradas pasan a estar en venta dentro de 30 días con
+    plazas de sobra (las fechas de generate_data son fijas y la compra exige
+    un evento futuro).
+    """
+    from sqlalchemy import func, select, update
+
+    import models
+    from auth import create_access_token
+    from database import SessionLocal
+
+    def token(user) -> str:
+        return create_access_token(data={"sub": str(user.id), "email": user.email})
+
+    r = random.Random(seed)
+    db = SessionLocal()
+    try:
+        sold = (
+            select(models.Ticket.evento_id, func.count().label("n"))
+            .group_by(models.Ticket.evento_id)
+            .order_by(func.count().desc())
+            .limit(ON_SALE_EVENTS)
+        )
+        on_sale = [evento_id for evento_id, _ in db.execute(sold)]
+        db.execute(
+            update(models.Evento)
+            .where(models.Evento.id.in_(on_sale))
+            .values(fechayhora=datetime.now() + timedelta(days=30), plazas=models.Evento.plazas + 1_000_000,
+                    venta_pausada=False)
+        )
+        db.commit()
+
+        users = db.query(models.Usuario).filter(models.Usuario.role == "user").order_by(models.Usuario.id).limit(500).all()
+        gate_event = db.get(models.Evento, on_sale[0])
+        creator = db.get(models.Usuario, gate_event.creador_id)
+        gate_tickets = [
+            ticket_id for (ticket_id,) in db.query(models.Ticket.id)
+            .filter(models.Ticket.evento_id == gate_event.id, models.Ticket.activado.is_(True))
+            .order_by(models.Ticket.id)
+        ]
+        r.shuffle(gate_tickets)
+
+        # Estadísticas: eventos de los promotores, cada uno con el token de su creador
+        stats_events = []
+        for evento in db.query(models.Evento).filter(models.Evento.id.in_(on_sale[:10])):
+            stats_events.append((evento.id, token(db.get(models.Usuario, evento.creador_id))))
+
+        return {
+            "event_ids": [evento_id for (evento_id,) in db.query(models.Evento.id)],
+            "on_sale": on_sale,
+            "localidad_ids": [localidad_id for (localidad_id,) in db.query(models.Localidad.id)],
+            "genero_ids": [genero_id for (genero_id,) in db.query(models.Genero.id)],
+            "user_tokens": [token(user) for user in users],
+            "user_emails": [user.email for user in users],
+            "gate_tickets": gate_tickets,
+            "gate_token": token(creator),
+            "stats_events": stats_events,
+        }
+    finally:
+        db.close()
+
+
+# ============================================
+# ESCENARIOS
+# ============================================
+# Cada paso hace una o varias peticiones con timed(); los clientes repiten
+# pasos hasta el final del escenario.
+
+TIPOS = ("Concierto", "Festival", "Teatro", "Club", "Comedia")
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.client_errors = 0
+        self.shed = 0
+        self.statuses = {}
+
+    async def timed(self, client: httpx.AsyncClient, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors += 1
+            self.latencies.append((time.perf_counter() - start) * 1000)
+            return None
+        self.latencies.append((time.perf_counter() - start) * 1000)
+        self.statuses[response.status_code] = self.statuses.get(response.status_code, 0) + 1
+        if response.status_code == 503:
+            self.shed += 1
+        elif response.status_code >= 500:
+            self.errors += 1
+        elif response.status_code >= 400:
+            self.client_errors += 1
+        return response
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def step_catalog(rec, client, ctx, r):
+    roll = r.random()
+    if roll < 0.4:
+        await rec.timed(client, "GET", f"/evento/?skip={r.randrange(0, 500)}&limit=20")
+    elif roll < 0.8:
+        await rec.timed(client, "GET", f"/evento/{r.choice(ctx['event_ids'])}")
+    elif roll < 0.9:
+        await rec.timed(client, "GET", r.choice(("/genero/", "/localidad/")))
+    else:
+        await rec.timed(client, "GET", "/evento/facets")
+
+
+async def step_search(rec, client, ctx, r):
+    roll = r.random()
+    if roll < 0.6:
+        params = {"tipo": r.choice(TIPOS), "localidad_id": r.choice(ctx["localidad_ids"])}
+        if r.random() < 0.5:
+            params["q"] = str(r.randrange(1, 100))
+        await rec.timed(client, "GET", "/evento/search", params=params)
+    elif roll < 0.8:
+        params = {"genero_id": r.choice(ctx["genero_ids"]), "precio_max": r.choice((20, 50, 100))}
+        await rec.timed(client, "GET", "/evento/facets", params=params)
+    else:
+        month = f"{r.choice((2025, 2026))}-{r.randrange(1, 13):02d}"
+        await rec.timed(client, "GET", "/evento/calendar", params={"month": month})
+
+
+async def step_purchase(rec, client, ctx, r):
+    params = {"evento_id": r.choice(ctx["on_sale"]), "cantidad": r.choice((1, 1, 2))}
+    await rec.timed(client, "POST", "/tickets/purchase", params=params, headers=bearer(r.choice(ctx["user_tokens"])))
+
+
+async def step_scan(rec, client, ctx, r):
+    if not ctx["gate_tickets"]:
+        await asyncio.sleep(0.01)
+        return
+    ticket_id = ctx["gate_tickets"].pop()
+    headers = bearer(ctx["gate_token"])
+    await rec.timed(client, "POST", "/scanner/validate-ticket", json={"ticket_id": ticket_id}, headers=headers)
+    await rec.timed(client, "POST", f"/scanner/activate-ticket/{ticket_id}", headers=headers)
+
+
+async def step_stats(rec, client, ctx, r):
+    evento_id, token = r.choice(ctx["stats_events"])
+    await rec.timed(client, "GET", f"/evento/{evento_id}/estadisticas", headers=bearer(token))
+
+
+async def step_login(rec, client, ctx, r):
+    body = {"email": r.choice(ctx["user_emails"]), "contrasena": PASSWORD}
+    await rec.timed(client, "POST", "/login", json=body)
+
+
+# nombre -> (paso, clientes por defecto)
+SCENARIOS = {
+    "catalog": (step_catalog, 50),
+    "search": (step_search, 50),
+    "purchase": (step_purchase, 30),
+    "scan": (step_scan, 10),
+    "stats": (step_stats, 10),
+    "login": (step_login, 8),  # Por debajo de workers + cola del pool de bcrypt
+}
+
+
+async def run_scenario(base_url: str, step, clients: int, seconds: float, ctx: dict, seed: int) -> dict:
+    rec = Recorder()
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + seconds
+
+        async def worker(n):
+            r = random.Random(f"{seed}:{n}")
+            while time.perf_counter() < deadline:
+                await step(rec, client, ctx, r)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker(n) for n in range(clients)])
+        elapsed = time.perf_counter() - started
+    return summarize(rec, elapsed, clients)
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def summarize(rec: Recorder, elapsed: float, clients: int) -> dict:
+    latencies = sorted(rec.latencies)
+    total = len(latencies)
+    return {
+        "clients": clients,
+        "requests": total,
+        "req_per_s": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 1) if latencies else 0.0,
+        "p95_ms": round(percentile(latencies, 0.95), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1),
+        "errors": rec.errors,
+        "error_rate": round(rec.errors / total, 4) if total else 0.0,
+        "client_errors": rec.client_errors,
+        "client_error_rate": round(rec.client_errors / total, 4) if total else 0.0,
+        "shed": rec.shed,
+        "shed_rate": round(rec.shed / total, 4) if total else 0.0,
+        "statuses": {str(code): n for code, n in sorted(rec.statuses.items())},
+    }
+
+
+# ============================================
+# BASELINES
+# ============================================
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Regresiones de results frente a baseline (lista de mensajes)"""
+    problems = []
+    for name, current in results["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            problems.append(f"{name}: p95 {current['p95_ms']} ms > {base['p95_ms']} ms (+{tolerance:.0%})")
+        if current["req_per_s"] < base["req_per_s"] * (1 - tolerance):
+            problems.append(f"{name}: {current['req_per_s']} req/s < {base['req_per_s']} req/s (-{tolerance:.0%})")
+        if current["error_rate"] > base["error_rate"] + 0.01:
+            problems.append(f"{name}: tasa de errores {current['error_rate']:.2%} (baseline {base['error_rate']:.2%})")
+        if current["client_error_rate"] > base.get("client_error_rate", 0.0) + 0.01:
+            problems.append(
+                f"{name}: respuestas 4xx {current['client_error_rate']:.2%} (baseline {base.get('client_error_rate', 0.0):.2%})"
+            )
+        if current["shed_rate"] > base.get("shed_rate", 0.0) + 0.01:
+            problems.append(f"{name}: rechazadas {current['shed_rate']:.2%} (baseline {base.get('shed_rate', 0.0):.2%})")
+    return problems
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+# ============================================
+# MAIN
+# ============================================
+
+async def wait_until_up(base_url: str) -> None:
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        for _ in range(300):
+            try:
+                await client.get("/health")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError("El servidor no ha arrancado")
+
+
+def run_suite(args, database_url: str) -> dict:
+    env = dict(
+        os.environ, ENV="production", DATABASE_URL=database_url, RATE_LIMIT_ENABLED="False",
+        LOG_LEVEL="WARNING", LOG_LEVELS="njoy.queries=ERROR", DATABASE_REPLICA_URLS="",
+    )
+    os.environ.update(env)
+    sys.path.insert(0, ROOT)
+    ctx = prepare_context(args.seed)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+         "--log-level", "warning", "--no-access-log", "--backlog", "2048"],
+        cwd=ROOT, env=env,
+    )
+    scenarios = {}
+    try:
+        asyncio.run(wait_until_up(base_url))
+        # Calentamiento: tarjetas del catálogo y cachés
+        asyncio.run(run_scenario(base_url, step_catalog, 10, args.warmup, ctx, args.seed))
+        for name in args.scenarios:
+            step, default_clients = SCENARIOS[name]
+            clients = args.clients or default_clients
+            result = asyncio.run(run_scenario(base_url, step, clients, args.seconds, ctx, args.seed))
+            scenarios[name] = result
+            print(
+                f"{name:<9} {clients:>4} clientes  {result['req_per_s']:8.1f} req/s  p50 {result['p50_ms']:7.1f}  "
+                f"p95 {result['p95_ms']:7.1f}  p99 {result['p99_ms']:7.1f} ms  errores {result['errors']}  4xx {result['client_errors']}  "
+                f"rechazadas {result['shed']}"
+            )
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {
+            "scale": args.scale, "seed": args.seed, "seconds": args.seconds,
+            "database": "custom" if args.database_url else "sqlite",
+        },
+        "scenarios": scenarios,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Lista separada por comas")
+    parser.add_argument("--seconds", type=float, default=10, help="Duración de cada escenario")
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--clients", type=int, default=0, help="Clientes por escenario (0 = el de cada escenario)")
+    parser.add_argument("--scale", type=float, default=0.01, help="Escala de generate_data.py")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", default="", help="Base ya poblada (se modifica: compras, escaneos)")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--output", help="Guardar los resultados en este fichero JSON")
+    parser.add_argument("--save-baseline", metavar="NOMBRE", help="Guardar como benchmarks/baselines/NOMBRE.json")
+    parser.add_argument("--baseline", metavar="NOMBRE", help="Comparar con benchmarks/baselines/NOMBRE.json")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Empeoramiento admitido (0.25 = 25%%)")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(unknown)}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url
+        if not database_url:
+            database_url = f"sqlite:///{os.path.join(tmp, 'perf.db')}"
+            subprocess.run(
+                [sys.executable, os.path.join(ROOT, "benchmarks", "generate_data.py"),
+                 "--database-url", database_url, "--scale", str(args.scale), "--seed", str(args.seed)],
+                check=True, stdout=subprocess.DEVNULL,
+            )
+        results = run_suite(args, database_url)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+        path = os.path.join(BASELINES_DIR, f"{args.save_baseline}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline guardado en {os.path.relpath(path, ROOT)}")
+    if args.baseline:
+        with open(os.path.join(BASELINES_DIR, f"{args.baseline}.json"), encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(results, baseline, args.tolerance)
+        if problems:
+            print("REGRESIONES frente al baseline " + args.baseline + ":")
+            for problem in problems:
+                print(f"  {problem}")
+            sys.exit(1)
+        print(f"Sin regresiones frente al baseline {args.baseline} (tolerancia {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Replay de tráfico capturado (traffic_capture.py) contra una instancia local
+
+Relanza las peticiones del fichero JSONL respetando los intervalos
+originales (--speed 2 = el doble de rápido, --speed 0 = sin esperas) y
+compara, por ruta, la latencia capturada con la del replay.
+
+Autenticación: cada seudónimo de usuario de la captura se asigna a un
+usuario local del mismo rol y se firma un token con la SECRET_KEY del
+entorno (la misma que la instancia local). Hace falta --database-url, la
+base de esa instancia. Los cuerpos de login llevan las credenciales
+borradas: se sustituyen por las de --credentials.
+
+La captura solo guarda los valores de traffic_capture.SAFE_FIELDS; el resto
+(textos de búsqueda, coordenadas del usuario, códigos de ticket...) llega
+como "***" y se envía tal cual, así que esas peticiones pueden acabar en
+404 o 422 en lugar de repetir el trabajo original.
+
+Los ids de la captura (eventos, tickets...) son los de producción: en una
+base local sin esos datos muchas rutas de detalle darán 404. Las compras y
+escaneos se ejecutan de verdad: usar una base de pruebas.
+
+Con --output se guardan los resultados; con --compare se comparan con un
+replay anterior (antes / después de un cambio) y sale con código 1 si el
+p95 de alguna ruta con suficientes muestras empeora más de --tolerance.
+
+Uso:
+    python benchmarks/replay_traffic.py /tmp/traffic_capture.jsonl --database-url sqlite:///./njoy_local.db
+    python benchmarks/replay_traffic.py /tmp/traffic_capture.jsonl --database-url ... --speed 4 --output antes.json
+    python benchmarks/replay_traffic.py /tmp/traffic_capture.jsonl --database-url ... --compare antes.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRUBBED = "***"  # traffic_capture.SCRUBBED
+
+# Rutas con menos muestras no cuentan para --compare
+MIN_SAMPLES = 20
+
+
+def load_capture(paths: list) -> list:
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    return sorted(records, key=lambda record: record["ts"])
+
+
+def local_tokens(database_url: str, records: list) -> dict:
+    """Seudónimo de la captura -> token de un usuario local del mismo rol"""
+    os.environ["DATABASE_URL"] = database_url
+    sys.path.insert(0, ROOT)
+    import models
+    from auth import create_access_token
+    from database import SessionLocal
+
+    roles = {}
+    for record in records:
+        if record.get("user") and record["user"] not in roles:
+            roles[record["user"]] = record.get("role") or "user"
+
+    db = SessionLocal()
+    try:
+        by_role = defaultdict(list)
+        for user in db.query(models.Usuario).filter(models.Usuario.is_active.is_(True)).order_by(models.Usuario.id):
+            by_role[user.role].append(user)
+        tokens = {}
+        used = defaultdict(int)
+        for pseudonym, role in roles.items():
+            candidates = by_role.get(role) or by_role.get("user")
+            if not candidates:
+                continue
+            user = candidates[used[role] % len(candidates)]
+            used[role] += 1
+            tokens[pseudonym] = create_access_token(data={"sub": str(user.id), "email": user.email})
+        return tokens
+    finally:
+        db.close()
+
+
+def build_request(record: dict, tokens: dict, credentials) -> dict:
+    url = record["path"] + (f"?{record['query']}" if record.get("query") else "")
+    kwargs = {"method": record["method"], "url": url, "headers": {}}
+    token = tokens.get(record.get("user"))
+    if token:
+        kwargs["headers"]["Authorization"] = f"Bearer {token}"
+    body = record.get("body")
+    if body is not None:
+        if credentials and isinstance(body, dict):
+            email, password = credentials
+            body = dict(body)
+            for key, value in (("email", email), ("contrasena", password), ("password", password)):
+                if body.get(key) == SCRUBBED:
+                    body[key] = value
+        kwargs["json"] = body
+    elif record.get("body_size"):
+        # Cuerpo no guardado (no JSON o demasiado grande): se envía uno del mismo tamaño
+        kwargs["content"] = b"\0" * record["body_size"]
+        if record.get("content_type"):
+            kwargs["headers"]["Content-Type"] = record["content_type"]
+    return kwargs
+
+
+async def replay(records: list, base_url: str, tokens: dict, credentials, speed: float, concurrency: int) -> dict:
+    results = []
+    lags = []
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+
+        async def send(record):
+            try:
+                start = time.perf_counter()
+                try:
+                    response = await client.request(**build_request(record, tokens, credentials))
+                    status = response.status_code
+                except httpx.HTTPError:
+                    status = None
+                results.append((record, status, (time.perf_counter() - start) * 1000))
+            finally:
+                semaphore.release()
+
+        tasks = []
+        t0 = records[0]["ts"]
+        started = time.perf_counter()
+        for record in records:
+            if speed > 0:
+                delay = (record["ts"] - t0) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await semaphore.acquire()
+            if speed > 0:
+                # Retraso sobre el momento previsto: si crece, el cliente no da abasto
+                lags.append(max(0.0, (time.perf_counter() - started) - (record["ts"] - t0) / speed) * 1000)
+            tasks.append(asyncio.create_task(send(record)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    return summarize(results, elapsed, lags)
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def summarize(results: list, elapsed: float, lags: list) -> dict:
+    routes = defaultdict(lambda: {"captured": [], "replay": [], "errors": 0, "statuses": defaultdict(int)})
+    for record, status, ms in results:
+        entry = routes[f"{record['method']} {record.get('route') or record['path']}"]
+        entry["captured"].append(record["duration_ms"])
+        entry["replay"].append(ms)
+        entry["statuses"][str(status)] += 1
+        if status is None or status >= 500:
+            entry["errors"] += 1
+
+    summary = {}
+    for name, entry in sorted(routes.items()):
+        captured, replayed = sorted(entry["captured"]), sorted(entry["replay"])
+        summary[name] = {
+            "requests": len(replayed),
+            "captured_p50_ms": round(statistics.median(captured), 1),
+            "captured_p95_ms": round(percentile(captured, 0.95), 1),
+            "p50_ms": round(statistics.median(replayed), 1),
+            "p95_ms": round(percentile(replayed, 0.95), 1),
+            "p99_ms": round(percentile(replayed, 0.99), 1),
+            "errors": entry["errors"],
+            "statuses": dict(sorted(entry["statuses"].items())),
+        }
+    all_ms = sorted(ms for _, _, ms in results)
+    return {
+        "requests": len(results),
+        "seconds": round(elapsed, 1),
+        "req_per_s": round(len(results) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(statistics.median(all_ms), 1) if all_ms else 0.0,
+        "p95_ms": round(percentile(all_ms, 0.95), 1),
+        "max_lag_ms": round(max(lags), 1) if lags else 0.0,
+        "routes": summary,
+    }
+
+
+def compare(current: dict, previous: dict, tolerance: float) -> list:
+    """Rutas cuyo p95 empeora más de tolerance frente al replay anterior"""
+    problems = []
+    print(f"\n{'ruta':<55} {'p95 antes':>10} {'p95 ahora':>10} {'cambio':>8}")
+    for name, route in current["routes"].items():
+        before = previous["routes"].get(name)
+        if before is None or min(route["requests"], before["requests"]) < MIN_SAMPLES:
+            continue
+        change = route["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+        print(f"{name[:55]:<55} {before['p95_ms']:>10.1f} {route['p95_ms']:>10.1f} {change:>+8.0%}")
+        if change > tolerance:
+            problems.append(f"{name}: p95 {route['p95_ms']} ms (antes {before['p95_ms']} ms, {change:+.0%})")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", nargs="+", help="Ficheros JSONL de traffic_capture.py")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--database-url", help="Base de la instancia local (para los tokens)")
+    parser.add_argument("--credentials", help="email:contraseña para los logins capturados")
+    parser.add_argument("--speed", type=float, default=1.0, help="Multiplicador de velocidad (0 = sin esperas)")
+    parser.add_argument("--concurrency", type=int, default=100, help="Peticiones en vuelo como máximo")
+    parser.add_argument("--output", help="Guardar los resultados en este fichero JSON")
+    parser.add_argument("--compare", help="Resultados JSON de un replay anterior")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Empeoramiento admitido del p95 (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    records = load_capture(args.capture)
+    if not records:
+        parser.error("La captura está vacía")
+    credentials = tuple(args.credentials.split(":", 1)) if args.credentials else None
+    tokens = local_tokens(args.database_url, records) if args.database_url else {}
+    if not args.database_url and any(record.get("user") for record in records):
+        print("Aviso: sin --database-url las peticiones autenticadas se envían sin token")
+
+    results = asyncio.run(replay(records, args.base_url, tokens, credentials, args.speed, args.concurrency))
+
+    print(f"{'ruta':<55} {'n':>6} {'capt p50':>9} {'capt p95':>9} {'p50':>8} {'p95':>8} {'errores':>8}")
+    for name, route in results["routes"].items():
+        print(
+            f"{name[:55]:<55} {route['requests']:>6} {route['captured_p50_ms']:>9.1f} {route['captured_p95_ms']:>9.1f} "
+            f"{route['p50_ms']:>8.1f} {route['p95_ms']:>8.1f} {route['errors']:>8}"
+        )
+    print(
+        f"\n{results['requests']} peticiones en {results['seconds']} s ({results['req_per_s']} req/s)  "
+        f"p50 {results['p50_ms']} ms  p95 {results['p95_ms']} ms  retraso máximo {results['max_lag_ms']} ms"
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        problems = compare(results, previous, args.tolerance)
+        if problems:
+            print("\nREGRESIONES frente al replay anterior:")
+            for problem in problems:
+                print(f"  {problem}")
+            sys.exit(1)
+        print(f"\nSin regresiones frente a {args.compare} (tolerancia {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
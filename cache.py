@@ -0,0 +1,369 @@
+"""
+Caché en memoria del proceso para las lecturas del catálogo público
+
+Cada tabla del catálogo (VERSIONED_TABLES) tiene una fila en TABLE_VERSION
+con un contador que se incrementa al confirmar la transacción que la escribe.
+Las claves de caché incluyen las versiones de las tablas de las que
+dependen, así que una escritura invalida las entradas afectadas sin tener
+que recorrerlas: simplemente dejan de coincidir y el LRU las acaba
+expulsando.
+
+Las mismas versiones sirven para generar ETags débiles y responder
+304 Not Modified en los endpoints públicos del catálogo. Como están en la
+base de datos, todas las instancias ven el mismo valor, también tras las
+escrituras de otra instancia o de los scripts que escriben con Core
+(archive.py, generate_data.py), que llaman a bump_tables().
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from itertools import chain
+from typing import Any, Awaitable, Callable, Hashable, Optional, Tuple
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import DateTime, Integer, String, column, event, insert, select, table, update
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, attributes
+
+from config import settings
+
+logger = logging.getLogger("njoy.cache")
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Diccionario LRU acotado con caducidad por entrada (thread-safe)"""
+
+    def __init__(self, maxsize: int = 512, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# Caché compartida por los endpoints del catálogo
+catalog_cache = TTLCache(
+    maxsize=settings.CATALOG_CACHE_MAX_ENTRIES,
+    ttl=settings.CATALOG_CACHE_TTL_SECONDS,
+)
+
+
+# ============================================
+# VERSIONES POR TABLA (TABLE_VERSION)
+# ============================================
+
+# Tablas de las que dependen las respuestas cacheadas; solo estas se versionan
+VERSIONED_TABLES = frozenset({"EVENTO", "TICKET", "LOCALIDAD", "GENERO", "ARTISTA", "ORGANIZADOR"})
+
+# models.TableVersion (cache.py no puede importar models: database.py importa este módulo)
+table_versions = table(
+    "TABLE_VERSION",
+    column("tabla", String),
+    column("version", Integer),
+    column("updated_at", DateTime),
+)
+
+
+def bump_tables(conn: Connection, *tables: str) -> None:
+    """Incrementar la versión de las tablas dentro de la transacción de conn"""
+    now = datetime.now()
+    for name in sorted(set(tables) & VERSIONED_TABLES):
+        updated = conn.execute(
+            update(table_versions)
+            .where(table_versions.c.tabla == name)
+            .values(version=table_versions.c.version + 1, updated_at=now)
+        ).rowcount
+        if not updated:
+            # Bases creadas con create_all, sin las filas de la migración
+            conn.execute(insert(table_versions).values(tabla=name, version=1, updated_at=now))
+
+
+_VERSIONS_KEY = "cache_table_versions"
+
+
+def _session_versions(db: Session) -> Optional[dict]:
+    """
+    Filas de TABLE_VERSION, leídas una sola vez por transacción de la sesión
+
+    Se leen antes que los datos y por la misma sesión que los lee (réplica
+    o primario). Una réplica reproduce los cambios en orden: si va atrasada,
+    las versiones van tan atrasadas como los datos, y un cuerpo viejo nunca
+    se cachea ni se etiqueta con una versión nueva. None si no se pueden
+    leer (p. ej. una réplica que aún no tiene la migración 6).
+    """
+    if _VERSIONS_KEY not in db.info:
+        try:
+            rows = {
+                tabla: (version, updated_at)
+                for tabla, version, updated_at in db.execute(
+                    select(table_versions.c.tabla, table_versions.c.version, table_versions.c.updated_at)
+                )
+            }
+        except sa_exc.DBAPIError:
+            logger.warning("No se pueden leer las versiones de TABLE_VERSION: respuestas sin caché", exc_info=True)
+            db.rollback()
+            rows = None
+        db.info[_VERSIONS_KEY] = rows
+    return db.info[_VERSIONS_KEY]
+
+
+def table_versions_for(db: Session, tables: Tuple[str, ...]) -> Optional[Tuple[Tuple[int, ...], float]]:
+    """(versiones de las tablas, timestamp de su último cambio), o None si no se conocen"""
+    if _pending_tables(db) & set(tables):
+        # Escrituras de esta transacción aún sin versionar (se versionan en el commit)
+        return None
+    rows = _session_versions(db)
+    if rows is None:
+        return None
+    versions = tuple(rows[t][0] if t in rows else 0 for t in tables)
+    modified = max([rows[t][1].timestamp() for t in tables if t in rows], default=0.0)
+    return versions, modified
+
+
+def versioned_key(db: Session, namespace: str, tables: Tuple[str, ...], key: Hashable) -> Optional[tuple]:
+    """Clave de catalog_cache que deja de coincidir cuando cambia alguna de las tablas (None: no cachear)"""
+    current = table_versions_for(db, tables)
+    return (namespace, current[0], key) if current is not None else None
+
+
+def cached(db: Session, namespace: str, tables: Tuple[str, ...], key: Hashable, loader: Callable[[], Any]) -> Any:
+    """
+    Read-through: devuelve el valor cacheado o lo calcula con `loader`
+
+    Args:
+        db: Sesión de la petición (para leer las versiones)
+        namespace: Nombre lógico de la consulta (ej: "facets")
+        tables: Tablas de las que depende el resultado
+        key: Clave normalizada de los parámetros de la consulta
+        loader: Función sin argumentos que calcula el valor
+    """
+    full_key = versioned_key(db, namespace, tables, key)
+    if full_key is None:
+        return loader()
+    value = catalog_cache.get(full_key, _MISSING)
+    if value is _MISSING:
+        value = loader()
+        catalog_cache.set(full_key, value)
+    return value
+
+
+def cached_json(
+    db: Session,
+    namespace: str,
+    tables: Tuple[str, ...],
+    key: Hashable,
+    loader: Callable[[], Any],
+    adapter: TypeAdapter,
+) -> bytes:
+    """
+    Como `cached`, pero guarda el resultado ya serializado a JSON
+
+    El resultado de `loader` (objetos ORM o dicts) se valida y serializa una
+    sola vez con `adapter`; las peticiones siguientes devuelven los bytes tal cual.
+    """
+    return cached(
+        db,
+        namespace,
+        tables,
+        key,
+        lambda: adapter.dump_json(adapter.validate_python(loader(), from_attributes=True)),
+    )
+
+
+def json_bytes_response(body: bytes) -> Response:
+    """Respuesta con JSON ya serializado (sin pasar por response_model)"""
+    return Response(content=body, media_type="application/json")
+
+
+# ============================================
+# PETICIONES CONDICIONALES (ETag / 304)
+# ============================================
+
+def etag_for(request: Request, versions: Tuple[int, ...]) -> str:
+    """ETag débil: versiones de las tablas + la URL (cada recurso tiene el suyo)"""
+    url = request.url.path + "?" + request.url.query
+    return 'W/"%s-%s"' % (".".join(str(v) for v in versions), hashlib.sha1(url.encode()).hexdigest()[:8])
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Comparación débil: se ignora el prefijo W/
+    opaque = etag[2:]
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def _not_modified_since(if_modified_since: str, modified: float) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    # Last-Modified tiene resolución de segundos
+    return int(modified) <= since.timestamp()
+
+
+def _conditional(request: Request, current: Optional[Tuple[Tuple[int, ...], float]]) -> Tuple[dict, bool]:
+    """Cabeceras de caché de la respuesta y si el cliente ya tiene la versión actual"""
+    headers = {
+        "Cache-Control": (
+            f"public, max-age=0, s-maxage={settings.CATALOG_EDGE_MAX_AGE_SECONDS}, "
+            f"stale-while-revalidate={settings.CATALOG_STALE_WHILE_REVALIDATE_SECONDS}"
+        ),
+        # El middleware de CORS añade Access-Control-Allow-Origin según el Origin
+        "Vary": "Origin",
+    }
+    if current is None:
+        # Sin versiones no hay validadores: siempre se responde el cuerpo
+        return headers, False
+
+    versions, modified = current
+    etag = etag_for(request, versions)
+    headers["ETag"] = etag
+    headers["Last-Modified"] = formatdate(modified, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        not_modified = if_modified_since is not None and _not_modified_since(if_modified_since, modified)
+
+    return headers, not_modified
+
+
+def conditional_response(
+    request: Request,
+    db: Session,
+    tables: Tuple[str, ...],
+    build_body: Callable[[], bytes],
+) -> Response:
+    """
+    Responder 304 si el cliente ya tiene la versión actual; si no, construir el cuerpo
+
+    El 304 se decide con una sola consulta a TABLE_VERSION, sin construir
+    el cuerpo. Se añade Cache-Control con s-maxage para que el edge de
+    Vercel sirva las repeticiones sin llegar a la función.
+    """
+    headers, not_modified = _conditional(request, table_versions_for(db, tables))
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    return Response(content=build_body(), media_type="application/json", headers=headers)
+
+
+async def conditional_response_async(
+    request: Request,
+    db: AsyncSession,
+    tables: Tuple[str, ...],
+    build_body: Callable[[], Awaitable[bytes]],
+) -> Response:
+    """Como conditional_response, para endpoints async (build_body es una corrutina)"""
+    headers, not_modified = _conditional(request, await db.run_sync(table_versions_for, tables))
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    return Response(content=await build_body(), media_type="application/json", headers=headers)
+
+
+# ============================================
+# INVALIDACIÓN AUTOMÁTICA EN COMMIT
+# ============================================
+# Los flushes solo anotan las tablas escritas; los incrementos se aplican
+# todos juntos en before_commit, en orden alfabético. Así el bloqueo de cada
+# fila de TABLE_VERSION dura solo hasta el commit y dos transacciones los
+# toman siempre en el mismo orden (sin interbloqueos).
+
+_PENDING_TABLES_KEY = "cache_pending_tables"
+
+# Tablas en las que solo algunas columnas cambian lo que muestra el catálogo.
+# En TICKET cuentan las altas y bajas (entradas vendidas) y mover un ticket
+# de evento; un escaneo (activado, scanned_at) no invalida nada
+_VISIBLE_COLUMNS = {"TICKET": ("evento_id",)}
+
+
+def _pending_tables(session: Session) -> set:
+    return session.info.setdefault(_PENDING_TABLES_KEY, set())
+
+
+def _changes_visible_data(obj) -> bool:
+    """Si un objeto modificado cambia alguna columna que el catálogo muestra"""
+    columns = _VISIBLE_COLUMNS.get(getattr(obj, "__tablename__", None))
+    if columns is None:
+        return True
+    return any(attributes.get_history(obj, name).has_changes() for name in columns)
+
+
+def _mark_tables(session: Session, tables) -> None:
+    pending = set(tables) & VERSIONED_TABLES
+    if pending:
+        _pending_tables(session).update(pending)
+        # Las versiones leídas antes ya no describen lo que ve esta transacción
+        session.info.pop(_VERSIONS_KEY, None)
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_changed_tables(session, flush_context):
+    """Anotar las tablas escritas en este flush (la historia aún está disponible)"""
+    changed = chain(session.new, session.deleted, filter(_changes_visible_data, session.dirty))
+    _mark_tables(session, {getattr(obj, "__tablename__", None) for obj in changed})
+
+
+@event.listens_for(Session, "after_bulk_update")
+@event.listens_for(Session, "after_bulk_delete")
+def _mark_bulk_changes(context):
+    """query(...).update()/delete() no pasan por el flush"""
+    _mark_tables(context.session, {context.mapper.local_table.name})
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_pending_tables(session):
+    """Incrementar una vez, en orden fijo, las tablas escritas en la transacción"""
+    # El commit hace su flush después de este evento: se adelanta para anotar sus tablas
+    session.flush()
+    pending = session.info.pop(_PENDING_TABLES_KEY, None)
+    if pending:
+        bump_tables(session.connection(), *pending)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _end_transaction(session):
+    session.info.pop(_PENDING_TABLES_KEY, None)
+    session.info.pop(_VERSIONS_KEY, None)
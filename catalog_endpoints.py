@@ -0,0 +1,500 @@
+"""
+Endpoints de descubrimiento del catálogo de eventos (públicos)
+"""
+import math
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import Integer, String, case, cast, func, literal, or_, select, tuple_, union_all
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import models
+import cache
+import catalog_schemas
+from auth import get_read_db
+
+router = APIRouter()
+
+
+# ============================================
+# FILTROS COMUNES DE BÚSQUEDA
+# ============================================
+
+def normalize_event_filters(
+    q: Optional[str] = None,
+    tipo: Optional[str] = None,
+    genero_id: Optional[int] = None,
+    precio_min: Optional[float] = None,
+    precio_max: Optional[float] = None,
+    localidad_id: Optional[int] = None,
+    fecha_desde: Optional[str] = None,
+    fecha_hasta: Optional[str] = None,
+) -> dict:
+    """
+    Limpiar los filtros de búsqueda de eventos
+
+    - Descarta los vacíos y las fechas con formato inválido (se ignoran, igual que en /evento/search)
+    - Convierte las fechas (YYYY-MM-DD) a datetime; fecha_hasta incluye el día completo
+    - La búsqueda por nombre no distingue mayúsculas, así que se normaliza a minúsculas
+    """
+    filters = {}
+    if q and q.strip():
+        filters["q"] = q.strip().lower()
+    if tipo:
+        filters["tipo"] = tipo
+    if genero_id:
+        filters["genero_id"] = genero_id
+    if precio_min is not None:
+        filters["precio_min"] = precio_min
+    if precio_max is not None:
+        filters["precio_max"] = precio_max
+    if localidad_id:
+        filters["localidad_id"] = localidad_id
+    if fecha_desde:
+        try:
+            filters["fecha_desde"] = datetime.strptime(fecha_desde, "%Y-%m-%d")
+        except ValueError:
+            pass
+    if fecha_hasta:
+        try:
+            hasta = datetime.strptime(fecha_hasta, "%Y-%m-%d")
+            filters["fecha_hasta"] = hasta.replace(hour=23, minute=59, second=59)
+        except ValueError:
+            pass
+    return filters
+
+
+def filters_cache_key(filters: dict) -> tuple:
+    """Clave estable para cachear resultados por combinación de filtros"""
+    return tuple(sorted(filters.items()))
+
+
+def apply_event_filters(query, filters: dict):
+    """Aplicar filtros normalizados a una query (Query o Select) sobre Evento"""
+    if "q" in filters:
+        query = query.filter(models.Evento.nombre.ilike(f"%{filters['q']}%"))
+    if "tipo" in filters:
+        query = query.filter(models.Evento.tipo == filters["tipo"])
+    if "genero_id" in filters:
+        query = query.filter(models.Evento.genero_id == filters["genero_id"])
+    if "precio_min" in filters:
+        query = query.filter(models.Evento.precio >= filters["precio_min"])
+    if "precio_max" in filters:
+        query = query.filter(models.Evento.precio <= filters["precio_max"])
+    if "localidad_id" in filters:
+        query = query.filter(models.Evento.localidad_id == filters["localidad_id"])
+    if "fecha_desde" in filters:
+        query = query.filter(models.Evento.fechayhora >= filters["fecha_desde"])
+    if "fecha_hasta" in filters:
+        query = query.filter(models.Evento.fechayhora <= filters["fecha_hasta"])
+    return query
+
+
+# ============================================
+# FACETAS
+# ============================================
+
+FACETS = ("tipo", "genero_id", "localidad_id", "precio", "fecha")
+INT_FACETS = ("genero_id", "localidad_id")
+
+# Orden de presentación de los rangos (el resto de facetas se ordena por conteo)
+PRICE_BUCKETS = ("gratis", "0-20", "20-50", "50-100", "100+")
+DATE_BUCKETS = ("pasado", "hoy", "7_dias", "30_dias", "mas_adelante")
+
+
+def _price_bucket(precio):
+    return case(
+        (or_(precio.is_(None), precio <= 0), "gratis"),
+        (precio < 20, "0-20"),
+        (precio < 50, "20-50"),
+        (precio < 100, "50-100"),
+        else_="100+",
+    )
+
+
+def _date_bucket(fechayhora, now: datetime):
+    fin_de_hoy = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return case(
+        (fechayhora < now, "pasado"),
+        (fechayhora < fin_de_hoy, "hoy"),
+        (fechayhora < now + timedelta(days=7), "7_dias"),
+        (fechayhora < now + timedelta(days=30), "30_dias"),
+        else_="mas_adelante",
+    )
+
+
+def compute_event_facets(db: Session, filters: dict) -> dict:
+    """
+    Calcular los conteos de todas las facetas en una sola consulta
+
+    Los rangos se calculan en una subconsulta para que el GROUP BY agrupe por
+    columnas simples. PostgreSQL usa GROUPING SETS; SQLite y MySQL no lo
+    soportan, así que se usa un UNION ALL de un GROUP BY por faceta.
+    """
+    now = datetime.now()
+    eventos = apply_event_filters(
+        select(
+            models.Evento.tipo,
+            models.Evento.genero_id,
+            models.Evento.localidad_id,
+            _price_bucket(models.Evento.precio).label("precio"),
+            _date_bucket(models.Evento.fechayhora, now).label("fecha"),
+        ),
+        filters,
+    ).subquery("eventos")
+    columns = [eventos.c[facet] for facet in FACETS]
+
+    counts = {facet: [] for facet in FACETS}
+    total = 0
+
+    if db.get_bind().dialect.name == "postgresql":
+        stmt = select(
+            *columns,
+            *[func.grouping(column) for column in columns],
+            func.count().label("n"),
+        ).group_by(func.grouping_sets(*[tuple_(column) for column in columns], tuple_()))
+
+        for row in db.execute(stmt):
+            values, grouped, n = row[:len(FACETS)], row[len(FACETS):-1], row[-1]
+            if all(grouped):
+                total = n
+                continue
+            index = grouped.index(0)
+            counts[FACETS[index]].append((values[index], n))
+    else:
+        parts = [
+            select(literal(facet).label("facet"), cast(column, String).label("value"), func.count().label("n"))
+            .group_by(column)
+            for facet, column in zip(FACETS, columns)
+        ]
+        parts.append(
+            select(literal("total").label("facet"), cast(literal(None), String).label("value"), func.count().label("n"))
+            .select_from(eventos)
+        )
+
+        for facet, value, n in db.execute(union_all(*parts)):
+            if facet == "total":
+                total = n
+                continue
+            if facet in INT_FACETS and value is not None:
+                value = int(value)
+            counts[facet].append((value, n))
+
+    result = {"total": total}
+    for facet, values in counts.items():
+        if facet == "precio":
+            values.sort(key=lambda item: PRICE_BUCKETS.index(item[0]))
+        elif facet == "fecha":
+            values.sort(key=lambda item: DATE_BUCKETS.index(item[0]))
+        else:
+            values.sort(key=lambda item: -item[1])
+        result[facet] = [{"value": value, "count": n} for value, n in values]
+    return result
+
+
+@router.get("/evento/facets", response_model=catalog_schemas.EventFacetsResponse, tags=["Events"])
+def get_event_facets(
+    q: Optional[str] = None,
+    tipo: Optional[str] = None,
+    genero_id: Optional[int] = None,
+    precio_min: Optional[float] = None,
+    precio_max: Optional[float] = None,
+    localidad_id: Optional[int] = None,
+    fecha_desde: Optional[str] = None,  # YYYY-MM-DD
+    fecha_hasta: Optional[str] = None,  # YYYY-MM-DD
+    db: Session = Depends(get_read_db)
+):
+    """
+    Conteos de eventos por tipo, género, localidad, rango de precio y rango
+    de fecha para los filtros actuales (endpoint público)
+
+    Acepta los mismos filtros que /evento/search. El resultado se cachea
+    por combinación de filtros y se invalida al modificar eventos.
+    """
+    filters = normalize_event_filters(
+        q, tipo, genero_id, precio_min, precio_max, localidad_id, fecha_desde, fecha_hasta
+    )
+    return cache.cached(
+        db,
+        "facets",
+        (models.Evento.__tablename__,),
+        filters_cache_key(filters),
+        lambda: compute_event_facets(db, filters),
+    )
+
+
+# ============================================
+# CALENDARIO
+# ============================================
+
+def _parse_month(month: str) -> tuple:
+    """'YYYY-MM' -> (inicio del mes, inicio del mes siguiente)"""
+    try:
+        start = datetime.strptime(month, "%Y-%m")
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Formato de mes inválido (usar YYYY-MM)"
+        )
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start, end
+
+
+def compute_event_calendar(db: Session, start: datetime, end: datetime, per_day: int) -> list:
+    """
+    Conteo de eventos por día y primeros ids, con un solo GROUP BY
+
+    El rango [start, end) sobre fechayhora usa el índice ix_EVENTO_fechayhora.
+    PostgreSQL agrega los ids ordenados con array_agg; SQLite y MySQL usan
+    group_concat sobre una subconsulta ya ordenada por fecha.
+    """
+    in_month = (models.Evento.fechayhora >= start) & (models.Evento.fechayhora < end)
+
+    if db.get_bind().dialect.name == "postgresql":
+        # Import diferido: el dialecto de Postgres no se carga con SQLite
+        from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+        dia = func.date(models.Evento.fechayhora)
+        stmt = (
+            select(
+                dia.label("dia"),
+                func.count().label("n"),
+                func.array_agg(aggregate_order_by(models.Evento.id, models.Evento.fechayhora, models.Evento.id)).label("ids"),
+            )
+            .where(in_month)
+            .group_by(dia)
+            .order_by(dia)
+        )
+        rows = [(str(dia_), n, list(ids)) for dia_, n, ids in db.execute(stmt)]
+    else:
+        eventos = (
+            select(models.Evento.id, models.Evento.fechayhora)
+            .where(in_month)
+            .order_by(models.Evento.fechayhora, models.Evento.id)
+            .subquery("eventos")
+        )
+        dia = func.date(eventos.c.fechayhora)
+        stmt = (
+            select(dia.label("dia"), func.count().label("n"), func.group_concat(eventos.c.id).label("ids"))
+            .group_by(dia)
+            .order_by(dia)
+        )
+        rows = [
+            (str(dia_), n, [int(i) for i in str(ids).split(",")] if ids else [])
+            for dia_, n, ids in db.execute(stmt)
+        ]
+
+    return [
+        {"fecha": dia_[:10], "count": n, "evento_ids": ids[:per_day]}
+        for dia_, n, ids in rows
+    ]
+
+
+@router.get("/evento/calendar", response_model=catalog_schemas.EventCalendarResponse, tags=["Events"])
+def get_event_calendar(
+    month: str,  # YYYY-MM
+    per_day: int = Query(3, ge=1, le=20),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Número de eventos por día de un mes y los primeros ids de cada día
+    (endpoint público, para la vista mensual del frontend)
+
+    Cacheado por mes; se invalida al modificar eventos.
+    """
+    start, end = _parse_month(month)
+    days = cache.cached(
+        db,
+        "calendar",
+        (models.Evento.__tablename__,),
+        (start.strftime("%Y-%m"), per_day),
+        lambda: compute_event_calendar(db, start, end, per_day),
+    )
+    return {"month": start.strftime("%Y-%m"), "days": days}
+
+
+# ============================================
+# MAPA (CLUSTERS POR REJILLA)
+# ============================================
+
+# Cada tile de zoom z mide 360 / 2^z grados y se divide en MAP_CELLS_PER_TILE x MAP_CELLS_PER_TILE celdas
+MAP_CELLS_PER_TILE = 8
+MAP_MAX_TILES = 256
+MAP_SAMPLE_IDS = 5
+
+
+def _parse_bbox(bbox: str) -> Tuple[float, float, float, float]:
+    """'min_lon,min_lat,max_lon,max_lat' -> tupla recortada a coordenadas válidas"""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox inválido (usar min_lon,min_lat,max_lon,max_lat)"
+        )
+    # float() acepta "nan" e "inf"
+    if not all(math.isfinite(v) for v in (min_lon, min_lat, max_lon, max_lat)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox inválido: las coordenadas deben ser números finitos"
+        )
+    if min_lon > max_lon or min_lat > max_lat:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox inválido: el mínimo es mayor que el máximo"
+        )
+    return (
+        max(min_lon, -180.0), max(min_lat, -90.0),
+        min(max_lon, 180.0), min(max_lat, 90.0),
+    )
+
+
+def _cell_index(value: float, offset: float, cell_size: float) -> int:
+    return int((value + offset) // cell_size)
+
+
+def _snap(db: Session, column, offset: float, cell_size: float):
+    """Índice de celda en SQL: floor((coord + offset) / cell_size)"""
+    value = (column + offset) / cell_size
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite no siempre tiene floor(); el valor nunca es negativo, así que truncar equivale
+        return cast(value, Integer)
+    return func.floor(value)
+
+
+def _sample_ids(value) -> List[int]:
+    if not value:
+        return []
+    ids = value if isinstance(value, list) else [int(i) for i in str(value).split(",")]
+    return sorted(ids)[:MAP_SAMPLE_IDS]
+
+
+def compute_map_tiles(
+    db: Session,
+    filters: dict,
+    zoom: int,
+    tiles: List[Tuple[int, int]],
+) -> Dict[Tuple[int, int], list]:
+    """
+    Clusters de los tiles indicados, con un solo GROUP BY por celda
+
+    Se consulta el rectángulo que cubre los tiles y se reparte cada celda en
+    su tile; los tiles sin eventos quedan con una lista vacía.
+    """
+    cell_size = 360.0 / (2 ** zoom) / MAP_CELLS_PER_TILE
+    tile_size = cell_size * MAP_CELLS_PER_TILE
+    tx0 = min(tx for tx, _ in tiles)
+    tx1 = max(tx for tx, _ in tiles)
+    ty0 = min(ty for _, ty in tiles)
+    ty1 = max(ty for _, ty in tiles)
+
+    lat = models.Localidad.latitud
+    lon = models.Localidad.longitud
+    cell_x = _snap(db, lon, 180.0, cell_size).label("cell_x")
+    cell_y = _snap(db, lat, 90.0, cell_size).label("cell_y")
+    if db.get_bind().dialect.name == "postgresql":
+        ids = func.array_agg(models.Evento.id)
+    else:
+        ids = func.group_concat(models.Evento.id)
+
+    stmt = apply_event_filters(
+        select(cell_x, cell_y, func.count().label("n"), func.avg(lat), func.avg(lon), ids)
+        .select_from(models.Evento)
+        .join(models.Localidad, models.Localidad.id == models.Evento.localidad_id)
+        .where(
+            lat.is_not(None), lon.is_not(None),
+            lon >= tx0 * tile_size - 180.0, lon < (tx1 + 1) * tile_size - 180.0,
+            lat >= ty0 * tile_size - 90.0, lat < (ty1 + 1) * tile_size - 90.0,
+        ),
+        filters,
+    ).group_by(cell_x, cell_y)
+
+    result = {tile: [] for tile in tiles}
+    for cx, cy, n, avg_lat, avg_lon, cell_ids in db.execute(stmt):
+        tile = (int(cx) // MAP_CELLS_PER_TILE, int(cy) // MAP_CELLS_PER_TILE)
+        if tile in result:
+            result[tile].append({
+                "cell": (int(cx), int(cy)),
+                "lat": avg_lat,
+                "lon": avg_lon,
+                "count": n,
+                "evento_ids": _sample_ids(cell_ids),
+            })
+    return result
+
+
+@router.get("/evento/map", response_model=catalog_schemas.EventMapResponse, tags=["Events"])
+def get_event_map(
+    bbox: str,  # min_lon,min_lat,max_lon,max_lat
+    zoom: int = Query(..., ge=0, le=20),
+    q: Optional[str] = None,
+    tipo: Optional[str] = None,
+    genero_id: Optional[int] = None,
+    precio_min: Optional[float] = None,
+    precio_max: Optional[float] = None,
+    localidad_id: Optional[int] = None,
+    fecha_desde: Optional[str] = None,  # YYYY-MM-DD
+    fecha_hasta: Optional[str] = None,  # YYYY-MM-DD
+    db: Session = Depends(get_read_db)
+):
+    """
+    Eventos agrupados en una rejilla que depende del zoom (endpoint público)
+
+    Las coordenadas de la localidad de cada evento se ajustan a la rejilla en
+    SQL. El resultado se cachea por (zoom, tile, filtros): al desplazar el
+    mapa solo se consultan los tiles que aún no están en caché.
+    """
+    filters = normalize_event_filters(
+        q, tipo, genero_id, precio_min, precio_max, localidad_id, fecha_desde, fecha_hasta
+    )
+    min_lon, min_lat, max_lon, max_lat = _parse_bbox(bbox)
+    cell_size = 360.0 / (2 ** zoom) / MAP_CELLS_PER_TILE
+
+    # Rango de celdas del bbox (la última celda incluye el borde superior)
+    max_cell = 2 ** zoom * MAP_CELLS_PER_TILE - 1
+    cx0 = min(_cell_index(min_lon, 180.0, cell_size), max_cell)
+    cx1 = min(_cell_index(max_lon, 180.0, cell_size), max_cell)
+    cy0 = min(_cell_index(min_lat, 90.0, cell_size), max_cell)
+    cy1 = min(_cell_index(max_lat, 90.0, cell_size), max_cell)
+
+    tiles = [
+        (tx, ty)
+        for tx in range(cx0 // MAP_CELLS_PER_TILE, cx1 // MAP_CELLS_PER_TILE + 1)
+        for ty in range(cy0 // MAP_CELLS_PER_TILE, cy1 // MAP_CELLS_PER_TILE + 1)
+    ]
+    if len(tiles) > MAP_MAX_TILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox demasiado grande para este zoom"
+        )
+
+    tables = (models.Evento.__tablename__, models.Localidad.__tablename__)
+    filters_key = filters_cache_key(filters)
+    versions_key = cache.versioned_key(db, "map", tables, filters_key)
+    keys = {tile: versions_key + (zoom, tile) for tile in tiles} if versions_key is not None else {}
+
+    clusters_by_tile = {}
+    missing = []
+    for tile in tiles:
+        clusters = cache.catalog_cache.get(keys[tile]) if keys else None
+        if clusters is None:
+            missing.append(tile)
+        else:
+            clusters_by_tile[tile] = clusters
+    if missing:
+        for tile, clusters in compute_map_tiles(db, filters, zoom, missing).items():
+            if keys:
+                cache.catalog_cache.set(keys[tile], clusters)
+            clusters_by_tile[tile] = clusters
+
+    clusters = [
+        cluster
+        for tile in tiles
+        for cluster in clusters_by_tile[tile]
+        if cx0 <= cluster["cell"][0] <= cx1 and cy0 <= cluster["cell"][1] <= cy1
+    ]
+    return {"zoom": zoom, "cell_size": cell_size, "clusters": clusters}
@@ -0,0 +1,50 @@
+"""
+Schemas para los endpoints de descubrimiento del catálogo
+"""
+from pydantic import BaseModel
+from datetime import date
+from typing import List, Optional, Union
+
+
+class FacetValue(BaseModel):
+    """Número de eventos para un valor concreto de una faceta"""
+    value: Optional[Union[int, str]] = None
+    count: int
+
+
+class EventFacetsResponse(BaseModel):
+    """Conteos por faceta para el conjunto de filtros actual"""
+    total: int
+    tipo: List[FacetValue] = []
+    genero_id: List[FacetValue] = []
+    localidad_id: List[FacetValue] = []
+    precio: List[FacetValue] = []  # Rangos de precio (gratis, 0-20, 20-50, 50-100, 100+)
+    fecha: List[FacetValue] = []  # Rangos de fecha relativos a ahora
+
+
+class CalendarDay(BaseModel):
+    """Eventos de un día del calendario"""
+    fecha: date
+    count: int
+    evento_ids: List[int] = []  # Primeros eventos del día, por hora
+
+
+class EventCalendarResponse(BaseModel):
+    """Conteos por día de un mes (solo los días con eventos)"""
+    month: str  # YYYY-MM
+    days: List[CalendarDay] = []
+
+
+class MapCluster(BaseModel):
+    """Grupo de eventos cercanos en una celda de la rejilla del mapa"""
+    lat: float  # Centroide de las localidades de la celda
+    lon: float
+    count: int
+    evento_ids: List[int] = []  # Muestra de eventos de la celda
+
+
+class EventMapResponse(BaseModel):
+    """Clusters de eventos dentro del bbox para un nivel de zoom"""
+    zoom: int
+    cell_size: float  # Lado de la celda en grados
+    clusters: List[MapCluster] = []
@@ -1,8 +1,26 @@
-from sqlalchemy import create_engine
+import functools
+import itertools
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Optional
+import anyio
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool, StaticPool
+from cache import TTLCache
 from config import settings
 
+logger = logging.getLogger("njoy.db")
+
 DATABASE_URL = settings.DATABASE_URL
 
 if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
@@ -11,11 +29,555 @@ if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL is not set. Please check your environment variables.")
 
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=3600,
+
+# ============================================
+# MÉTRICAS DEL POOL
+# ============================================
+# Tiempo que tarda cada checkout (espera por una conexión libre o, si no
+# hay, apertura de una nueva) y conexiones abiertas. Se actualizan desde
+# los hilos del threadpool, por eso llevan lock. Ver metrics.render_prometheus.
+
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+
+class PoolStats:
+    """Contadores del pool de conexiones (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.checked_out = 0
+        self.wait_buckets = [0] * (len(POOL_WAIT_BUCKETS) + 1)
+        self.wait_sum = 0.0
+
+    def observe_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.wait_buckets[bisect_left(POOL_WAIT_BUCKETS, seconds)] += 1
+            self.wait_sum += seconds
+
+    def count_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def count_connect(self) -> None:
+        with self._lock:
+            self.connects += 1
+
+    def count_checkin(self) -> None:
+        with self._lock:
+            self.checked_out -= 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "checked_out": self.checked_out,
+                "wait_buckets": list(self.wait_buckets),
+                "wait_sum": self.wait_sum,
+            }
+
+
+pool_stats = PoolStats()
+
+
+class _TimedPoolMixin:
+    """Mide cuánto tarda el pool en entregar una conexión"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except sa_exc.TimeoutError:
+            pool_stats.count_timeout()
+            raise
+        pool_stats.observe_wait(time.perf_counter() - start)
+        return connection
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedNullPool(_TimedPoolMixin, NullPool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+class TimedStaticPool(_TimedPoolMixin, StaticPool):
+    pass
+
+
+# ============================================
+# PERFILES DE POOL
+# ============================================
+# DB_POOL_PROFILE elige cómo se crean las conexiones:
+# - serverless: sin pool propio (NullPool). En Vercel cada instancia fría
+#   abriría su propio pool contra Neon; con NullPool cada petición usa una
+#   conexión corta y el pooling lo hace PgBouncer (host "-pooler" de Neon).
+#   Sin parámetros de arranque (options=-c ...) que PgBouncer rechaza.
+# - server: pool persistente dimensionado para el threadpool de anyio (40 hilos)
+# - sqlite: desarrollo local, con WAL para que lecturas y escrituras no se bloqueen.
+#   Una base :memory: existe solo en su conexión: se comparte una única
+#   conexión (StaticPool) para que todas las sesiones vean las mismas tablas
+# - auto (por defecto): sqlite si la URL es SQLite, serverless en Vercel, server en otro caso
+
+def resolve_pool_profile(url: str = DATABASE_URL) -> str:
+    profile = settings.DB_POOL_PROFILE
+    if profile != "auto":
+        return profile
+    if url.startswith("sqlite"):
+        return "sqlite"
+    if os.getenv("VERCEL"):
+        return "serverless"
+    return "server"
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    database = make_url(url).database
+    return not database or database == ":memory:" or "mode=memory" in url
+
+
+def engine_options(profile: str, url: str = DATABASE_URL, is_async: bool = False) -> dict:
+    """Argumentos de create_engine (o create_async_engine) para un perfil de pool"""
+    queue_pool = TimedAsyncQueuePool if is_async else TimedQueuePool
+    connect_args = {}
+    if url.startswith("postgresql+asyncpg"):
+        connect_args = {"timeout": settings.DB_CONNECT_TIMEOUT}
+        if profile == "serverless":
+            # PgBouncer en modo transacción no conserva sentencias preparadas con nombre
+            connect_args["statement_cache_size"] = 0
+    elif url.startswith("postgresql"):
+        connect_args = {
+            "connect_timeout": settings.DB_CONNECT_TIMEOUT,
+            "keepalives": 1,
+            "keepalives_idle": 30,
+        }
+
+    if profile == "serverless":
+        return {"poolclass": TimedNullPool, "connect_args": connect_args}
+    if profile == "server":
+        return {
+            "poolclass": queue_pool,
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+            "pool_pre_ping": True,
+            # LIFO: las conexiones sobrantes quedan ociosas y el servidor las puede cerrar
+            "pool_use_lifo": True,
+            "connect_args": connect_args,
+        }
+    if profile == "sqlite":
+        sqlite_args = {"check_same_thread": False, "timeout": settings.DB_CONNECT_TIMEOUT}
+        if _is_memory_sqlite(url):
+            return {"poolclass": TimedStaticPool, "connect_args": sqlite_args}
+        return {
+            "poolclass": queue_pool,
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "connect_args": sqlite_args,
+        }
+    raise ValueError(f"DB_POOL_PROFILE desconocido: {profile} (serverless, server, sqlite o auto)")
+
+
+# Pragmas de cada conexión SQLite: WAL (lectores no bloquean al escritor),
+# fsync solo en checkpoints y espera en vez de "database is locked"
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",
 )
 
+
+def _instrument_pool(target_engine, profile: str) -> None:
+    @event.listens_for(target_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        pool_stats.count_connect()
+        if profile == "sqlite":
+            cursor = dbapi_connection.cursor()
+            for pragma in SQLITE_PRAGMAS:
+                cursor.execute(pragma)
+            cursor.close()
+
+    @event.listens_for(target_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        pool_stats.count_checkin()
+
+
+POOL_PROFILE = resolve_pool_profile()
+
+engine = create_engine(DATABASE_URL, **engine_options(POOL_PROFILE))
+_instrument_pool(engine, POOL_PROFILE)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+
+# ============================================
+# MOTOR ASYNC (endpoints públicos de lectura)
+# ============================================
+# asyncpg para Postgres; aiosqlite en local solo con ASYNC_DB_ENABLED=true
+# (por defecto solo se activa con Postgres). Los endpoints async ejecutan
+# el mismo código ORM síncrono con AsyncSession.run_sync: corre en el event
+# loop (greenlet) y solo la E/S es asíncrona, sin ocupar hilos del threadpool.
+# Se crea al primer uso; si no hay driver async (MySQL, driver sin instalar
+# o ASYNC_DB_ENABLED=false) get_async_sessionmaker devuelve None y se usa
+# ThreadpoolSession, con la misma interfaz.
+
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str = DATABASE_URL) -> Optional[str]:
+    """URL equivalente con driver async (None si no hay driver async para la base)"""
+    parsed = make_url(url)
+    drivername = _ASYNC_DRIVERS.get(parsed.drivername)
+    if drivername is None:
+        return None
+    query = dict(parsed.query)
+    if drivername == "postgresql+asyncpg":
+        # asyncpg usa ssl= en lugar de sslmode= y no conoce channel_binding
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        query.pop("channel_binding", None)
+    return parsed.set(drivername=drivername, query=query).render_as_string(hide_password=False)
+
+
+_async_engines = []
+_async_sessionmaker = None
+_async_unavailable = not settings.ASYNC_DB_ENABLED
+
+
+def _create_async_engine(sync_url: str):
+    """Motor async equivalente a `sync_url` (None si no hay driver async)"""
+    url = async_database_url(sync_url)
+    try:
+        if url is None:
+            raise ModuleNotFoundError(f"sin driver async para {make_url(sync_url).drivername}")
+        profile = resolve_pool_profile(sync_url)
+        async_engine = create_async_engine(url, **engine_options(profile, url, is_async=True))
+    except ModuleNotFoundError as e:
+        logger.warning("Motor async no disponible, se usará el threadpool: %s", e)
+        return None
+
+    _instrument_pool(async_engine.sync_engine, profile)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", _slow_query_start)
+    event.listen(async_engine.sync_engine, "after_cursor_execute", _slow_query_end)
+    _async_engines.append(async_engine)
+    return async_engine
+
+
+def get_async_sessionmaker():
+    """Fábrica de AsyncSession (None si no hay motor async disponible)"""
+    global _async_sessionmaker, _async_unavailable
+    if _async_sessionmaker is not None or _async_unavailable:
+        return _async_sessionmaker
+
+    async_engine = _create_async_engine(DATABASE_URL)
+    if async_engine is None:
+        _async_unavailable = True
+        return None
+    _async_sessionmaker = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return _async_sessionmaker
+
+
+async def dispose_async_engine() -> None:
+    """Cerrar las conexiones async al apagar (aiosqlite mantiene un hilo por conexión)"""
+    for async_engine in _async_engines:
+        await async_engine.dispose()
+
+
+class ThreadpoolSession:
+    """Sesión síncrona con la interfaz run_sync/close de AsyncSession (ejecuta en el threadpool)"""
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await anyio.to_thread.run_sync(functools.partial(fn, self.sync_session, *args, **kwargs))
+
+    async def close(self):
+        await anyio.to_thread.run_sync(self.sync_session.close)
+
+
+# ============================================
+# SLOW QUERY LOG
+# ============================================
+# Las sentencias que superan SLOW_QUERY_THRESHOLD_MS se agrupan por huella
+# (SQL con los literales sustituidos por ?) en una tabla acotada en memoria.
+# Por huella se guardan los totales y las últimas duraciones para p50/p95.
+
+_SLOW_QUERY_SAMPLES = 256
+
+_FINGERPRINT_RULES = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),                    # cadenas
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),                # números
+    (re.compile(r"%\(\w+\)s|%s|(?<!:):\w+|\$\d+"), "?"),    # parámetros de cada driver
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(?)"),     # IN (?, ?, ?) -> IN (?)
+    (re.compile(r"\s+"), " "),
+]
+
+
+def fingerprint(statement: str) -> str:
+    """Normalizar una sentencia SQL para agrupar las que solo cambian en valores"""
+    for pattern, replacement in _FINGERPRINT_RULES:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+class SlowQueryLog:
+    """Tabla LRU acotada de huellas de consultas lentas (thread-safe)"""
+
+    def __init__(self, max_fingerprints: int = 200):
+        self.max_fingerprints = max_fingerprints
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, seconds: float) -> None:
+        key = fingerprint(statement)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {
+                    "count": 0, "total": 0.0, "max": 0.0,
+                    "samples": deque(maxlen=_SLOW_QUERY_SAMPLES),
+                }
+            entry["count"] += 1
+            entry["total"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+            entry["samples"].append(seconds)
+            entry["last_seen"] = datetime.now()
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_fingerprints:
+                self._entries.popitem(last=False)
+
+    def snapshot(self) -> list:
+        """Huellas con sus estadísticas en ms, de mayor a menor p95"""
+        with self._lock:
+            items = [(key, dict(entry, samples=sorted(entry["samples"]))) for key, entry in self._entries.items()]
+        result = []
+        for key, entry in items:
+            samples = entry["samples"]
+            result.append({
+                "fingerprint": key,
+                "count": entry["count"],
+                "total_ms": entry["total"] * 1000,
+                "p50_ms": samples[int(0.50 * (len(samples) - 1))] * 1000,
+                "p95_ms": samples[int(0.95 * (len(samples) - 1))] * 1000,
+                "max_ms": entry["max"] * 1000,
+                "last_seen": entry["last_seen"],
+            })
+        result.sort(key=lambda item: item["p95_ms"], reverse=True)
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_log = SlowQueryLog(max_fingerprints=settings.SLOW_QUERY_MAX_FINGERPRINTS)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _slow_query_start(conn, cursor, statement, parameters, context, executemany):
+    # En el contexto de la ejecución: si la sentencia falla no hay after_cursor_execute
+    if context is not None:
+        context.slow_query_start = time.perf_counter()
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _slow_query_end(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "slow_query_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    if elapsed * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+        slow_query_log.record(statement, elapsed)
+
+
+# ============================================
+# RÉPLICAS DE LECTURA
+# ============================================
+# DATABASE_REPLICA_URLS: réplicas para las dependencias de solo lectura
+# (auth.get_read_db / get_async_read_db). Se eligen en round-robin; una
+# réplica que no acepta conexiones (o se desconecta) queda expulsada
+# REPLICA_EJECT_SECONDS y después vuelve a probarse. Sin réplicas sanas se
+# lee del primario.
+#
+# Lectura de lo propio: cuando un usuario confirma una escritura (una compra,
+# un cambio en el panel admin...) por auth.get_db, sus lecturas van al
+# primario durante REPLICA_STICKY_SECONDS (por instancia).
+#
+# Las sesiones de réplica llevan info["read_only"]: el código que escribe de
+# forma perezosa (event_cards) no escribe en ellas.
+#
+# Las versiones de la caché del catálogo (cache.py) se leen por la misma
+# sesión y antes que los datos: una réplica atrasada sirve un cuerpo y un
+# ETag igual de atrasados, nunca un cuerpo viejo con la versión nueva.
+#
+# Prueba local con dos ficheros SQLite haciendo de réplicas:
+#   DATABASE_URL=sqlite:///./primary.db
+#   DATABASE_REPLICA_URLS=sqlite:///./replica1.db,sqlite:///./replica2.db
+
+def _normalize_url(url: str) -> str:
+    return url.replace("postgres://", "postgresql://", 1) if url.startswith("postgres://") else url
+
+
+class Replica:
+    """Una réplica con su motor, su estado de salud y (si se usa) su motor async"""
+
+    def __init__(self, url: str):
+        self.url = _normalize_url(url)
+        self.name = make_url(self.url).render_as_string(hide_password=True)
+        profile = resolve_pool_profile(self.url)
+        self.engine = create_engine(self.url, **engine_options(profile, self.url))
+        _instrument_pool(self.engine, profile)
+        self._watch(self.engine)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine, info={"read_only": True})
+        self.ejected_until = 0.0
+        self._async_sessionmaker = None
+        self._async_checked = False
+
+    def _watch(self, target_engine) -> None:
+        event.listen(target_engine, "before_cursor_execute", _slow_query_start)
+        event.listen(target_engine, "after_cursor_execute", _slow_query_end)
+
+        @event.listens_for(target_engine, "handle_error")
+        def _on_error(context):
+            # Sin conexión (no se pudo conectar) o conexión perdida: réplica caída
+            if context.connection is None or context.is_disconnect:
+                self.eject()
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+    def eject(self) -> None:
+        self.ejected_until = time.monotonic() + settings.REPLICA_EJECT_SECONDS
+        logger.warning(
+            "Réplica expulsada durante %ss: %s", settings.REPLICA_EJECT_SECONDS, self.name
+        )
+
+    def async_session(self):
+        """AsyncSession contra la réplica (ThreadpoolSession si no hay motor async)"""
+        if not self._async_checked:
+            self._async_checked = True
+            if not _async_unavailable:
+                async_engine = _create_async_engine(self.url)
+                if async_engine is not None:
+                    self._watch(async_engine.sync_engine)
+                    self._async_sessionmaker = async_sessionmaker(
+                        async_engine, autoflush=False, expire_on_commit=False, info={"read_only": True}
+                    )
+        if self._async_sessionmaker is None:
+            return ThreadpoolSession(self.SessionLocal())
+        return self._async_sessionmaker()
+
+
+class ReplicaSet:
+    """Réplicas de lectura con round-robin y expulsión de las caídas"""
+
+    def __init__(self, urls):
+        self.replicas = [Replica(url) for url in urls]
+        self._counter = itertools.count()
+
+    def choose(self) -> Optional[Replica]:
+        """Siguiente réplica sana (None si no hay ninguna)"""
+        if not self.replicas:
+            return None
+        start = next(self._counter)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if replica.healthy:
+                return replica
+        return None
+
+
+replicas = ReplicaSet(settings.DATABASE_REPLICA_URLS)
+
+# user_id -> True mientras ese usuario deba leer del primario
+_recent_writers = TTLCache(maxsize=settings.PRINCIPAL_CACHE_MAX_ENTRIES, ttl=settings.REPLICA_STICKY_SECONDS)
+
+
+def stick_to_primary(user_id: int) -> None:
+    """El usuario acaba de escribir: sus lecturas van al primario durante un rato"""
+    if replicas.replicas:
+        _recent_writers.set(user_id, True)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_write(session, flush_context):
+    if session.info.get("user_id") is not None:
+        session.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _stick_writer(session):
+    if session.info.pop("wrote", False):
+        stick_to_primary(session.info["user_id"])
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_write(session):
+    session.info.pop("wrote", None)
+
+
+def _read_replica(user_id: Optional[int]) -> Optional[Replica]:
+    if user_id is not None and _recent_writers.get(user_id):
+        return None
+    return replicas.choose()
+
+
+def _open_connection(session) -> None:
+    session.connection()
+
+
+def _replica_failed(replica: Replica) -> None:
+    # handle_error ya la expulsa si no pudo conectar; por si el error era otro
+    if replica.healthy:
+        replica.eject()
+
+
+def read_session(user_id: Optional[int] = None):
+    """Sesión de solo lectura: réplica si hay alguna sana, si no el primario"""
+    # La conexión se abre ya: si la réplica está caída se prueba la siguiente
+    # en vez de fallar la petición
+    while (replica := _read_replica(user_id)) is not None:
+        session = replica.SessionLocal()
+        try:
+            _open_connection(session)
+            return session
+        except (sa_exc.DBAPIError, OSError):
+            session.close()
+            _replica_failed(replica)
+    return SessionLocal()
+
+
+async def read_async_session(user_id: Optional[int] = None):
+    """Como read_session, para endpoints async"""
+    while (replica := _read_replica(user_id)) is not None:
+        session = replica.async_session()
+        try:
+            await session.run_sync(_open_connection)
+            return session
+        except (sa_exc.DBAPIError, OSError):
+            await session.close()
+            _replica_failed(replica)
+    session_factory = get_async_sessionmaker()
+    return session_factory() if session_factory is not None else ThreadpoolSession(SessionLocal())
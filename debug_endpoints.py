@@ -0,0 +1,339 @@
+"""
+Endpoints de debug, datos de prueba y migraciones a mano
+
+Solo se montan con DEBUG_ENDPOINTS_ENABLED (por defecto en local): en
+producción el esquema lo aplica migrate.py al arrancar y estos endpoints
+(varios públicos y destructivos) no existen. Se importan solo si se montan,
+así seed_data no se carga en cada arranque en frío.
+"""
+import logging
+import os
+import random
+import string
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import archive
+import migrate
+import models
+from auth import Principal, get_current_active_user, get_db
+from config import settings
+from database import engine
+
+logger = logging.getLogger("njoy.debug")
+
+router = APIRouter()
+
+
+# ============================================
+# DIAGNÓSTICO
+# ============================================
+
+@router.get("/debug-db", tags=["Debug"])
+def debug_database(db: Session = Depends(get_db)):
+    """
+    Endpoint de debug para verificar la conexión de la base de datos.
+    Muestra qué DATABASE_URL está usando y cuántos registros hay.
+    """
+    try:
+        # Mask the password in the URL for security
+        db_url = settings.DATABASE_URL or "NOT SET"
+        if "@" in db_url:
+            parts = db_url.split("@")
+            masked = parts[0].rsplit(":", 1)[0] + ":****@" + parts[1]
+        else:
+            masked = db_url
+        
+        # Count records
+        eventos = db.execute(text('SELECT COUNT(*) FROM "EVENTO"')).scalar()
+        localidades = db.execute(text('SELECT COUNT(*) FROM "LOCALIDAD"')).scalar()
+        usuarios = db.execute(text('SELECT COUNT(*) FROM "USUARIO"')).scalar()
+        
+        return {
+            "status": "connected",
+            "database_url_masked": masked,
+            "env_database_url": "SET" if os.getenv("DATABASE_URL") else "NOT SET",
+            "env_postgres_url": "SET" if os.getenv("POSTGRES_URL") else "NOT SET",
+            "counts": {
+                "eventos": eventos,
+                "localidades": localidades,
+                "usuarios": usuarios
+            }
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "error": str(e)
+        }
+
+@router.get("/debug/recent-tickets", tags=["Debug"])
+def get_recent_tickets_debug(db: Session = Depends(get_db)):
+    """
+    TEMPORARY DEBUG ENDPOINT - Shows last 10 tickets in database
+    Used to verify QR code data in production
+    """
+    try:
+        tickets = db.query(models.Ticket).order_by(models.Ticket.id.desc()).limit(10).all()
+        results = []
+        for t in tickets:
+            results.append({
+                "id": t.id,
+                "codigo_ticket": t.codigo_ticket,
+                "evento_id": t.evento_id,
+                "activado": t.activado,
+                "nombre_asistente": t.nombre_asistente
+            })
+        return {"count": len(results), "tickets": results}
+    except Exception as e:
+        return {"error": str(e)}
+
+@router.get("/test-deployment-nov24")
+def test_deployment():
+    """Test endpoint to verify deployment is working - November 24 2025"""
+    return {
+        "status": "OK",
+        "message": "Backend is deployed and running - November 24 16:15",
+        "version": "3.1.0-test"
+    }
+
+@router.get("/debug/cors", tags=["Health"])
+def debug_cors():
+    """
+    Endpoint de diagnóstico para verificar la configuración de CORS
+    ⚠️ Solo para debugging - ELIMINAR en producción
+    """
+    return {
+        "allowed_origins": settings.ALLOWED_ORIGINS,
+        "allowed_origins_count": len(settings.ALLOWED_ORIGINS),
+        "env_variable_raw": os.getenv("ALLOWED_ORIGINS", "NOT_SET"),
+        "app_name": settings.APP_NAME
+    }
+
+# ============================================
+# ESQUEMA Y MIGRACIONES
+# ============================================
+
+@router.get("/fix-db-schema", tags=["Debug"])
+def fix_db_schema():
+    """
+    Aplicar las migraciones pendientes del esquema (ver migrate.py).
+    Las columnas que antes se añadían aquí a mano son la migración 2.
+    """
+    try:
+        return {"status": "completed", "results": migrate.run_migrations(engine)}
+    except Exception as e:
+        logger.exception("Error aplicando migraciones")
+        return {"status": "error", "detail": str(e)}
+
+@router.get("/init-db")
+def init_db():
+    """
+    Endpoint para inicializar las tablas de la base de datos.
+    Útil para despliegues en Vercel donde no tenemos acceso a consola.
+    ⚠️ ADVERTENCIA: Esto CREARÁ las tablas si no existen.
+    """
+    try:
+        migrate.run_migrations(engine)
+        logger.info("Tablas creadas")
+        return {
+            "message": "Tablas creadas correctamente en la base de datos",
+            "tables": [table.name for table in models.Base.metadata.sorted_tables]
+        }
+    except Exception as e:
+        logger.exception("Error creando tablas")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al crear tablas: {str(e)}"
+        )
+
+@router.get("/drop-and-recreate-db")
+def drop_and_recreate_db():
+    """
+    ⚠️ PELIGRO: Elimina TODAS las tablas y las recrea.
+    Esto BORRARÁ TODOS LOS DATOS.
+    Solo usar en desarrollo.
+    """
+    try:
+        models.Base.metadata.drop_all(bind=engine)
+        migrate.version_table.drop(engine, checkfirst=True)
+        logger.warning("Tablas eliminadas")
+        
+        migrate.run_migrations(engine)
+        logger.info("Tablas creadas")
+        
+        return {
+            "message": "⚠️ TODAS las tablas fueron eliminadas y recreadas",
+            "warning": "TODOS LOS DATOS FUERON ELIMINADOS",
+            "tables": [table.name for table in models.Base.metadata.sorted_tables]
+        }
+    except Exception as e:
+        logger.exception("Error recreando tablas")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al recrear tablas: {str(e)}"
+        )
+
+@router.post("/admin/migrate-ticket-codes", tags=["Admin"])
+def migrate_ticket_codes(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_user)
+):
+    """
+    ADMIN ONLY: Migrate tickets with NULL or UUID codigo_ticket to 6-char codes
+    """
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    try:
+        # Find tickets with NULL or UUID-format codes
+        tickets_to_migrate = db.query(models.Ticket).filter(
+            (models.Ticket.codigo_ticket == None) | 
+            (models.Ticket.codigo_ticket.like('%-%'))  # UUID format contains dashes
+        ).all()
+        
+        migrated_count = 0
+        
+        for ticket in tickets_to_migrate:
+            # Generate unique 6-char code
+            while True:
+                new_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+                # Check if code is unique (TICKET y TICKET_ARCHIVE)
+                if not archive.ticket_code_exists(db, new_code):
+                    ticket.codigo_ticket = new_code
+                    migrated_count += 1
+                    break
+        
+        db.commit()
+        
+        return {
+            "success": True,
+            "migrated": migrated_count,
+            "total_found": len(tickets_to_migrate),
+            "message": f"Successfully migrated {migrated_count} tickets to 6-character codes"
+        }
+    except Exception as e:
+        db.rollback()
+        return {"success": False, "error": str(e)}
+
+# ============================================
+# DATOS DE PRUEBA
+# ============================================
+
+@router.get("/seed-test-data", tags=["Admin"])
+def seed_test_data(db: Session = Depends(get_db)):
+    """
+    Seed database with test users and events (PUBLIC - for initial setup)
+    """
+    
+    from datetime import date
+    
+    users_data = [
+        {"nombre": "Carlos", "apellidos": "Escáner", "email": "scanner@njoy.com", "password": "scanner123", "role": "scanner"},
+        {"nombre": "María", "apellidos": "Promotora", "email": "promotor@njoy.com", "password": "promotor123", "role": "promotor"},
+        {"nombre": "Juan", "apellidos": "Usuario", "email": "user@njoy.com", "password": "user123", "role": "user"}
+    ]
+    
+    created = []
+    for user_data in users_data:
+        if db.query(models.Usuario).filter(models.Usuario.email == user_data["email"]).first():
+            continue
+        
+        from auth import hash_password
+        new_user = models.Usuario(
+            nombre=user_data["nombre"],
+            apellidos=user_data["apellidos"],
+            email=user_data["email"],
+            password=hash_password(user_data["password"]),
+            fecha_nacimiento=date(1995, 1, 1),
+            pais="España",
+            role=user_data["role"],
+            is_active=True,
+            is_banned=False
+        )
+        db.add(new_user)
+        created.append(user_data["email"])
+    
+    # Sample events
+    from datetime import datetime
+    events_data = [
+        {
+            "nombre": "Rock Festival 2025",
+            "descripcion": "Festival de rock",
+            "fechayhora": datetime(2025, 7, 15, 20, 0),
+            "recinto": "Estadio Municipal",
+            "precio": 45.0,
+            "plazas": 5000,
+            "tipo": "Concierto",
+            "localidad_id": None,
+            "organizador_dni": None,
+            "genero_id": None
+        },
+        {
+            "nombre": "Noche Electrónica",
+            "descripcion": "DJs internacionales",
+            "fechayhora": datetime(2025, 6, 20, 22, 0),
+            "recinto": "Club Downtown",
+            "precio": 30.0,
+            "plazas": 1000,
+            "tipo": "Concierto",
+            "localidad_id": None,
+            "organizador_dni": None,
+            "genero_id": None
+        },
+        {
+            "nombre": "Jazz en Vivo",
+            "descripcion": "Velada íntima de jazz",
+            "fechayhora": datetime(2025, 5, 10, 19, 30),
+            "recinto": "Auditorio Cultural",
+            "precio": 25.0,
+            "plazas": 300,
+            "tipo": "Concierto",
+            "localidad_id": None,
+            "organizador_dni": None,
+            "genero_id": None
+        }
+    ]
+    
+    events_created = []
+    for event_data in events_data:
+        if db.query(models.Evento).filter(models.Evento.nombre == event_data["nombre"]).first():
+            continue
+        
+        new_event = models.Evento(**event_data)
+        db.add(new_event)
+        events_created.append(event_data["nombre"])
+    
+    db.commit()
+    
+    return {
+        "message": "Datos de prueba creados",
+        "users_created": created,
+        "events_created": events_created,
+        "credentials": {
+            "scanner": "scanner@njoy.com / scanner123",
+            "promotor": "promotor@njoy.com / promotor123",
+            "user": "user@njoy.com / user123"
+        }
+    }
+
+@router.get("/seed-db")
+def seed_db(db: Session = Depends(get_db)):
+    """
+    Endpoint para poblar la base de datos con datos ficticios.
+    ⚠️ ADVERTENCIA: Esto BORRARÁ todos los datos existentes.
+    Solo usar en desarrollo/testing.
+    """
+    try:
+        import seed_data
+        stats = seed_data.seed_database(db)
+        return {
+            "message": "Base de datos poblada con datos ficticios",
+            "datos_creados": stats
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al poblar la base de datos: {str(e)}"
+        )
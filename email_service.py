@@ -2,10 +2,13 @@
 Email Service using Resend
 Handles sending verification emails with beautiful HTML templates
 """
+import logging
 import resend
 from typing import Optional
 from config import settings
 
+logger = logging.getLogger("njoy.email")
+
 # Configure Resend with API key
 resend.api_key = settings.RESEND_API_KEY
 
@@ -120,21 +123,10 @@ class EmailService:
 </html>
         """
         
-        # Debug logging
-        print("\n" + "="*60)
-        print("📧 EMAIL SERVICE - ATTEMPTING TO SEND VERIFICATION EMAIL")
-        print("="*60)
-        print(f"To: {to_email}")
-        print(f"User Name: {user_name}")
-        print(f"Verification Token: {verification_token[:10]}...")
-        print(f"Verification URL: {settings.FRONTEND_URL}/verify-email/{verification_token}")
-        print(f"Email From: {settings.EMAIL_FROM_NAME} <{settings.EMAIL_FROM}>")
-        
-        # Check API key
-        api_key_status = "SET" if settings.RESEND_API_KEY else "MISSING"
-        api_key_preview = settings.RESEND_API_KEY[:10] + "..." if settings.RESEND_API_KEY else "None"
-        print(f"API Key Status: {api_key_status} ({api_key_preview})")
-        print("="*60 + "\n")
+        # Check API key (sin volcar la clave ni el token a los logs)
+        if not settings.RESEND_API_KEY:
+            logger.warning("RESEND_API_KEY no configurada: el envío fallará")
+        logger.debug("Enviando email de verificación", extra={"email_from": settings.EMAIL_FROM})
         
         try:
             params = {
@@ -144,21 +136,12 @@ class EmailService:
                 "html": html_content,
             }
             
-            print("📤 Calling Resend API...")
             email = resend.Emails.send(params)
-            print(f"✅ SUCCESS! Verification email sent to {to_email}")
-            print(f"   Email ID: {email.get('id')}")
-            print("="*60 + "\n")
+            logger.info("Email de verificación enviado", extra={"email_id": email.get("id")})
             return True
             
-        except Exception as e:
-            print(f"\n❌ ERROR SENDING EMAIL")
-            print(f"   Error Type: {type(e).__name__}")
-            print(f"   Error Message: {str(e)}")
-            print(f"   To: {to_email}")
-            import traceback
-            print(f"   Traceback:\n{traceback.format_exc()}")
-            print("="*60 + "\n")
+        except Exception:
+            logger.exception("Error enviando email de verificación")
             return False
     
     @staticmethod
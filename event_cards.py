@@ -0,0 +1,192 @@
+"""
+Read model EVENT_CARD para el catálogo público
+
+Cada evento tiene una fila con su documento JSON (schemas.Evento ya
+serializado, sin tickets_vendidos) y un contador de tickets vendidos.
+/evento/ y /evento/{id} solo leen estas filas y concatenan bytes, sin
+cargar objetos ORM ni validar con Pydantic.
+
+Las filas se mantienen dentro de la misma transacción que la escritura
+que las afecta (listener after_flush):
+- Alta/edición de un evento: se reconstruye el documento y se recuenta
+  (incluidos los tickets de TICKET_ARCHIVE)
+- Baja de un evento: se borra su tarjeta
+- Alta/baja de tickets: se suma/resta al contador (UPDATE atómico); el
+  archivado (archive.py) no pasa por el ORM y no toca el contador
+
+Los eventos sin tarjeta (creados con SQL directo, seeds, datos previos)
+se construyen la primera vez que se leen (en una réplica solo se calculan,
+sin guardarlas).
+"""
+from collections import namedtuple
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import archive
+import models
+import schemas
+
+cards = models.EventCard.__table__
+tickets = models.Ticket.__table__
+tickets_archive = models.TicketArchive.__table__
+eventos = models.Evento.__table__
+
+# Misma forma que las filas de _cards_query
+CardRow = namedtuple("CardRow", ["id", "documento", "tickets_vendidos"])
+
+
+def build_document(evento: models.Evento) -> str:
+    """Serializar un evento como en schemas.Evento, sin el contador de tickets"""
+    return schemas.Evento.model_validate(evento, from_attributes=True).model_dump_json(
+        exclude={"tickets_vendidos"}
+    )
+
+
+def render_card(documento: str, tickets_vendidos: int) -> str:
+    """Añadir el contador al documento (cierra el objeto JSON)"""
+    return f'{documento[:-1]},"tickets_vendidos":{tickets_vendidos}}}'
+
+
+def _tickets_count(evento_id):
+    active, archived = (
+        select(func.count()).select_from(table).where(table.c.evento_id == evento_id).scalar_subquery()
+        for table in (tickets, tickets_archive)
+    )
+    return active + archived
+
+
+def write_cards(connection, eventos_orm: Iterable[models.Evento]) -> None:
+    """Reemplazar las tarjetas de los eventos dados, recontando sus tickets"""
+    eventos_orm = list(eventos_orm)
+    if not eventos_orm:
+        return
+    now = datetime.now()
+    connection.execute(delete(cards).where(cards.c.evento_id.in_([e.id for e in eventos_orm])))
+    for evento in eventos_orm:
+        connection.execute(
+            insert(cards).values(
+                evento_id=evento.id,
+                documento=build_document(evento),
+                tickets_vendidos=_tickets_count(evento.id),
+                actualizado_at=now,
+            )
+        )
+
+
+# ============================================
+# MANTENIMIENTO EN CADA FLUSH
+# ============================================
+
+@event.listens_for(Session, "after_flush")
+def _sync_event_cards(session, flush_context):
+    """Propagar a EVENT_CARD los cambios de EVENTO y TICKET de este flush"""
+    rebuilt: Dict[int, models.Evento] = {}
+    removed: Set[int] = set()
+    deltas: Dict[int, int] = {}
+
+    for obj in session.new:
+        if isinstance(obj, models.Evento):
+            rebuilt[obj.id] = obj
+        elif isinstance(obj, models.Ticket) and obj.evento_id is not None:
+            deltas[obj.evento_id] = deltas.get(obj.evento_id, 0) + 1
+
+    for obj in session.dirty:
+        if isinstance(obj, models.Evento) and session.is_modified(obj):
+            rebuilt[obj.id] = obj
+        elif isinstance(obj, models.Ticket):
+            history = inspect(obj).attrs.evento_id.history
+            for evento_id in history.deleted or ():
+                if evento_id is not None:
+                    deltas[evento_id] = deltas.get(evento_id, 0) - 1
+            for evento_id in history.added or ():
+                if evento_id is not None:
+                    deltas[evento_id] = deltas.get(evento_id, 0) + 1
+
+    for obj in session.deleted:
+        if isinstance(obj, models.Evento):
+            removed.add(obj.id)
+        elif isinstance(obj, models.Ticket) and obj.evento_id is not None:
+            deltas[obj.evento_id] = deltas.get(obj.evento_id, 0) - 1
+
+    if not (rebuilt or removed or deltas):
+        return
+
+    connection = session.connection()
+    if removed:
+        connection.execute(delete(cards).where(cards.c.evento_id.in_(removed)))
+    # Las tarjetas reconstruidas ya recuentan los tickets escritos en este flush
+    write_cards(connection, [e for evento_id, e in rebuilt.items() if evento_id not in removed])
+    for evento_id, delta in deltas.items():
+        if delta and evento_id not in rebuilt and evento_id not in removed:
+            connection.execute(
+                update(cards)
+                .where(cards.c.evento_id == evento_id)
+                .values(tickets_vendidos=cards.c.tickets_vendidos + delta)
+            )
+
+
+# ============================================
+# LECTURA
+# ============================================
+
+def _build_missing(db: Session, evento_ids: List[int]) -> None:
+    """Construir las tarjetas que faltan (eventos anteriores al read model)"""
+    missing = db.query(models.Evento).filter(models.Evento.id.in_(evento_ids)).all()
+    try:
+        write_cards(db.connection(), missing)
+        db.commit()
+    except IntegrityError:
+        # Otra petición la ha construido a la vez
+        db.rollback()
+
+
+def _render_missing(db: Session, rows: list, evento_ids: List[int]) -> list:
+    """Tarjetas que faltan calculadas en memoria, sin escribir (sesiones de réplica)"""
+    documentos = {
+        evento.id: build_document(evento)
+        for evento in db.query(models.Evento).filter(models.Evento.id.in_(evento_ids))
+    }
+    counts = archive.tickets_sold_counts(db, evento_ids)
+    return [
+        row if row.documento is not None
+        else CardRow(row.id, documentos.get(row.id), counts.get(row.id, 0))
+        for row in rows
+    ]
+
+
+def _card_rows(db: Session, stmt) -> list:
+    rows = db.execute(stmt).all()
+    missing = [row.id for row in rows if row.documento is None]
+    if missing:
+        if db.info.get("read_only"):
+            return _render_missing(db, rows, missing)
+        _build_missing(db, missing)
+        rows = db.execute(stmt).all()
+    return rows
+
+
+def _cards_query():
+    return select(eventos.c.id, cards.c.documento, cards.c.tickets_vendidos).select_from(
+        eventos.outerjoin(cards, cards.c.evento_id == eventos.c.id)
+    )
+
+
+def read_cards_json(db: Session, skip: int = 0, limit: int = 100) -> str:
+    """Listado paginado de eventos como array JSON"""
+    stmt = _cards_query().order_by(eventos.c.id).offset(skip).limit(limit)
+    rows = _card_rows(db, stmt)
+    return "[" + ",".join(
+        render_card(row.documento, row.tickets_vendidos) for row in rows if row.documento is not None
+    ) + "]"
+
+
+def read_card_json(db: Session, evento_id: int) -> Optional[str]:
+    """Un evento como objeto JSON, o None si no existe"""
+    rows = _card_rows(db, _cards_query().where(eventos.c.id == evento_id))
+    if not rows or rows[0].documento is None:
+        return None
+    return render_card(rows[0].documento, rows[0].tickets_vendidos)
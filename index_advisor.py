@@ -0,0 +1,200 @@
+"""
+Asesor de índices: EXPLAIN de las consultas de cada ruta GET
+
+Llama a todas las rutas GET registradas en la API (como admin, promotor y
+usuario, con TestClient) contra una base de datos con datos de prueba,
+recoge las SELECT que ejecuta cada una y pasa cada sentencia distinta por
+EXPLAIN. Marca los recorridos secuenciales de tablas filtradas (WHERE o
+JOIN); un listado completo sin filtro recorre la tabla de todas formas.
+
+- SQLite: EXPLAIN QUERY PLAN, "SCAN <tabla>" sin índice
+- Postgres: EXPLAIN (FORMAT JSON) con enable_seqscan=off, así un
+  "Seq Scan" solo aparece si no hay ningún índice utilizable (con pocas
+  filas el planificador lo elegiría aunque lo hubiera)
+
+Las rutas que modifican datos aunque sean GET (/init-db, /seed-db,
+/drop-and-recreate-db...) y las de Debug se saltan. Aun así se ejecuta
+contra la base indicada: usar una copia con datos, nunca producción.
+
+Uso:
+    python index_advisor.py --database-url sqlite:///./advisor.db
+Sale con código 1 si encuentra algún recorrido secuencial.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from collections import defaultdict
+
+# Rutas GET que escriben o borran datos
+SKIP_PATHS = {
+    "/init-db", "/seed-db", "/seed-test-data", "/drop-and-recreate-db",
+    "/fix-db-schema", "/verify-email/{token}",
+}
+SKIP_TAGS = {"Debug"}
+ROLES = ("admin", "promotor", "user")
+
+_PATH_PARAM = re.compile(r"{(\w+)(?::\w+)?}")
+_FILTERED = re.compile(r"\b(WHERE|JOIN)\b", re.IGNORECASE)
+_SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\S+)")
+
+
+def _configure(database_url: str) -> None:
+    # Antes de importar main: sin réplicas, sin motor async (todas las
+    # consultas por el motor síncrono) y sin rate limit
+    os.environ.update(
+        DATABASE_URL=database_url, DATABASE_REPLICA_URLS="", ASYNC_DB_ENABLED="false",
+        RATE_LIMIT_ENABLED="false", LOG_LEVEL="WARNING", LOG_LEVELS="njoy.queries=ERROR",
+    )
+
+
+def _tokens(db) -> dict:
+    """Token del primer usuario de cada rol"""
+    import models
+    from auth import create_access_token
+
+    tokens = {}
+    for role in ROLES:
+        user = db.query(models.Usuario).filter(models.Usuario.role == role).order_by(models.Usuario.id).first()
+        if user is not None:
+            tokens[role] = create_access_token(data={"sub": str(user.id), "email": user.email})
+    return tokens
+
+
+def _sample_params(db) -> dict:
+    """Valores de ejemplo para los parámetros de ruta (ids que existen)"""
+    import models
+
+    def first(column):
+        return db.query(column).order_by(column).limit(1).scalar()
+
+    return {
+        "dni": first(models.Organizador.dni),
+        "profile_id": "0",
+        "team_id": first(models.Team.id),
+        "ticket_id": first(models.Ticket.id),
+        "user_id": first(models.Usuario.id),
+        "evento_id": first(models.Evento.id),
+    }
+
+
+def _routes(app):
+    from fastapi.routing import APIRoute
+
+    seen = set()
+    for route in app.routes:
+        # Rutas duplicadas: en FastAPI gana la primera registrada
+        if not isinstance(route, APIRoute) or "GET" not in route.methods or route.path in seen:
+            continue
+        seen.add(route.path)
+        if route.path in SKIP_PATHS or SKIP_TAGS & set(route.tags):
+            continue
+        yield route.path
+
+
+def collect_statements(database_url: str) -> dict:
+    """Sentencia SELECT -> (parámetros de una ejecución, rutas que la lanzan)"""
+    _configure(database_url)
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+
+    import main
+    from database import SessionLocal, engine
+
+    db = SessionLocal()
+    try:
+        tokens = _tokens(db)
+        params = _sample_params(db)
+    finally:
+        db.close()
+
+    statements = {}
+    current = {"route": None}
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if current["route"] and statement.lstrip().upper().startswith("SELECT"):
+            entry = statements.setdefault(statement, {"parameters": parameters, "routes": set()})
+            entry["routes"].add(current["route"])
+
+    event.listen(engine, "before_cursor_execute", capture)
+    client = TestClient(main.app, raise_server_exceptions=False)
+    for path in _routes(main.app):
+        url = _PATH_PARAM.sub(lambda m: str(params.get(m.group(1)) or 1), path)
+        for role, token in tokens.items():
+            current["route"] = f"GET {path}"
+            client.get(url, headers={"Authorization": f"Bearer {token}"})
+    current["route"] = None
+    event.remove(engine, "before_cursor_execute", capture)
+    return statements
+
+
+def _sqlite_scans(conn, statement, parameters):
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    scans = []
+    for row in rows:
+        match = _SQLITE_SCAN.match(row[-1])
+        if match and "USING" not in row[-1] and "CONSTANT ROW" not in row[-1]:
+            scans.append(match.group(1))
+    return scans
+
+
+def _postgres_scans(conn, statement, parameters):
+    conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    scans = []
+
+    def walk(node):
+        if node.get("Node Type") == "Seq Scan":
+            scans.append(node["Relation Name"])
+        for child in node.get("Plans", ()):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return scans
+
+
+def find_seq_scans(statements: dict) -> list:
+    """[(tabla, sentencia, rutas)] de las sentencias filtradas con recorrido secuencial"""
+    from database import engine, fingerprint
+
+    explain = _postgres_scans if engine.dialect.name == "postgresql" else _sqlite_scans
+    findings = {}
+    with engine.connect() as conn:
+        for statement, entry in statements.items():
+            if not _FILTERED.search(statement):
+                continue
+            with conn.begin():
+                tables = explain(conn, statement, entry["parameters"])
+            for table in tables:
+                key = (table.strip('"'), fingerprint(statement))
+                findings.setdefault(key, set()).update(entry["routes"])
+    return [(table, sql, sorted(routes)) for (table, sql), routes in sorted(findings.items())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True, help="Base de datos con datos de prueba (no producción)")
+    args = parser.parse_args()
+
+    statements = collect_statements(args.database_url)
+    findings = find_seq_scans(statements)
+    print(f"{len(statements)} sentencias SELECT distintas analizadas")
+    by_table = defaultdict(list)
+    for table, sql, routes in findings:
+        by_table[table].append((sql, routes))
+    for table, items in sorted(by_table.items()):
+        print(f"\nSeq scan en {table}:")
+        for sql, routes in items:
+            # El SELECT de SQLAlchemy lista todas las columnas: lo útil es el filtro
+            where = sql.upper().rfind(" WHERE ")
+            print(f"  {sql[:60]}...{sql[where:where + 140] if where >= 0 else ''}")
+            print(f"    rutas: {', '.join(routes)}")
+    if not findings:
+        print("Sin recorridos secuenciales en consultas filtradas")
+    sys.exit(1 if findings else 0)
+
+
+if __name__ == "__main__":
+    main()
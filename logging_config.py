@@ -0,0 +1,156 @@
+"""
+Logging estructurado y asíncrono de la API
+
+- Los loggers de la aplicación cuelgan de "njoy" (njoy.auth, njoy.email...)
+- La petición solo encola el registro (QueueHandler); el formateo a JSON y
+  la escritura en stdout los hace un hilo aparte (QueueListener)
+- Cada registro lleva el request_id de la petición en curso (cabecera
+  X-Request-ID, recibida o generada, que se devuelve en la respuesta)
+- Niveles: LOG_LEVEL general y LOG_LEVELS por módulo
+  ("njoy.queries=WARNING,sqlalchemy.engine=INFO"). En producción el nivel
+  por defecto es INFO: ningún mensaje de debug sale salvo que se pida
+"""
+import atexit
+import json
+import logging
+import queue
+import re
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from config import settings
+
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Atributos propios de LogRecord: el resto son campos extra (logger.info(..., extra={...}))
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+# Un X-Request-ID recibido solo se acepta si es corto y sin caracteres raros
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+_listener: Optional[QueueListener] = None
+
+
+def get_request_id() -> Optional[str]:
+    """Id de la petición en curso (None fuera de una petición)"""
+    return _request_id.get()
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            data["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                data[key] = value
+        if record.exc_info:
+            record.exc_text = record.exc_text or self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class _RequestQueueHandler(QueueHandler):
+    """
+    QueueHandler que se ejecuta en el hilo de la petición
+
+    Copia el request_id (el contextvar no existe en el hilo del listener) y
+    deja el registro listo para pasar de hilo: mensaje ya interpolado y
+    traceback como texto, sin formatearlo todavía a JSON.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(vars(record))
+        record.request_id = _request_id.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _parse_levels(spec: str) -> dict:
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging() -> None:
+    """Configurar el logging de la aplicación (idempotente)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler()
+    if settings.LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    app_logger = logging.getLogger("njoy")
+    app_logger.addHandler(_RequestQueueHandler(log_queue))
+    app_logger.setLevel(settings.LOG_LEVEL)
+    app_logger.propagate = False
+
+    for name, level in _parse_levels(settings.LOG_LEVELS).items():
+        logger = logging.getLogger(name)
+        logger.setLevel(level)
+        # Loggers de librerías (sqlalchemy, httpx...): a la misma cola
+        if not name.startswith("njoy") and not logger.handlers:
+            logger.addHandler(_RequestQueueHandler(log_queue))
+            logger.propagate = False
+
+
+# ============================================
+# MIDDLEWARE
+# ============================================
+
+class RequestIdMiddleware:
+    """Middleware ASGI que asigna el X-Request-ID de cada petición"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        if not request_id or not _VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+        header = (b"x-request-id", request_id.encode())
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", ())) + [header]}
+            await send(message)
+
+        token = _request_id.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            _request_id.reset(token)
@@ -1,18 +1,22 @@
 # Version: 3.0.0 - CORS Fix Deployment
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
+import logging
 import auth
 
 # Imports locales
+import database
 from database import SessionLocal, engine
 import models, schemas, crud
-import seed_data
 from auth import (
     get_db,
+    get_async_read_db,
+    get_read_db,
     get_current_active_user,
     get_current_promotor,
     get_current_admin,
@@ -20,7 +24,8 @@ from auth import (
     create_access_token,
     create_refresh_token,
     authenticate_user,
-    decode_token
+    decode_token,
+    Principal,
 )
 from config import settings
 import ticket_endpoints
@@ -28,6 +33,20 @@ import admin_crud
 import admin_schemas
 import admin_endpoints
 import team_endpoints
+import catalog_endpoints
+import rate_limit
+import origin_validation
+import metrics
+import query_stats
+import profiling
+import cache
+import event_cards
+import logging_config
+import migrate
+import archive
+
+logging_config.setup_logging()
+logger = logging.getLogger("njoy.api")
 
 # Inicializar FastAPI con metadata completa para documentación
 app = FastAPI(
@@ -143,155 +162,74 @@ app.include_router(ticket_endpoints.router)
 # app.include_router(ticket_endpoints.router) # DUPLICATE - Logic moved to main.py -> RESTORED for Mobile App compatibility
 app.include_router(team_endpoints.router)
 app.include_router(admin_endpoints.router)
-
-# Crear tablas en la base de datos (Post-app creation safe check)
-models.Base.metadata.create_all(bind=engine)
+app.include_router(catalog_endpoints.router)
+# Debug, datos de prueba y migraciones a mano: solo si están activados
+# (import diferido: en producción el módulo ni se carga)
+if settings.DEBUG_ENDPOINTS_ENABLED:
+    import debug_endpoints
+    app.include_router(debug_endpoints.router)
+
+# Esquema de la base de datos: aplicar las migraciones pendientes (migrate.py)
+# Con el esquema al día es una sola consulta a SCHEMA_VERSION
+if settings.MIGRATE_ON_STARTUP:
+    migrate.run_migrations(engine)
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    """Liberar el pool del motor async (si se llegó a crear)"""
+    await database.dispose_async_engine()
 
 # ============================================
+# RATE LIMITING
+# ============================================
+# Registrado antes que la validación de origen para quedar por dentro:
+# los orígenes no permitidos y los preflight no consumen tokens, y las
+# respuestas 429 reciben las cabeceras CORS
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(rate_limit.RateLimitMiddleware)
 
-@app.get("/debug-db", tags=["Debug"])
-def debug_database(db: Session = Depends(get_db)):
-    """
-    Endpoint de debug para verificar la conexión de la base de datos.
-    Muestra qué DATABASE_URL está usando y cuántos registros hay.
-    """
-    try:
-        from sqlalchemy import text
-        from config import settings
-        import os
-        
-        # Mask the password in the URL for security
-        db_url = settings.DATABASE_URL or "NOT SET"
-        if "@" in db_url:
-            parts = db_url.split("@")
-            masked = parts[0].rsplit(":", 1)[0] + ":****@" + parts[1]
-        else:
-            masked = db_url
-        
-        # Count records
-        eventos = db.execute(text('SELECT COUNT(*) FROM "EVENTO"')).scalar()
-        localidades = db.execute(text('SELECT COUNT(*) FROM "LOCALIDAD"')).scalar()
-        usuarios = db.execute(text('SELECT COUNT(*) FROM "USUARIO"')).scalar()
-        
-        return {
-            "status": "connected",
-            "database_url_masked": masked,
-            "env_database_url": "SET" if os.getenv("DATABASE_URL") else "NOT SET",
-            "env_postgres_url": "SET" if os.getenv("POSTGRES_URL") else "NOT SET",
-            "counts": {
-                "eventos": eventos,
-                "localidades": localidades,
-                "usuarios": usuarios
-            }
-        }
-    except Exception as e:
-        return {
-            "status": "error",
-            "error": str(e)
-        }
-
-@app.get("/fix-db-schema", tags=["Debug"])
-def fix_db_schema(db: Session = Depends(get_db)):
-    """
-    Endpoint temporal para arreglar el esquema de la base de datos en producción.
-    Añade las columnas faltantes a la tabla USUARIO.
-    """
-    try:
-        from sqlalchemy import text
-        # Intentar añadir columnas si no existen
-        commands = [
-            "ALTER TABLE \"USUARIO\" ADD COLUMN IF NOT EXISTS foto_perfil VARCHAR(500);",
-            "ALTER TABLE \"USUARIO\" ADD COLUMN IF NOT EXISTS bio VARCHAR(500);",
-            "ALTER TABLE \"USUARIO\" ADD COLUMN IF NOT EXISTS email_verified BOOLEAN DEFAULT FALSE;",
-            "ALTER TABLE \"USUARIO\" ADD COLUMN IF NOT EXISTS verification_token VARCHAR(255);",
-            "ALTER TABLE \"USUARIO\" ADD COLUMN IF NOT EXISTS verification_token_expiry TIMESTAMP;"
-        ]
-        
-        results = []
-        for cmd in commands:
-            try:
-                db.execute(text(cmd))
-                results.append(f"Success: {cmd}")
-            except Exception as e:
-                # Log error but try others
-                msg = f"Error executing {cmd}: {str(e)}"
-                print(msg)
-                results.append(msg)
-                
-        db.commit()
-        return {"status": "completed", "results": results}
-    except Exception as e:
-        db.rollback()
-        return {"status": "error", "detail": str(e)}
+# ============================================
 # CORS CONFIGURATION - SECURITY LAYER 2
 # ============================================
 # Custom middleware for strict origin validation
-@app.middleware("http")
-async def validate_origin_middleware(request, call_next):
-    """
-    STRICT ORIGIN VALIDATION MIDDLEWARE
-    
-    - Rejects requests from unauthorized origins with 403 Forbidden
-    - Allows requests without Origin header (native mobile apps, direct API calls)
-    - Enforces ALLOWED_ORIGINS from environment configuration
-    """
-    from fastapi.responses import JSONResponse
-    
-    origin = request.headers.get("origin")
-    
-    # If Origin header is present (browser request), validate it
-    if origin:
-        # Check if origin is in allowed list
-        is_allowed = origin in settings.ALLOWED_ORIGINS
-        
-        if not is_allowed:
-            # LOG SECURITY EVENT
-            print(f"🚫 BLOCKED REQUEST from unauthorized origin: {origin}")
-            print(f"   Path: {request.url.path}")
-            print(f"   Method: {request.method}")
-            
-            # Return 403 Forbidden for unauthorized origins
-            return JSONResponse(
-                status_code=403,
-                content={
-                    "detail": "Origin not allowed",
-                    "error": "CORS policy: This origin is not authorized to access this API"
-                },
-                headers={
-                    "Access-Control-Allow-Origin": origin,  # Required for browser to show error
-                }
-            )
-    
-    # Handle OPTIONS preflight requests
-    if request.method == "OPTIONS":
-        from fastapi.responses import Response
-        # Only return success if origin is allowed (or no origin header)
-        allowed_origin = origin if (not origin or origin in settings.ALLOWED_ORIGINS) else settings.ALLOWED_ORIGINS[0]
-        
-        return Response(
-            status_code=200,
-            headers={
-                "Access-Control-Allow-Origin": allowed_origin,
-                "Access-Control-Allow-Methods": "*",
-                "Access-Control-Allow-Headers": "*",
-                "Access-Control-Allow-Credentials": "true",
-                "Access-Control-Max-Age": "3600",
-            }
-        )
-    
-    # Process request
-    response = await call_next(request)
-    
-    # Add CORS headers to response (only for allowed origins)
-    if origin and origin in settings.ALLOWED_ORIGINS:
-        response.headers["Access-Control-Allow-Origin"] = origin
-        response.headers["Access-Control-Allow-Credentials"] = "true"
-    elif not origin:
-        # No origin header (mobile app, server-to-server, etc.)
-        # Don't add CORS headers - not needed for native requests
-        pass
-    
-    return response
+# (ASGI puro: ver origin_validation.py para la política completa)
+app.add_middleware(origin_validation.OriginValidationMiddleware, allowed_origins=settings.ALLOWED_ORIGINS)
+
+# ============================================
+# PERFILADO BAJO DEMANDA (X-Profile, solo admin)
+# ============================================
+if settings.PROFILING_ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware)
+    app.include_router(profiling.router)
+
+# ============================================
+# CONSULTAS POR PETICIÓN (Server-Timing / N+1)
+# ============================================
+if settings.QUERY_STATS_ENABLED:
+    app.add_middleware(query_stats.QueryStatsMiddleware)
+
+# ============================================
+# MÉTRICAS
+# ============================================
+# El más externo: mide también las peticiones rechazadas por origen o rate limit
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+    if settings.METRICS_ENDPOINT_ENABLED:
+        app.include_router(metrics.router)
+
+# ============================================
+# CAPTURA DE TRÁFICO (muestra para replay)
+# ============================================
+# Por fuera de métricas: la duración guardada incluye todo el stack
+if settings.TRAFFIC_CAPTURE_ENABLED:
+    import traffic_capture
+    app.add_middleware(traffic_capture.TrafficCaptureMiddleware)
+
+# ============================================
+# REQUEST ID (X-Request-ID en logs y respuestas)
+# ============================================
+# El más externo de todos: cualquier log de la petición lleva su id
+app.add_middleware(logging_config.RequestIdMiddleware)
 
 # ============================================
 # ENDPOINTS DE AUTENTICACIÓN (PÚBLICOS)
@@ -307,9 +245,8 @@ def register(user: schemas.UsuarioCreate, db: Session = Depends(get_db)):
     - Envía email de verificación automáticamente
     """
     try:
-        print(f"DEBUG: Received user data: {user.model_dump()}")
         new_user = crud.create_item(db, models.Usuario, user)
-        print(f"DEBUG: User created successfully with ID: {new_user.id}")
+        logger.info("Usuario registrado", extra={"user_id": new_user.id})
         
         # EMAIL VERIFICATION ENABLED
         # Generate verification token and send email
@@ -330,20 +267,19 @@ def register(user: schemas.UsuarioCreate, db: Session = Depends(get_db)):
                 user_name=new_user.nombre,
                 verification_token=verification_token
             )
-            print(f"✓ Verification email sent to {new_user.email}")
+            logger.debug("Email de verificación enviado", extra={"user_id": new_user.id})
         except Exception as email_error:
-            print(f"⚠️  Failed to send verification email: {email_error}")
+            logger.warning("No se pudo enviar el email de verificación: %s", email_error, extra={"user_id": new_user.id})
             # Don't fail registration if email fails, user can resend later
         
         return new_user
     except HTTPException as e:
-        print(f"DEBUG: HTTPException raised: {e.status_code} - {e.detail}")
+        logger.debug("Registro rechazado: %s - %s", e.status_code, e.detail)
         raise e
     except Exception as e:
-        print(f"DEBUG: Unexpected exception: {type(e).__name__}: {str(e)}")
+        logger.exception("Error inesperado en el registro")
         import traceback
         error_trace = traceback.format_exc()
-        print(f"DEBUG: Full traceback:\n{error_trace}")
         
         # Return more detailed error for debugging
         raise HTTPException(
@@ -367,7 +303,8 @@ def login(credentials: schemas.LoginInput, db: Session = Depends(get_db)):
     try:
         # Convert email to lowercase for case-insensitive comparison
         email_lower = credentials.email.lower().strip()
-        user = authenticate_user(db, email_lower, credentials.contrasena)
+        # La sesión del login no tiene nada más: se libera la conexión durante bcrypt
+        user = authenticate_user(db, email_lower, credentials.contrasena, release_connection=True)
         
         if not user:
             raise HTTPException(
@@ -394,10 +331,7 @@ def login(credentials: schemas.LoginInput, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"LOGIN ERROR: {type(e).__name__}: {str(e)}")
-        print(f"TRACEBACK: {error_trace}")
+        logger.exception("Error en login")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error en login: {str(e)}"
@@ -439,7 +373,7 @@ def refresh_token(token_request: schemas.RefreshTokenRequest, db: Session = Depe
         }
     except HTTPException:
         raise
-    except Exception as e:
+    except Exception:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token inválido o expirado"
@@ -544,7 +478,7 @@ def resend_verification(email_request: dict, db: Session = Depends(get_db)):
             verification_token=verification_token
         )
     except Exception as e:
-        print(f"Error sending verification email: {e}")
+        logger.warning("Error al reenviar el email de verificación: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error al enviar email"
@@ -556,11 +490,15 @@ def resend_verification(email_request: dict, db: Session = Depends(get_db)):
     }
 
 @app.get("/me", response_model=schemas.Usuario, tags=["Users"])
-def get_current_user_info(current_user: models.Usuario = Depends(get_current_active_user)):
+def get_current_user_info(
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
     """
     Obtener información del usuario actual autenticado
     """
-    return current_user
+    # current_user es el principal cacheado; el perfil completo se lee de la BD
+    return db.query(models.Usuario).filter(models.Usuario.id == current_user.id).first()
 
 # ============================================
 # ADMIN ENDPOINTS
@@ -570,7 +508,7 @@ def get_current_user_info(current_user: models.Usuario = Depends(get_current_act
 def create_user_admin(
     user_data: schemas.UsuarioCreate,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Crear un nuevo usuario (Solo Admin)"""
     if current_user.role != 'admin':
@@ -608,7 +546,7 @@ def purchase_tickets(
     cantidad: int = 1,
     nombres_asistentes: list[str] = None,  # Optional list of attendee names
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Comprar entradas - Nombres opcionales (usa nombre comprador si no se especifica)"""
     import random
@@ -638,7 +576,7 @@ def purchase_tickets(
         """Generate unique 6-digit alphanumeric ticket code (User Request: Short codes)"""
         while True:
             code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-            if not db.query(models.Ticket).filter(models.Ticket.codigo_ticket == code).first():
+            if not archive.ticket_code_exists(db, code):
                 return code
     
     tickets_created = []
@@ -668,7 +606,7 @@ def purchase_tickets(
 @app.get("/tickets/my-tickets", tags=["Tickets"])
 def get_my_tickets(
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Obtener todos los tickets del usuario autenticado"""
     tickets = db.query(models.Ticket).filter(models.Ticket.usuario_id == current_user.id).all()
@@ -700,7 +638,7 @@ def get_my_tickets(
 def get_ticket_detail(
     ticket_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Obtener detalle de un ticket específico"""
     ticket = db.query(models.Ticket).filter(models.Ticket.id == ticket_id).first()
@@ -735,7 +673,7 @@ def get_ticket_detail(
 def scan_ticket(
     codigo_ticket: str,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Escanear y validar ticket mediante código QR
@@ -753,7 +691,7 @@ def scan_ticket(
             data = json.loads(codigo_ticket)
             if "codigo" in data:
                 codigo_ticket = data["codigo"]
-                print(f"DEBUG: JSON parseado en backend. Nuevo código: {codigo_ticket}")
+                logger.debug("Código de ticket extraído del JSON del QR")
     except:
         pass # Si falla, usamos el string original
 
@@ -870,7 +808,7 @@ def scan_ticket(
 def activate_ticket(
     ticket_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Activar (usar) un ticket por ID.
@@ -938,24 +876,41 @@ def activate_ticket(
 def create_localidad(
     item: schemas.LocalidadCreate,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Crear una nueva localidad (requiere autenticación)"""
     return crud.create_item(db, models.Localidad, item)
 
+# Serializadores de las tablas de referencia (cacheadas como bytes JSON)
+localidades_json = TypeAdapter(List[schemas.Localidad])
+organizadores_json = TypeAdapter(List[schemas.Organizador])
+generos_json = TypeAdapter(List[schemas.Genero])
+artistas_json = TypeAdapter(List[schemas.Artista])
+tipos_json = TypeAdapter(List[str])
+eventos_json = TypeAdapter(List[schemas.Evento])
+
+# Tablas de las que dependen las respuestas públicas de eventos (ETag)
+EVENTO_TABLES = (models.Evento.__tablename__, models.Ticket.__tablename__)
+
 @app.get("/localidad/", response_model=List[schemas.Localidad], tags=["Locations"])
-def read_localidades(
+async def read_localidades(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """Obtener todas las localidades (público)"""
+    """Obtener todas las localidades (público, cacheado hasta que cambie LOCALIDAD)"""
+    tables = (models.Localidad.__tablename__,)
     try:
-        return crud.get_items(db, models.Localidad, skip, limit)
-    except Exception as e:
-        print(f"ERROR in /localidad/: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        return await cache.conditional_response_async(request, db, tables, lambda: db.run_sync(
+            lambda session: cache.cached_json(
+                session, "localidades", tables, (skip, limit),
+                lambda: crud.get_items(session, models.Localidad, skip, limit),
+                localidades_json,
+            )
+        ))
+    except Exception:
+        logger.exception("Error en /localidad/")
         # Return empty list instead of 500 error
         return []
 
@@ -963,7 +918,7 @@ def read_localidades(
 def read_localidad(
     item_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Obtener una localidad por ID (requiere autenticación)"""
     return crud.get_item(db, models.Localidad, item_id)
@@ -973,7 +928,7 @@ def update_localidad(
     item_id: int,
     item: schemas.LocalidadCreate,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Actualizar una localidad (requiere autenticación)"""
     return crud.update_item(db, models.Localidad, item_id, item)
@@ -982,7 +937,7 @@ def update_localidad(
 def delete_localidad(
     item_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Eliminar una localidad (requiere autenticación)"""
     return crud.delete_item(db, models.Localidad, item_id)
@@ -995,7 +950,7 @@ def delete_localidad(
 def create_organizador(
     item: schemas.Organizador,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Crear un nuevo organizador (requiere autenticación)"""
     db_item = models.Organizador(**item.dict())
@@ -1009,16 +964,20 @@ def read_organizadores(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
-    """Obtener todos los organizadores (requiere autenticación)"""
-    return db.query(models.Organizador).offset(skip).limit(limit).all()
+    """Obtener todos los organizadores (requiere autenticación, cacheado hasta que cambie ORGANIZADOR)"""
+    return cache.json_bytes_response(cache.cached_json(
+        db, "organizadores", (models.Organizador.__tablename__,), (skip, limit),
+        lambda: db.query(models.Organizador).offset(skip).limit(limit).all(),
+        organizadores_json,
+    ))
 
 @app.get("/organizador/{item_id}", response_model=schemas.Organizador, tags=["Organizers"])
 def read_organizador(
     item_id: str,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Obtener un organizador por DNI (requiere autenticación)"""
     org = db.query(models.Organizador).filter_by(dni=item_id).first()
@@ -1031,7 +990,7 @@ def update_organizador(
     item_id: str,
     item: schemas.Organizador,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Actualizar un organizador (requiere autenticación)"""
     db_item = db.query(models.Organizador).filter_by(dni=item_id).first()
@@ -1047,7 +1006,7 @@ def update_organizador(
 def delete_organizador(
     item_id: str,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Eliminar un organizador (requiere autenticación)"""
     db_item = db.query(models.Organizador).filter_by(dni=item_id).first()
@@ -1061,7 +1020,7 @@ def delete_organizador(
 def delete_evento(
     item_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Eliminar un evento (requiere autenticación)"""
     evento = db.query(models.Evento).filter(models.Evento.id == item_id).first()
@@ -1073,6 +1032,7 @@ def delete_evento(
         tickets_to_delete = db.query(models.Ticket).filter(models.Ticket.evento_id == item_id).all()
         for ticket in tickets_to_delete:
             db.delete(ticket)
+        archive.delete_event_history(db, item_id)
         
         # Now delete the event
         db.delete(evento)
@@ -1093,25 +1053,33 @@ def delete_evento(
 def create_genero(
     item: schemas.GeneroBase,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Crear un nuevo género (requiere autenticación)"""
     return crud.create_item(db, models.Genero, item)
 
 @app.get("/genero/", response_model=List[schemas.Genero], tags=["Genres"])
-def read_generos(
+async def read_generos(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
-):
-    """Obtener todos los géneros (público)"""
-    return crud.get_items(db, models.Genero, skip, limit)
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Obtener todos los géneros (público, cacheado hasta que cambie GENERO)"""
+    tables = (models.Genero.__tablename__,)
+    return await cache.conditional_response_async(request, db, tables, lambda: db.run_sync(
+        lambda session: cache.cached_json(
+            session, "generos", tables, (skip, limit),
+            lambda: crud.get_items(session, models.Genero, skip, limit),
+            generos_json,
+        )
+    ))
 
 @app.get("/genero/{item_id}", response_model=schemas.Genero, tags=["Genres"])
 def read_genero(
     item_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Obtener un género por ID (requiere autenticación)"""
     return crud.get_item(db, models.Genero, item_id)
@@ -1121,7 +1089,7 @@ def update_genero(
     item_id: int,
     item: schemas.GeneroBase,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Actualizar un género (requiere autenticación)"""
     return crud.update_item(db, models.Genero, item_id, item)
@@ -1130,7 +1098,7 @@ def update_genero(
 def delete_genero(
     item_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Eliminar un género (requiere autenticación)"""
     return crud.delete_item(db, models.Genero, item_id)
@@ -1143,7 +1111,7 @@ def delete_genero(
 def create_artista(
     item: schemas.ArtistaBase,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Crear un nuevo artista (requiere autenticación)"""
     return crud.create_item(db, models.Artista, item)
@@ -1154,14 +1122,18 @@ def read_artistas(
     limit: int = 100,
     db: Session = Depends(get_db)
 ):
-    """Obtener todos los artistas (público)"""
-    return crud.get_items(db, models.Artista, skip, limit)
+    """Obtener todos los artistas (público, cacheado hasta que cambie ARTISTA)"""
+    return cache.json_bytes_response(cache.cached_json(
+        db, "artistas", (models.Artista.__tablename__,), (skip, limit),
+        lambda: crud.get_items(db, models.Artista, skip, limit),
+        artistas_json,
+    ))
 
 @app.get("/artista/{item_id}", response_model=schemas.Artista, tags=["Artists"])
 def read_artista(
     item_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Obtener un artista por ID (requiere autenticación)"""
     return crud.get_item(db, models.Artista, item_id)
@@ -1171,7 +1143,7 @@ def update_artista(
     item_id: int,
     item: schemas.ArtistaBase,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Actualizar un artista (requiere autenticación)"""
     return crud.update_item(db, models.Artista, item_id, item)
@@ -1180,7 +1152,7 @@ def update_artista(
 def delete_artista(
     item_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Eliminar un artista (requiere autenticación)"""
     return crud.delete_item(db, models.Artista, item_id)
@@ -1194,7 +1166,7 @@ def read_usuarios(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Obtener todos los usuarios (requiere autenticación)"""
     return crud.get_items(db, models.Usuario, skip, limit)
@@ -1203,7 +1175,7 @@ def read_usuarios(
 def read_usuario(
     item_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Obtener un usuario por ID (requiere autenticación)"""
     return crud.get_item(db, models.Usuario, item_id)
@@ -1213,7 +1185,7 @@ def update_usuario(
     item_id: int,
     item: schemas.UsuarioUpdate,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Actualizar un usuario (requiere autenticación)
@@ -1230,7 +1202,7 @@ def update_usuario(
 def delete_usuario(
     item_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Eliminar un usuario (requiere autenticación)
@@ -1255,8 +1227,8 @@ def admin_get_all_users(
     is_active: Optional[bool] = None,
     is_banned: Optional[bool] = None,
     search: Optional[str] = None,
-    db: Session = Depends(get_db),
-    current_admin: models.Usuario = Depends(get_current_admin)
+    db: Session = Depends(get_read_db),
+    current_admin: Principal = Depends(get_current_admin)
 ):
     """
     Obtener todos los usuarios con filtros opcionales (solo admin)
@@ -1274,8 +1246,8 @@ def admin_get_all_users(
 @app.get("/admin/users/{user_id}", response_model=schemas.Usuario, tags=["Admin"])
 def admin_get_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_admin: models.Usuario = Depends(get_current_admin)
+    db: Session = Depends(get_read_db),
+    current_admin: Principal = Depends(get_current_admin)
 ):
     """Obtener detalles de un usuario específico (solo admin)"""
     return crud.get_item(db, models.Usuario, user_id)
@@ -1285,7 +1257,7 @@ def admin_update_user(
     user_id: int,
     user_data: admin_schemas.AdminUserUpdate,
     db: Session = Depends(get_db),
-    current_admin: models.Usuario = Depends(get_current_admin)
+    current_admin: Principal = Depends(get_current_admin)
 ):
     """
     Actualizar un usuario desde el panel admin
@@ -1311,7 +1283,7 @@ def admin_update_user(
 def admin_delete_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_admin: models.Usuario = Depends(get_current_admin)
+    current_admin: Principal = Depends(get_current_admin)
 ):
     """Eliminar un usuario (solo admin)"""
     return admin_crud.delete_user_admin(db, user_id)
@@ -1320,7 +1292,7 @@ def admin_delete_user(
 def admin_ban_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_admin: models.Usuario = Depends(get_current_admin)
+    current_admin: Principal = Depends(get_current_admin)
 ):
     """Banear un usuario (solo admin)"""
     return admin_crud.ban_user(db, user_id)
@@ -1329,7 +1301,7 @@ def admin_ban_user(
 def admin_unban_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_admin: models.Usuario = Depends(get_current_admin)
+    current_admin: Principal = Depends(get_current_admin)
 ):
     """Desbanear un usuario (solo admin)"""
     return admin_crud.unban_user(db, user_id)
@@ -1338,15 +1310,15 @@ def admin_unban_user(
 def admin_promote_to_owner(
     user_id: int,
     db: Session = Depends(get_db),
-    current_admin: models.Usuario = Depends(get_current_admin)
+    current_admin: Principal = Depends(get_current_admin)
 ):
     """Promover un usuario a rol 'owner' (solo admin)"""
     return admin_crud.update_user_role(db, user_id, "owner")
 
 @app.get("/admin/statistics", response_model=admin_schemas.UserStatistics, tags=["Admin"])
 def admin_get_statistics(
-    db: Session = Depends(get_db),
-    current_admin: models.Usuario = Depends(get_current_admin)
+    db: Session = Depends(get_read_db),
+    current_admin: Principal = Depends(get_current_admin)
 ):
     """Obtener estadísticas de usuarios (solo admin)"""
     return admin_crud.get_user_statistics(db)
@@ -1354,13 +1326,14 @@ def admin_get_statistics(
 # GEOCODING UTILITY
 # ============================================
 
-import httpx
-
 def geocode_city(city_name: str) -> tuple:
     """
     Get latitude and longitude for a city using OpenStreetMap Nominatim API.
     Returns (lat, lon) or (None, None) if not found.
     """
+    # Import diferido: httpx solo hace falta al crear una localidad
+    import httpx
+
     try:
         url = "https://nominatim.openstreetmap.org/search"
         params = {
@@ -1380,7 +1353,7 @@ def geocode_city(city_name: str) -> tuple:
             lon = float(data[0]["lon"])
             return (lat, lon)
     except Exception as e:
-        print(f"Geocoding error for {city_name}: {e}")
+        logger.warning("Error de geocodificación para %s: %s", city_name, e)
     
     return (None, None)
 
@@ -1397,7 +1370,7 @@ def get_localidades(db: Session = Depends(get_db)):
 def create_localidad(
     localidad: schemas.LocalidadCreate,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_promotor)
+    current_user: Principal = Depends(get_current_promotor)
 ):
     """
     Crear una nueva localidad con geocoding automático.
@@ -1433,7 +1406,7 @@ def update_localidad(
     localidad_id: int,
     localidad: schemas.LocalidadCreate,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_promotor)
+    current_user: Principal = Depends(get_current_promotor)
 ):
     """
     Actualizar una localidad. Re-geocodifica si el nombre cambia.
@@ -1460,7 +1433,7 @@ def update_localidad(
 @app.post("/localidad/geocode-all", tags=["Locations"])
 def geocode_all_localidades(
     db: Session = Depends(get_db),
-    current_admin: models.Usuario = Depends(get_current_admin)
+    current_admin: Principal = Depends(get_current_admin)
 ):
     """
     Geocodificar todas las localidades que no tienen coordenadas (solo admin).
@@ -1490,13 +1463,19 @@ def geocode_all_localidades(
 def get_event_types(db: Session = Depends(get_db)):
     """
     Obtener lista de tipos de eventos únicos existentes en la BD
-    Endpoint público para filtros dinámicos
+    Endpoint público para filtros dinámicos (cacheado hasta que cambie EVENTO)
     """
-    tipos = db.query(models.Evento.tipo).distinct().all()
-    return [t[0] for t in tipos if t[0]]
+    def load_tipos():
+        tipos = db.query(models.Evento.tipo).distinct().all()
+        return [t[0] for t in tipos if t[0]]
+    
+    return cache.json_bytes_response(cache.cached_json(
+        db, "tipos", (models.Evento.__tablename__,), None, load_tipos, tipos_json
+    ))
 
 @app.get("/evento/search", response_model=List[schemas.Evento], tags=["Events"])
-def search_events(
+async def search_events(
+    request: Request,
     q: Optional[str] = None,           # Búsqueda por nombre
     tipo: Optional[str] = None,         # Filtro por tipo
     precio_min: Optional[float] = None, # Precio mínimo
@@ -1507,14 +1486,15 @@ def search_events(
     user_lat: Optional[float] = None,   # Latitud del usuario
     user_lon: Optional[float] = None,   # Longitud del usuario
     order_by_distance: bool = False,    # Ordenar por distancia
-    db: Session = Depends(get_db)
+    genero_id: Optional[int] = None,    # Filtro por género
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Búsqueda avanzada de eventos con múltiples filtros
     Endpoint público - soporta ordenación por distancia y filtro por fecha
+    Responde 304 si no ha cambiado ningún evento, ticket o localidad
     """
     import math
-    from datetime import datetime
     
     def haversine(lat1, lon1, lat2, lon2):
         """Calcula la distancia en km entre dos puntos geográficos"""
@@ -1527,65 +1507,53 @@ def search_events(
         c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
         return R * c
     
-    query = db.query(models.Evento)
-    
-    if q:
-        query = query.filter(models.Evento.nombre.ilike(f"%{q}%"))
-    if tipo:
-        query = query.filter(models.Evento.tipo == tipo)
-    if precio_min is not None:
-        query = query.filter(models.Evento.precio >= precio_min)
-    if precio_max is not None:
-        query = query.filter(models.Evento.precio <= precio_max)
-    if localidad_id:
-        query = query.filter(models.Evento.localidad_id == localidad_id)
-    
-    # Date filters
-    if fecha_desde:
-        try:
-            desde = datetime.strptime(fecha_desde, "%Y-%m-%d")
-            query = query.filter(models.Evento.fechayhora >= desde)
-        except ValueError:
-            pass  # Ignore invalid date format
-    
-    if fecha_hasta:
-        try:
-            hasta = datetime.strptime(fecha_hasta, "%Y-%m-%d")
-            # Include the entire day
-            hasta = hasta.replace(hour=23, minute=59, second=59)
-            query = query.filter(models.Evento.fechayhora <= hasta)
-        except ValueError:
-            pass  # Ignore invalid date format
-    
-    eventos = query.all()
+    # Mismos filtros que /evento/facets (fechas inválidas se ignoran)
+    filters = catalog_endpoints.normalize_event_filters(
+        q, tipo, genero_id, precio_min, precio_max, localidad_id, fecha_desde, fecha_hasta
+    )
     
-    # Calculate tickets sold and distance for each event
-    eventos_with_data = []
-    for event in eventos:
-        count = db.query(models.Ticket).filter(models.Ticket.evento_id == event.id).count()
-        setattr(event, "tickets_vendidos", count)
+    def build(db: Session):
+        query = catalog_endpoints.apply_event_filters(db.query(models.Evento), filters)
+        
+        eventos = query.all()
         
-        # Calculate distance if user location provided
-        distance = None
+        # Calculate tickets sold (incluidos los archivados) and distance for each event
+        counts = archive.tickets_sold_counts(db, [event.id for event in eventos])
+        localidades = {}
         if user_lat is not None and user_lon is not None:
-            localidad = db.query(models.Localidad).filter(models.Localidad.id == event.localidad_id).first()
-            if localidad and localidad.latitud and localidad.longitud:
-                distance = haversine(user_lat, user_lon, localidad.latitud, localidad.longitud)
-        setattr(event, "distancia_km", distance)
-        eventos_with_data.append(event)
-    
-    # Sort by distance if requested
-    if order_by_distance and user_lat is not None and user_lon is not None:
-        eventos_with_data.sort(key=lambda e: e.distancia_km if e.distancia_km is not None else float('inf'))
+            localidad_ids = {event.localidad_id for event in eventos if event.localidad_id is not None}
+            localidades = {
+                localidad.id: localidad
+                for localidad in db.query(models.Localidad).filter(models.Localidad.id.in_(localidad_ids))
+            } if localidad_ids else {}
+        eventos_with_data = []
+        for event in eventos:
+            setattr(event, "tickets_vendidos", counts.get(event.id, 0))
+            
+            # Calculate distance if user location provided
+            distance = None
+            if user_lat is not None and user_lon is not None:
+                localidad = localidades.get(event.localidad_id)
+                if localidad and localidad.latitud and localidad.longitud:
+                    distance = haversine(user_lat, user_lon, localidad.latitud, localidad.longitud)
+            setattr(event, "distancia_km", distance)
+            eventos_with_data.append(event)
+        
+        # Sort by distance if requested
+        if order_by_distance and user_lat is not None and user_lon is not None:
+            eventos_with_data.sort(key=lambda e: e.distancia_km if e.distancia_km is not None else float('inf'))
+        
+        return eventos_json.dump_json(eventos_json.validate_python(eventos_with_data, from_attributes=True))
     
-    return eventos_with_data
+    tables = EVENTO_TABLES + (models.Localidad.__tablename__,)
+    return await cache.conditional_response_async(request, db, tables, lambda: db.run_sync(build))
 
 @app.post("/evento/", response_model=schemas.Evento, status_code=status.HTTP_201_CREATED, tags=["Events"])
 def create_evento(
     item: schemas.EventoBase,
     equipos_ids: List[int] = [],  # NUEVO: IDs de equipos autorizados para escanear
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_promotor)
+    current_user: Principal = Depends(get_current_promotor)
 ):
     """Crear un nuevo evento (requiere rol de promotor o admin)"""
     try:
@@ -1617,7 +1585,7 @@ def create_evento(
         
     except Exception as e:
         db.rollback()
-        print(f"ERROR creating event: {str(e)}")
+        logger.exception("Error creando evento")
         # Check for IntegrityError (FK violation)
         if "Foreign key violation" in str(e) or "IntegrityError" in str(e) or "foreign key constraint" in str(e):
              raise HTTPException(
@@ -1630,43 +1598,43 @@ def create_evento(
         )
 
 @app.get("/evento/", response_model=List[schemas.Evento], tags=["Events"])
-def read_eventos(
+async def read_eventos(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """Obtener todos los eventos (endpoint público)"""
+    """Obtener todos los eventos (endpoint público, servido desde EVENT_CARD)"""
     try:
-        eventos = crud.get_items(db, models.Evento, skip, limit)
-        # Calculate tickets sold for each event
-        for event in eventos:
-            count = db.query(models.Ticket).filter(models.Ticket.evento_id == event.id).count()
-            setattr(event, "tickets_vendidos", count)
-        return eventos
-    except Exception as e:
-        print(f"ERROR in /evento/: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        return await cache.conditional_response_async(
+            request, db, EVENTO_TABLES,
+            lambda: db.run_sync(lambda session: event_cards.read_cards_json(session, skip, limit).encode()),
+        )
+    except Exception:
+        logger.exception("Error en /evento/")
         # Return empty list instead of 500 error for better UX
         return []
 
 @app.get("/evento/{item_id}", response_model=schemas.Evento, tags=["Events"])
-def read_evento(
+async def read_evento(
+    request: Request,
     item_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """Obtener un evento por ID (endpoint público)"""
-    evento = crud.get_item(db, models.Evento, item_id)
-    if evento:
-        count = db.query(models.Ticket).filter(models.Ticket.evento_id == evento.id).count()
-        setattr(evento, "tickets_vendidos", count)
-    return evento
+    """Obtener un evento por ID (endpoint público, servido desde EVENT_CARD)"""
+    async def build():
+        card = await db.run_sync(event_cards.read_card_json, item_id)
+        if card is None:
+            raise HTTPException(status_code=404, detail="Evento no encontrado")
+        return card.encode()
+    
+    return await cache.conditional_response_async(request, db, EVENTO_TABLES, build)
 
 @app.get("/evento/{evento_id}/equipos", tags=["Events"])
 def get_evento_equipos(
     evento_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_promotor)
+    current_user: Principal = Depends(get_current_promotor)
 ):
     """Obtener equipos asignados a un evento"""
     # Verify event exists and user has permission
@@ -1697,7 +1665,7 @@ def update_evento_equipos(
     evento_id: int,
     equipos_ids: List[int],
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_promotor)
+    current_user: Principal = Depends(get_current_promotor)
 ):
     """Actualizar equipos asignados a un evento"""
     # Verify event exists and user has permission
@@ -1741,7 +1709,7 @@ def get_my_eventos(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_promotor)
+    current_user: Principal = Depends(get_current_promotor)
 ):
     """Obtener eventos creados por el usuario actual (promotor o admin)"""
     if current_user.role == 'admin':
@@ -1753,10 +1721,10 @@ def get_my_eventos(
             models.Evento.creador_id == current_user.id
         ).offset(skip).limit(limit).all()
     
-    # Calculate tickets sold
+    # Calculate tickets sold (incluidos los archivados)
+    counts = archive.tickets_sold_counts(db, [event.id for event in eventos])
     for event in eventos:
-        count = db.query(models.Ticket).filter(models.Ticket.evento_id == event.id).count()
-        setattr(event, "tickets_vendidos", count)
+        setattr(event, "tickets_vendidos", counts.get(event.id, 0))
         
     return eventos
 
@@ -1765,7 +1733,7 @@ def update_evento(
     item_id: int,
     item: schemas.EventoBase,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_promotor)
+    current_user: Principal = Depends(get_current_promotor)
 ):
     """Actualizar un evento (requiere rol de promotor o admin, promotor solo puede editar sus eventos)"""
     # Get the event
@@ -1786,7 +1754,7 @@ def update_evento(
 def delete_evento(
     item_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_promotor)
+    current_user: Principal = Depends(get_current_promotor)
 ):
     """Eliminar un evento (requiere rol de promotor)"""
     return crud.delete_item(db, models.Evento, item_id)
@@ -1799,7 +1767,7 @@ def delete_evento(
 def create_genero(
     item: schemas.GeneroBase,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Crear un nuevo género (requiere autenticación)"""
     return crud.create_item(db, models.Genero, item)
@@ -1808,7 +1776,7 @@ def create_genero(
 def create_or_get_genero(
     nombre: str,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Crear un género automáticamente si no existe, o devolver el existente.
@@ -1851,7 +1819,7 @@ def update_genero(
     item_id: int,
     item: schemas.GeneroBase,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Actualizar un género (requiere autenticación)"""
     return crud.update_item(db, models.Genero, item_id, item)
@@ -1860,7 +1828,7 @@ def update_genero(
 def delete_genero(
     item_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Eliminar un género (requiere autenticación)"""
     return crud.delete_item(db, models.Genero, item_id)
@@ -1878,7 +1846,7 @@ class LocalidadCreate(BaseModel):
 def create_localidad(
     item: schemas.LocalidadBase,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Crear una nueva localidad (requiere autenticación)"""
     return crud.create_item(db, models.Localidad, item)
@@ -1889,7 +1857,7 @@ def create_or_get_localidad(
     latitud: Optional[float] = None,
     longitud: Optional[float] = None,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Crear una localidad automáticamente si no existe, o devolver la existente.
@@ -1922,7 +1890,7 @@ def create_or_get_localidad(
         return new_localidad
     except Exception as e:
         db.rollback()
-        print(f"Error in /localidad/auto: {str(e)}")
+        logger.exception("Error en /localidad/auto")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating/getting location: {str(e)}"
@@ -1950,7 +1918,7 @@ def update_localidad(
     item_id: int,
     item: schemas.LocalidadBase,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Actualizar una localidad (requiere autenticación)"""
     return crud.update_item(db, models.Localidad, item_id, item)
@@ -1959,7 +1927,7 @@ def update_localidad(
 def delete_localidad(
     item_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Eliminar una localidad (requiere autenticación)"""
     return crud.delete_item(db, models.Localidad, item_id)
@@ -1972,7 +1940,7 @@ def delete_localidad(
 def create_organizador(
     item: schemas.OrganizadorBase,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Crear un nuevo organizador (requiere autenticación)"""
     return crud.create_item(db, models.Organizador, item)
@@ -1985,7 +1953,7 @@ def create_or_get_organizador(
     telefono: str,
     web: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Crear un organizador automáticamente si no existe, o devolver el existente.
@@ -2036,7 +2004,7 @@ def update_organizador(
     dni: str,
     item: schemas.OrganizadorBase,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Actualizar un organizador (requiere autenticación)"""
     organizador = db.query(models.Organizador).filter(models.Organizador.dni == dni).first()
@@ -2052,7 +2020,7 @@ def update_organizador(
 def delete_organizador(
     dni: str,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """Eliminar un organizador (requiere autenticación)"""
     organizador = db.query(models.Organizador).filter(models.Organizador.dni == dni).first()
@@ -2070,7 +2038,7 @@ def delete_organizador(
 def create_ticket(
     item: schemas.TicketBase,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Crear un nuevo ticket (requiere autenticación)
@@ -2088,7 +2056,7 @@ def read_tickets(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Obtener tickets (requiere autenticación)
@@ -2102,7 +2070,7 @@ def read_tickets(
 def read_ticket(
     item_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Obtener un ticket por ID (requiere autenticación)
@@ -2121,7 +2089,7 @@ def update_ticket(
     item_id: int,
     item: schemas.TicketBase,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Actualizar un ticket (requiere autenticación)
@@ -2139,7 +2107,7 @@ def update_ticket(
 def delete_ticket(
     item_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Eliminar un ticket (requiere autenticación)
@@ -2161,7 +2129,7 @@ def delete_ticket(
 def validate_ticket(
     request: schemas.TicketScanRequest,
     db: Session = Depends(get_db),
-    current_scanner: models.Usuario = Depends(get_current_scanner)
+    current_scanner: Principal = Depends(get_current_scanner)
 ):
     """
     Validar un ticket (requiere rol scanner, promotor, owner o admin)
@@ -2240,7 +2208,7 @@ def validate_ticket(
         )
     
     except Exception as e:
-        print(f"ERROR validating ticket: {type(e).__name__}: {str(e)}")
+        logger.exception("Error validando ticket")
         return schemas.TicketScanResponse(
             success=False,
             message=f"Error al validar ticket: {str(e)}"
@@ -2250,7 +2218,7 @@ def validate_ticket(
 def activate_ticket(
     ticket_id: int,
     db: Session = Depends(get_db),
-    current_scanner: models.Usuario = Depends(get_current_scanner)
+    current_scanner: Principal = Depends(get_current_scanner)
 ):
     """
     Marcar un ticket como utilizado/activado (requiere rol scanner)
@@ -2323,7 +2291,7 @@ def activate_ticket(
         )
     
     except Exception as e:
-        print(f"ERROR activating ticket: {type(e).__name__}: {str(e)}")
+        logger.exception("Error activando ticket")
         db.rollback()
         return schemas.TicketScanResponse(
             success=False,
@@ -2333,7 +2301,7 @@ def activate_ticket(
 @app.get("/scanner/my-events", response_model=List[schemas.Evento], tags=["Scanner"])
 def get_scanner_events(
     db: Session = Depends(get_db),
-    current_scanner: models.Usuario = Depends(get_current_scanner)
+    current_scanner: Principal = Depends(get_current_scanner)
 ):
     """
     Obtener eventos disponibles para escanear (requiere rol scanner)
@@ -2342,8 +2310,8 @@ def get_scanner_events(
         # Get all events - scanners can see all events to know which ones they can scan
         events = db.query(models.Evento).all()
         return events
-    except Exception as e:
-        print(f"ERROR getting scanner events: {type(e).__name__}: {str(e)}")
+    except Exception:
+        logger.exception("Error obteniendo eventos del scanner")
         return []
 
 
@@ -2355,7 +2323,7 @@ def get_scanner_events(
 def create_pago(
     item: schemas.PagoBase,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Crear un nuevo pago (requiere autenticación)
@@ -2373,7 +2341,7 @@ def read_pagos(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Obtener pagos (requiere autenticación)
@@ -2387,7 +2355,7 @@ def read_pagos(
 def read_pago(
     item_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Obtener un pago por ID (requiere autenticación)
@@ -2406,7 +2374,7 @@ def update_pago(
     item_id: int,
     item: schemas.PagoBase,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Actualizar un pago (requiere autenticación)
@@ -2424,7 +2392,7 @@ def update_pago(
 def delete_pago(
     item_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Eliminar un pago (requiere autenticación)
@@ -2451,177 +2419,6 @@ def health_check():
         "version": settings.APP_VERSION
     }
 
-@app.get("/init-db")
-def init_db():
-    """
-    Endpoint para inicializar las tablas de la base de datos.
-    Útil para despliegues en Vercel donde no tenemos acceso a consola.
-    ⚠️ ADVERTENCIA: Esto CREARÁ las tablas si no existen.
-    """
-    try:
-        print("DEBUG: Creating database tables...")
-        models.Base.metadata.create_all(bind=engine)
-        print("DEBUG: Database tables created successfully")
-        return {
-            "message": "Tablas creadas correctamente en la base de datos",
-            "tables": [table.name for table in models.Base.metadata.sorted_tables]
-        }
-    except Exception as e:
-        print(f"DEBUG: Error creating tables: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error al crear tablas: {str(e)}"
-        )
-
-@app.get("/seed-test-data", tags=["Admin"])
-def seed_test_data(db: Session = Depends(get_db)):
-    """
-    Seed database with test users and events (PUBLIC - for initial setup)
-    """
-    
-    from datetime import date
-    
-    users_data = [
-        {"nombre": "Carlos", "apellidos": "Escáner", "email": "scanner@njoy.com", "password": "scanner123", "role": "scanner"},
-        {"nombre": "María", "apellidos": "Promotora", "email": "promotor@njoy.com", "password": "promotor123", "role": "promotor"},
-        {"nombre": "Juan", "apellidos": "Usuario", "email": "user@njoy.com", "password": "user123", "role": "user"}
-    ]
-    
-    created = []
-    for user_data in users_data:
-        if db.query(models.Usuario).filter(models.Usuario.email == user_data["email"]).first():
-            continue
-        
-        from auth import hash_password
-        new_user = models.Usuario(
-            nombre=user_data["nombre"],
-            apellidos=user_data["apellidos"],
-            email=user_data["email"],
-            password=hash_password(user_data["password"]),
-            fecha_nacimiento=date(1995, 1, 1),
-            pais="España",
-            role=user_data["role"],
-            is_active=True,
-            is_banned=False
-        )
-        db.add(new_user)
-        created.append(user_data["email"])
-    
-    # Sample events
-    from datetime import datetime
-    events_data = [
-        {
-            "nombre": "Rock Festival 2025",
-            "descripcion": "Festival de rock",
-            "fechayhora": datetime(2025, 7, 15, 20, 0),
-            "recinto": "Estadio Municipal",
-            "precio": 45.0,
-            "plazas": 5000,
-            "tipo": "Concierto",
-            "localidad_id": None,
-            "organizador_dni": None,
-            "genero_id": None
-        },
-        {
-            "nombre": "Noche Electrónica",
-            "descripcion": "DJs internacionales",
-            "fechayhora": datetime(2025, 6, 20, 22, 0),
-            "recinto": "Club Downtown",
-            "precio": 30.0,
-            "plazas": 1000,
-            "tipo": "Concierto",
-            "localidad_id": None,
-            "organizador_dni": None,
-            "genero_id": None
-        },
-        {
-            "nombre": "Jazz en Vivo",
-            "descripcion": "Velada íntima de jazz",
-            "fechayhora": datetime(2025, 5, 10, 19, 30),
-            "recinto": "Auditorio Cultural",
-            "precio": 25.0,
-            "plazas": 300,
-            "tipo": "Concierto",
-            "localidad_id": None,
-            "organizador_dni": None,
-            "genero_id": None
-        }
-    ]
-    
-    events_created = []
-    for event_data in events_data:
-        if db.query(models.Evento).filter(models.Evento.nombre == event_data["nombre"]).first():
-            continue
-        
-        new_event = models.Evento(**event_data)
-        db.add(new_event)
-        events_created.append(event_data["nombre"])
-    
-    db.commit()
-    
-    return {
-        "message": "Datos de prueba creados",
-        "users_created": created,
-        "events_created": events_created,
-        "credentials": {
-            "scanner": "scanner@njoy.com / scanner123",
-            "promotor": "promotor@njoy.com / promotor123",
-            "user": "user@njoy.com / user123"
-        }
-    }
-
-@app.get("/drop-and-recreate-db")
-def drop_and_recreate_db():
-    """
-    ⚠️ PELIGRO: Elimina TODAS las tablas y las recrea.
->>>>>>> Stashed changes
-    Esto BORRARÁ TODOS LOS DATOS.
-    Solo usar en desarrollo.
-    """
-    try:
-        print("DEBUG: Dropping all tables...")
-        models.Base.metadata.drop_all(bind=engine)
-        print("DEBUG: Tables dropped successfully")
-        
-        print("DEBUG: Creating database tables...")
-        models.Base.metadata.create_all(bind=engine)
-        print("DEBUG: Database tables created successfully")
-        
-        return {
-            "message": "⚠️ TODAS las tablas fueron eliminadas y recreadas",
-            "warning": "TODOS LOS DATOS FUERON ELIMINADOS",
-            "tables": [table.name for table in models.Base.metadata.sorted_tables]
-        }
-    except Exception as e:
-        print(f"DEBUG: Error recreating tables: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error al recrear tablas: {str(e)}"
-        )
-
-@app.get("/seed-db")
-def seed_db(db: Session = Depends(get_db)):
-    """
-    Endpoint para poblar la base de datos con datos ficticios.
-    ⚠️ ADVERTENCIA: Esto BORRARÁ todos los datos existentes.
-    Solo usar en desarrollo/testing.
-    """
-    try:
-        stats = seed_data.seed_database(db)
-        return {
-            "message": "Base de datos poblada con datos ficticios",
-            "datos_creados": stats
-        }
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error al poblar la base de datos: {str(e)}"
-        )
-
 @app.get("/", tags=["Root"])
 def read_root():
     """health check"""
@@ -2631,73 +2428,6 @@ def read_root():
         "docs": "/docs"
     }
 
-@app.get("/debug/recent-tickets", tags=["Debug"])
-def get_recent_tickets_debug(db: Session = Depends(get_db)):
-    """
-    TEMPORARY DEBUG ENDPOINT - Shows last 10 tickets in database
-    Used to verify QR code data in production
-    """
-    try:
-        tickets = db.query(models.Ticket).order_by(models.Ticket.id.desc()).limit(10).all()
-        results = []
-        for t in tickets:
-            results.append({
-                "id": t.id,
-                "codigo_ticket": t.codigo_ticket,
-                "evento_id": t.evento_id,
-                "activado": t.activado,
-                "nombre_asistente": t.nombre_asistente
-            })
-        return {"count": len(results), "tickets": results}
-    except Exception as e:
-        return {"error": str(e)}
-
-@app.post("/admin/migrate-ticket-codes", tags=["Admin"])
-def migrate_ticket_codes(
-    db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
-):
-    """
-    ADMIN ONLY: Migrate tickets with NULL or UUID codigo_ticket to 6-char codes
-    """
-    if current_user.role != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    
-    try:
-        # Find tickets with NULL or UUID-format codes
-        tickets_to_migrate = db.query(models.Ticket).filter(
-            (models.Ticket.codigo_ticket == None) | 
-            (models.Ticket.codigo_ticket.like('%-%'))  # UUID format contains dashes
-        ).all()
-        
-        migrated_count = 0
-        skipped_count = 0
-        
-        for ticket in tickets_to_migrate:
-            # Generate unique 6-char code
-            while True:
-                new_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-                # Check if code is unique
-                existing = db.query(models.Ticket).filter(
-                    models.Ticket.codigo_ticket == new_code
-                ).first()
-                if not existing:
-                    ticket.codigo_ticket = new_code
-                    migrated_count += 1
-                    break
-        
-        db.commit()
-        
-        return {
-            "success": True,
-            "migrated": migrated_count,
-            "total_found": len(tickets_to_migrate),
-            "message": f"Successfully migrated {migrated_count} tickets to 6-character codes"
-        }
-    except Exception as e:
-        db.rollback()
-        return {"success": False, "error": str(e)}
-
 # ============================================
 # EVENT STATISTICS ENDPOINTS
 # ============================================
@@ -2710,7 +2440,7 @@ def verify_stats_access(
     evento_id: int,
     verification: estadisticas_schemas.PasswordVerificationRequest,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Verify user password and ownership to grant temporary access to event statistics
@@ -2756,8 +2486,8 @@ def verify_stats_access(
 @app.get("/evento/{evento_id}/estadisticas", tags=["Events"])
 def get_event_statistics(
     evento_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Get comprehensive event statistics with hourly breakdown
@@ -2784,17 +2514,12 @@ def get_event_statistics(
             detail="Solo el creador del evento puede ver estas estadísticas"
         )
     
-    # 3. Calculate statistics
+    # 3. Calculate statistics (TICKET + TICKET_ARCHIVE: los eventos pasados están archivados)
     # Total tickets sold
-    total_tickets = db.query(models.Ticket).filter(
-        models.Ticket.evento_id == evento_id
-    ).count()
+    total_tickets = archive.count_tickets(db, evento_id)
     
     # Scanned tickets (attended)
-    scanned_tickets = db.query(models.Ticket).filter(
-        models.Ticket.evento_id == evento_id,
-        models.Ticket.activado == False  # False means it was scanned
-    ).count()
+    scanned_tickets = archive.count_tickets(db, evento_id, only_scanned=True)
     
     # Financial calculations
     precio = evento.precio if evento.precio else 0
@@ -2808,11 +2533,8 @@ def get_event_statistics(
     # Attendance rate
     tasa_asistencia = (scanned_tickets / total_tickets * 100) if total_tickets > 0 else 0
     
-    # 4. Get all scanned tickets with timestamps (needed for time range and hourly breakdown)
-    tickets_escaneados_list = db.query(models.Ticket).filter(
-        models.Ticket.evento_id == evento_id,
-        models.Ticket.scanned_at != None
-    ).all()
+    # 4. Get all scan timestamps (needed for time range and hourly breakdown)
+    scan_times = archive.scan_times(db, evento_id)
     
     # 5. Calculate time range for charts (from first scan to current hour + 1)
     from datetime import datetime
@@ -2821,9 +2543,9 @@ def get_event_statistics(
     event_hour = evento.fechayhora.hour
     
     # Find the range: from first scan (or event start) to current hour + 1
-    if tickets_escaneados_list:
-        first_scan_hour = min(t.scanned_at.hour for t in tickets_escaneados_list)
-        last_scan_hour = max(t.scanned_at.hour for t in tickets_escaneados_list)
+    if scan_times:
+        first_scan_hour = min(t.hour for t in scan_times)
+        last_scan_hour = max(t.hour for t in scan_times)
         
         # Start from the earlier of: event hour or first scan
         start_hour = min(event_hour, first_scan_hour)
@@ -2841,8 +2563,8 @@ def get_event_statistics(
     max_hour_count = 0
     peak_hour = None
     
-    for ticket in tickets_escaneados_list:
-        hour = ticket.scanned_at.hour
+    for scanned_at in scan_times:
+        hour = scanned_at.hour
         if hour not in hourly_stats_dict:
             hourly_stats_dict[hour] = 0
         hourly_stats_dict[hour] += 1
@@ -2899,31 +2621,3 @@ def get_event_statistics(
     )
     
     return response
-
-
-
-@app.get("/test-deployment-nov24")
-def test_deployment():
-    """Test endpoint to verify deployment is working - November 24 2025"""
-    return {
-        "status": "OK",
-        "message": "Backend is deployed and running - November 24 16:15",
-        "version": "3.1.0-test"
-    }
-
-
-@app.get("/debug/cors", tags=["Health"])
-def debug_cors():
-    """
-    Endpoint de diagnóstico para verificar la configuración de CORS
-    ⚠️ Solo para debugging - ELIMINAR en producción
-    """
-    import os
-    return {
-        "allowed_origins": settings.ALLOWED_ORIGINS,
-        "allowed_origins_count": len(settings.ALLOWED_ORIGINS),
-        "env_variable_raw": os.getenv("ALLOWED_ORIGINS", "NOT_SET"),
-        "app_name": settings.APP_NAME
-    }
-
-
@@ -0,0 +1,167 @@
+"""
+Métricas HTTP por ruta en formato Prometheus (/metrics)
+(más las del pool de conexiones, que recoge database.py)
+
+Por cada (método, ruta plantilla) se registran peticiones por código de
+estado y un histograma de latencia; además, las peticiones en curso.
+La ruta es la plantilla de FastAPI (/evento/{item_id}), no la URL real,
+para que el número de series no dependa de los ids.
+
+El middleware solo se ejecuta en el hilo del event loop, así que los
+contadores son dicts simples sin locks. Cada worker/instancia tiene sus
+propias métricas: Prometheus las agrega al hacer scrape de cada una.
+"""
+import time
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+
+from config import settings
+from database import POOL_PROFILE, POOL_WAIT_BUCKETS, pool_stats
+
+# Límites superiores (segundos) de los buckets del histograma
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+_requests: Dict[Tuple[str, str, int], int] = {}
+# (método, ruta) -> [conteos por bucket (+Inf al final), suma, total]
+_latency: Dict[Tuple[str, str], list] = {}
+_in_progress = 0
+
+
+def _observe(method: str, route: str, status_code: int, seconds: float) -> None:
+    key = (method, route, status_code)
+    _requests[key] = _requests.get(key, 0) + 1
+
+    histogram = _latency.get((method, route))
+    if histogram is None:
+        histogram = _latency[(method, route)] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+    histogram[0][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+    histogram[1] += seconds
+    histogram[2] += 1
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que mide cada petición HTTP"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _in_progress
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+        start = time.perf_counter()
+        _in_progress += 1
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _in_progress -= 1
+            # El router de Starlette deja la ruta encontrada en el scope
+            route = scope.get("route")
+            _observe(
+                scope["method"],
+                getattr(route, "path", UNMATCHED_ROUTE),
+                status_code,
+                time.perf_counter() - start,
+            )
+
+
+# ============================================
+# EXPOSICIÓN
+# ============================================
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def render_prometheus() -> str:
+    """Métricas actuales en formato de texto de Prometheus"""
+    lines: List[str] = [
+        "# HELP http_requests_total Peticiones HTTP por método, ruta y código de estado",
+        "# TYPE http_requests_total counter",
+    ]
+    for (method, route, code), count in sorted(_requests.items()):
+        lines.append(f"http_requests_total{{{_labels(method=method, route=route, status=code)}}} {count}")
+
+    lines += [
+        "# HELP http_request_duration_seconds Latencia de las peticiones HTTP",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route), (buckets, total_seconds, count) in sorted(_latency.items()):
+        labels = _labels(method=method, route=route)
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+            cumulative += n
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"http_request_duration_seconds_sum{{{labels}}} {total_seconds}")
+        lines.append(f"http_request_duration_seconds_count{{{labels}}} {count}")
+
+    lines += [
+        "# HELP http_requests_in_progress Peticiones HTTP en curso",
+        "# TYPE http_requests_in_progress gauge",
+        f"http_requests_in_progress {_in_progress}",
+    ]
+    lines += _render_pool()
+    return "\n".join(lines) + "\n"
+
+
+def _render_pool() -> List[str]:
+    """Métricas del pool de conexiones (database.pool_stats)"""
+    stats = pool_stats.snapshot()
+    labels = _labels(profile=POOL_PROFILE)
+    lines = [
+        "# HELP db_pool_checkouts_total Conexiones entregadas por el pool",
+        "# TYPE db_pool_checkouts_total counter",
+        f"db_pool_checkouts_total{{{labels}}} {stats['checkouts']}",
+        "# HELP db_pool_timeouts_total Esperas de conexión que superaron DB_POOL_TIMEOUT",
+        "# TYPE db_pool_timeouts_total counter",
+        f"db_pool_timeouts_total{{{labels}}} {stats['timeouts']}",
+        "# HELP db_pool_connects_total Conexiones nuevas abiertas contra la base de datos",
+        "# TYPE db_pool_connects_total counter",
+        f"db_pool_connects_total{{{labels}}} {stats['connects']}",
+        "# HELP db_pool_checked_out Conexiones en uso",
+        "# TYPE db_pool_checked_out gauge",
+        f"db_pool_checked_out{{{labels}}} {stats['checked_out']}",
+        "# HELP db_pool_wait_seconds Tiempo hasta obtener una conexión del pool",
+        "# TYPE db_pool_wait_seconds histogram",
+    ]
+    cumulative = 0
+    for bound, n in zip(POOL_WAIT_BUCKETS + ("+Inf",), stats["wait_buckets"]):
+        cumulative += n
+        lines.append(f'db_pool_wait_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f"db_pool_wait_seconds_sum{{{labels}}} {stats['wait_sum']}")
+    lines.append(f"db_pool_wait_seconds_count{{{labels}}} {stats['checkouts']}")
+    return lines
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """
+    Métricas en formato Prometheus
+
+    Si METRICS_TOKEN está configurado, requiere Authorization: Bearer <METRICS_TOKEN>.
+    Sin token solo se monta con ENV=local (settings.METRICS_ENDPOINT_ENABLED).
+    Es async para leer los contadores en el mismo hilo que los actualiza.
+    """
+    if settings.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token de métricas inválido")
+    return Response(content=render_prometheus(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,380 @@
+"""
+Migraciones versionadas del esquema
+
+Sustituye al create_all que se ejecutaba en cada arranque (y a los
+migrate_*.py y /fix-db-schema para los cambios hechos a mano).
+
+- La tabla SCHEMA_VERSION guarda las migraciones aplicadas
+- Al arrancar (main.py) se lee la versión con una sola consulta: si coincide
+  con la última no se toca nada más (sin reflexión del catálogo en cada
+  arranque en frío de Vercel)
+- Si hay migraciones pendientes se aplican en orden dentro de una
+  transacción; en Postgres con un advisory lock para que dos instancias que
+  arrancan a la vez no las apliquen dos veces
+
+Añadir una migración: una función con @migration(<siguiente versión>, "...")
+al final de este fichero. Nunca se cambia una migración ya publicada. Las
+migraciones no usan models.py (que sigue cambiando): crean las tablas con
+su copia congelada en "ESQUEMA CONGELADO" o con DDL explícito.
+
+Uso:
+    python migrate.py            # aplicar las pendientes
+    python migrate.py --status   # versión actual y pendientes
+"""
+import logging
+import sys
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional
+
+from sqlalchemy import (
+    DECIMAL, Boolean, Column, Date, DateTime, Float, ForeignKey, Integer, MetaData, String, Table, Text,
+    func, inspect, literal, select, text,
+)
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.engine import Connection, Engine
+
+from database import engine
+
+logger = logging.getLogger("njoy.migrate")
+
+# Fuera de models.Base: drop_all / create_all del modelo no la tocan
+version_table = Table(
+    "SCHEMA_VERSION",
+    MetaData(),
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("nombre", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Clave del pg_advisory_xact_lock de las migraciones
+_PG_LOCK_KEY = 7_204_118_291
+
+
+# ============================================
+# ESQUEMA CONGELADO
+# ============================================
+# Las tablas tal como las crean las migraciones, no como están hoy en
+# models.py: una base nueva pasa por el mismo DDL que una de producción.
+# Un cambio del modelo va en una migración nueva, no aquí.
+
+schema = MetaData()
+
+# Migración 1: esquema inicial
+Table(
+    "LOCALIDAD", schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("ciudad", String(100), nullable=False),
+    Column("latitud", Float, nullable=True),
+    Column("longitud", Float, nullable=True),
+)
+Table(
+    "ORGANIZADOR", schema,
+    Column("dni", String(20), primary_key=True, index=True),
+    Column("ncompleto", String(100), nullable=False),
+    Column("email", String(150), nullable=False, unique=True),
+    Column("telefono", String(15), nullable=False),
+    Column("web", String(255)),
+)
+Table(
+    "GENERO", schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("nombre", String(50), nullable=False),
+)
+Table(
+    "ARTISTA", schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("nartistico", String(100), nullable=False),
+    Column("nreal", String(100), nullable=False),
+)
+Table(
+    "USUARIO", schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("nombre", String(50), nullable=False, index=True),
+    Column("apellidos", String(100), nullable=False),
+    Column("email", String(100), nullable=False, unique=True, index=True),
+    Column("fecha_nacimiento", Date, nullable=False),
+    Column("pais", String(100), nullable=True),
+    Column("password", String(255), nullable=False),
+    Column("role", String(20), default="user", nullable=False),
+    Column("is_active", Boolean, default=True, nullable=False),
+    Column("is_banned", Boolean, default=False, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("email_verified", Boolean, default=False, nullable=False),
+    Column("verification_token", String(255), nullable=True),
+    Column("verification_token_expiry", DateTime, nullable=True),
+    Column("foto_perfil", String(500), nullable=True),
+    Column("bio", String(500), nullable=True),
+)
+Table(
+    "EVENTO", schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("nombre", String(100), nullable=False),
+    Column("descripcion", String(201), nullable=False),
+    Column("localidad_id", Integer, ForeignKey("LOCALIDAD.id")),
+    Column("recinto", String(100), nullable=False),
+    Column("plazas", Integer, nullable=False),
+    Column("fechayhora", DateTime, nullable=False, index=True),
+    Column("tipo", String(50), nullable=False),
+    Column("precio", Float, nullable=True),
+    Column("organizador_dni", String(20), ForeignKey("ORGANIZADOR.dni")),
+    Column("genero_id", Integer, ForeignKey("GENERO.id")),
+    Column("imagen", String(100)),
+    Column("creador_id", Integer, ForeignKey("USUARIO.id")),
+    Column("venta_pausada", Boolean, default=False, nullable=False),
+)
+Table(
+    "EVENT_CARD", schema,
+    Column("evento_id", Integer, primary_key=True),
+    Column("documento", Text, nullable=False),
+    Column("tickets_vendidos", Integer, default=0, nullable=False),
+    Column("actualizado_at", DateTime, nullable=False),
+)
+Table(
+    "TICKET", schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("codigo_ticket", String, unique=True, index=True, nullable=False),
+    Column("nombre_asistente", String, nullable=True),
+    Column("evento_id", Integer, ForeignKey("EVENTO.id")),
+    Column("usuario_id", Integer, ForeignKey("USUARIO.id")),
+    Column("activado", Boolean, default=True),
+    Column("scanned_at", DateTime, nullable=True),
+)
+Table(
+    "PAGO", schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("usuario_id", Integer, ForeignKey("USUARIO.id")),
+    Column("metodo_pago", String(50), nullable=False),
+    Column("total", DECIMAL(10, 2), nullable=False),
+    Column("fecha", DateTime, nullable=False),
+    Column("ticket_id", Integer, ForeignKey("TICKET.id"), unique=True),
+)
+Table(
+    "TEAM", schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String(100), unique=True, nullable=False),
+    Column("leader_id", Integer, ForeignKey("USUARIO.id")),
+    Column("created_at", DateTime),
+)
+Table(
+    "TEAM_MEMBER", schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("team_id", Integer, ForeignKey("TEAM.id")),
+    Column("user_id", Integer, ForeignKey("USUARIO.id")),
+    Column("status", String(20), default="pending"),
+    Column("invited_at", DateTime),
+    Column("joined_at", DateTime, nullable=True),
+)
+INITIAL_TABLES = list(schema.sorted_tables)
+
+# Migración 5: archivo de tickets y pagos
+Table(
+    "TICKET_ARCHIVE", schema,
+    Column("id", Integer, primary_key=True, autoincrement=False),
+    Column("codigo_ticket", String, nullable=True, index=True),
+    Column("nombre_asistente", String, nullable=True),
+    Column("evento_id", Integer, ForeignKey("EVENTO.id"), index=True),
+    Column("usuario_id", Integer, ForeignKey("USUARIO.id"), index=True),
+    Column("activado", Boolean, default=True),
+    Column("scanned_at", DateTime, nullable=True),
+    Column("archived_at", DateTime, nullable=False),
+)
+Table(
+    "PAGO_ARCHIVE", schema,
+    Column("id", Integer, primary_key=True, autoincrement=False),
+    Column("usuario_id", Integer, ForeignKey("USUARIO.id"), index=True),
+    Column("metodo_pago", String(50), nullable=False),
+    Column("total", DECIMAL(10, 2), nullable=False),
+    Column("fecha", DateTime, nullable=False),
+    Column("ticket_id", Integer, ForeignKey("TICKET_ARCHIVE.id"), unique=True),
+    Column("archived_at", DateTime, nullable=False),
+)
+
+# Migración 6: versiones de las tablas del catálogo
+Table(
+    "TABLE_VERSION", schema,
+    Column("tabla", String(64), primary_key=True),
+    Column("version", Integer, default=0, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    nombre: str
+    apply: Callable[[Connection], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, nombre: str):
+    """Registrar una migración (las versiones van seguidas: 1, 2, 3...)"""
+    def register(fn):
+        assert version == len(MIGRATIONS) + 1, f"Migración {version} fuera de orden"
+        MIGRATIONS.append(Migration(version, nombre, fn))
+        return fn
+    return register
+
+
+# ============================================
+# RUNNER
+# ============================================
+
+def latest_version() -> int:
+    return MIGRATIONS[-1].version
+
+
+def current_version(target_engine: Engine = engine) -> Optional[int]:
+    """Versión aplicada (None si la tabla SCHEMA_VERSION aún no existe)"""
+    with target_engine.connect() as conn:
+        try:
+            return conn.scalar(select(func.max(version_table.c.version))) or 0
+        except sa_exc.DBAPIError:
+            return None
+
+
+def _lock(conn: Connection) -> None:
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _PG_LOCK_KEY})
+
+
+def run_migrations(target_engine: Engine = engine) -> List[str]:
+    """Aplicar las migraciones pendientes; devuelve las aplicadas"""
+    version = current_version(target_engine)
+    if version is not None and version >= latest_version():
+        if version > latest_version():
+            logger.warning("El esquema (v%d) es más nuevo que el código (v%d)", version, latest_version())
+        return []
+
+    applied = []
+    with target_engine.begin() as conn:
+        _lock(conn)
+        version_table.create(conn, checkfirst=True)
+        # Releer con el lock: otra instancia puede haberlas aplicado ya
+        version = conn.scalar(select(func.max(version_table.c.version))) or 0
+        for pending in MIGRATIONS[version:]:
+            logger.info("Aplicando migración %d: %s", pending.version, pending.nombre)
+            pending.apply(conn)
+            conn.execute(version_table.insert().values(
+                version=pending.version, nombre=pending.nombre, applied_at=datetime.now(),
+            ))
+            applied.append(f"{pending.version}: {pending.nombre}")
+    return applied
+
+
+# ============================================
+# UTILIDADES PARA MIGRACIONES
+# ============================================
+
+def _column_ddl(conn: Connection, column: Column) -> str:
+    """ADD COLUMN para una columna del modelo, con su default como DEFAULT de servidor"""
+    quote = conn.dialect.identifier_preparer.quote
+    ddl = f"{quote(column.name)} {column.type.compile(dialect=conn.dialect)}"
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if default is not None:
+        rendered = literal(default, column.type).compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+        ddl += f" DEFAULT {rendered}"
+        if not column.nullable:
+            ddl += " NOT NULL"
+    # Sin default no se puede rellenar las filas existentes: la columna queda nullable
+    return ddl
+
+
+def add_missing_columns(conn: Connection, table: Table) -> List[str]:
+    """Añadir las columnas del modelo que falten en la tabla (ya existente)"""
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    quote = conn.dialect.identifier_preparer.quote
+    added = []
+    for column in table.columns:
+        if column.name in existing or column.primary_key:
+            continue
+        conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {_column_ddl(conn, column)}"))
+        added.append(column.name)
+    if added:
+        logger.info("%s: columnas añadidas %s", table.name, ", ".join(added))
+    return added
+
+
+def create_index(conn: Connection, name: str, table: str, *columns: str) -> None:
+    """CREATE INDEX si no existe (SQLite y Postgres)"""
+    quote = conn.dialect.identifier_preparer.quote
+    conn.execute(text(
+        f"CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} ({', '.join(quote(c) for c in columns)})"
+    ))
+
+
+# ============================================
+# MIGRACIONES
+# ============================================
+
+@migration(1, "esquema inicial")
+def _initial_schema(conn: Connection) -> None:
+    # Bases nuevas: todas las tablas. Bases existentes: solo las que falten
+    schema.create_all(conn, tables=INITIAL_TABLES)
+
+
+@migration(2, "columnas añadidas a mano en producción")
+def _catch_up_columns(conn: Connection) -> None:
+    # Lo que hacían /fix-db-schema y los migrate_*.py: email_verified,
+    # verification_token*, foto_perfil, bio, creador_id, scanned_at,
+    # venta_pausada... en bases creadas antes de esas columnas
+    for table in INITIAL_TABLES:
+        add_missing_columns(conn, table)
+
+
+@migration(3, "índices declarados en los modelos")
+def _model_indexes(conn: Connection) -> None:
+    # create_all no añade índices a tablas que ya existían (ix_EVENTO_fechayhora...)
+    for table in INITIAL_TABLES:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+@migration(4, "índices de claves ajenas y compuestos")
+def _foreign_key_indexes(conn: Connection) -> None:
+    # Ajustados a las consultas reales (ver index_advisor.py): el prefijo del
+    # índice compuesto es la igualdad y el segundo campo el filtro / orden
+    create_index(conn, "ix_TICKET_evento_id_scanned_at", "TICKET", "evento_id", "scanned_at")
+    create_index(conn, "ix_TICKET_usuario_id", "TICKET", "usuario_id")
+    create_index(conn, "ix_EVENTO_creador_id", "EVENTO", "creador_id")
+    create_index(conn, "ix_EVENTO_localidad_id_fechayhora", "EVENTO", "localidad_id", "fechayhora")
+    create_index(conn, "ix_TEAM_MEMBER_user_id_status", "TEAM_MEMBER", "user_id", "status")
+    create_index(conn, "ix_TEAM_MEMBER_team_id_status", "TEAM_MEMBER", "team_id", "status")
+    create_index(conn, "ix_TEAM_leader_id", "TEAM", "leader_id")
+    create_index(conn, "ix_PAGO_usuario_id", "PAGO", "usuario_id")
+    create_index(conn, "ix_USUARIO_verification_token", "USUARIO", "verification_token")
+
+
+@migration(5, "tablas de archivo TICKET_ARCHIVE y PAGO_ARCHIVE")
+def _archive_tables(conn: Connection) -> None:
+    # Con sus índices
+    tables = schema.tables
+    schema.create_all(conn, tables=[tables["TICKET_ARCHIVE"], tables["PAGO_ARCHIVE"]])
+
+
+@migration(6, "tabla TABLE_VERSION (versiones compartidas de la caché)")
+def _table_versions(conn: Connection) -> None:
+    # Una fila por tabla versionada (cache.VERSIONED_TABLES a fecha de esta migración)
+    table_version = schema.tables["TABLE_VERSION"]
+    table_version.create(conn, checkfirst=True)
+    now = datetime.now()
+    existing = set(conn.scalars(select(table_version.c.tabla)))
+    rows = [
+        {"tabla": tabla, "version": 0, "updated_at": now}
+        for tabla in ("EVENTO", "TICKET", "LOCALIDAD", "GENERO", "ARTISTA", "ORGANIZADOR")
+        if tabla not in existing
+    ]
+    if rows:
+        conn.execute(table_version.insert(), rows)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if "--status" in sys.argv[1:]:
+        version = current_version()
+        print(f"Versión aplicada: {version if version is not None else 'ninguna (sin SCHEMA_VERSION)'}")
+        for pending in MIGRATIONS[version or 0:]:
+            print(f"  pendiente {pending.version}: {pending.nombre}")
+    else:
+        applied = run_migrations()
+        print("\n".join(applied) if applied else f"Esquema al día (v{latest_version()})")
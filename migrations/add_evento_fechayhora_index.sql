@@ -0,0 +1,5 @@
+-- Migración: Índice sobre la fecha de los eventos
+-- Lo usan /evento/calendar (GROUP BY por día dentro de un mes) y los filtros fecha_desde/fecha_hasta
+-- Mismo nombre que genera SQLAlchemy para Column(index=True), así create_all no lo duplica
+
+CREATE INDEX IF NOT EXISTS "ix_EVENTO_fechayhora" ON "EVENTO" (fechayhora);
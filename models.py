@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, Boolean, DateTime, DECIMAL, Table, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, Date, Boolean, DateTime, DECIMAL, Table, Float, Text, Index
 from sqlalchemy.orm import relationship  
 from database import Base
 from sqlalchemy.orm import Session
@@ -48,7 +48,7 @@ class Usuario(Base):
     
     # Email verification fields
     email_verified = Column(Boolean, default=False, nullable=False)
-    verification_token = Column(String(255), nullable=True)
+    verification_token = Column(String(255), nullable=True, index=True)  # Búsqueda en /verify-email
     verification_token_expiry = Column(DateTime, nullable=True)
     
     # Profile enhancement fields
@@ -57,45 +57,91 @@ class Usuario(Base):
 
 class Evento(Base):
     __tablename__ = 'EVENTO'
+    __table_args__ = (
+        # Filtro por ciudad del catálogo, ordenado / acotado por fecha
+        Index('ix_EVENTO_localidad_id_fechayhora', 'localidad_id', 'fechayhora'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     nombre = Column(String(100), nullable=False)
     descripcion = Column(String(201), nullable=False)
     localidad_id = Column(Integer, ForeignKey('LOCALIDAD.id'))
     recinto = Column(String(100), nullable=False)
     plazas = Column(Integer, nullable=False)
-    fechayhora = Column(DateTime, nullable=False)
+    fechayhora = Column(DateTime, nullable=False, index=True)  # Índice para el calendario y filtros por fecha
     tipo = Column(String(50), nullable=False)
     precio = Column(Float, nullable=True)  # Changed from categoria_precio (String) to precio (Float)
     organizador_dni = Column(String(20), ForeignKey('ORGANIZADOR.dni'))
     genero_id = Column(Integer, ForeignKey('GENERO.id'))
     imagen = Column(String(100))
-    creador_id = Column(Integer, ForeignKey('USUARIO.id'))  # Track who created the event
+    creador_id = Column(Integer, ForeignKey('USUARIO.id'), index=True)  # Track who created the event
     venta_pausada = Column(Boolean, default=False, nullable=False)  # Pausar ventas manualmente
 
+class EventCard(Base):
+    """Read model del catálogo: documento JSON del evento listo para enviar"""
+    __tablename__ = 'EVENT_CARD'
+    evento_id = Column(Integer, primary_key=True)  # Sin FK: se mantiene desde event_cards.py
+    documento = Column(Text, nullable=False)  # schemas.Evento serializado, sin tickets_vendidos
+    tickets_vendidos = Column(Integer, default=0, nullable=False)
+    actualizado_at = Column(DateTime, default=datetime.now, nullable=False)
+
+class TableVersion(Base):
+    """Versión de cada tabla del catálogo, para claves de caché y ETags (ver cache.py)"""
+    __tablename__ = 'TABLE_VERSION'
+    tabla = Column(String(64), primary_key=True)
+    version = Column(Integer, default=0, nullable=False)  # Se incrementa en la transacción que escribe la tabla
+    updated_at = Column(DateTime, default=datetime.now, nullable=False)
+
 class Ticket(Base):
     __tablename__ = 'TICKET'
+    __table_args__ = (
+        # Entradas vendidas de un evento y sus escaneos (estadísticas por hora)
+        Index('ix_TICKET_evento_id_scanned_at', 'evento_id', 'scanned_at'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     codigo_ticket = Column(String, unique=True, index=True, nullable=False)  # Unique secure code
     nombre_asistente = Column(String, nullable=True)  # Optional attendee name
     evento_id = Column(Integer, ForeignKey('EVENTO.id'))
-    usuario_id = Column(Integer, ForeignKey('USUARIO.id'))
+    usuario_id = Column(Integer, ForeignKey('USUARIO.id'), index=True)  # Mis entradas
     activado = Column(Boolean, default=True)
     scanned_at = Column(DateTime, nullable=True)  # Timestamp when ticket was scanned
 
 class Pago(Base):
     __tablename__ = 'PAGO'
     id = Column(Integer, primary_key=True, index=True)
-    usuario_id = Column(Integer, ForeignKey('USUARIO.id'))
+    usuario_id = Column(Integer, ForeignKey('USUARIO.id'), index=True)
     metodo_pago = Column(String(50), nullable=False)
     total = Column(DECIMAL(10, 2), nullable=False)
     fecha = Column(DateTime, nullable=False)
     ticket_id = Column(Integer, ForeignKey('TICKET.id'), unique=True)
 
+class TicketArchive(Base):
+    """Tickets de eventos pasados, movidos desde TICKET por archive.py"""
+    __tablename__ = 'TICKET_ARCHIVE'
+    id = Column(Integer, primary_key=True, autoincrement=False)  # El mismo id que tenía en TICKET
+    codigo_ticket = Column(String, nullable=True, index=True)  # Tickets antiguos sin código
+    nombre_asistente = Column(String, nullable=True)
+    evento_id = Column(Integer, ForeignKey('EVENTO.id'), index=True)  # Recuentos y estadísticas
+    usuario_id = Column(Integer, ForeignKey('USUARIO.id'), index=True)  # Histórico de mis entradas
+    activado = Column(Boolean, default=True)
+    scanned_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, nullable=False)
+
+class PagoArchive(Base):
+    """Pagos de los tickets archivados (PAGO -> PAGO_ARCHIVE)"""
+    __tablename__ = 'PAGO_ARCHIVE'
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    usuario_id = Column(Integer, ForeignKey('USUARIO.id'), index=True)
+    metodo_pago = Column(String(50), nullable=False)
+    total = Column(DECIMAL(10, 2), nullable=False)
+    fecha = Column(DateTime, nullable=False)
+    ticket_id = Column(Integer, ForeignKey('TICKET_ARCHIVE.id'), unique=True)
+    archived_at = Column(DateTime, nullable=False)
+
 class Team(Base):
     __tablename__ = 'TEAM'
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), unique=True, nullable=False)
-    leader_id = Column(Integer, ForeignKey('USUARIO.id')) # Promotor/Admin
+    leader_id = Column(Integer, ForeignKey('USUARIO.id'), index=True) # Promotor/Admin
     created_at = Column(DateTime, default=datetime.now)
 
     leader = relationship("Usuario", backref="led_teams")
@@ -103,6 +149,11 @@ class Team(Base):
 
 class TeamMember(Base):
     __tablename__ = 'TEAM_MEMBER'
+    __table_args__ = (
+        # Equipos de un usuario por estado (accepted / pending) y miembros de un equipo
+        Index('ix_TEAM_MEMBER_user_id_status', 'user_id', 'status'),
+        Index('ix_TEAM_MEMBER_team_id_status', 'team_id', 'status'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     team_id = Column(Integer, ForeignKey('TEAM.id'))
     user_id = Column(Integer, ForeignKey('USUARIO.id')) # Scanner invited
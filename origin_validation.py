@@ -0,0 +1,98 @@
+"""
+Validación estricta de origen (CORS - capa 2) como middleware ASGI puro
+
+Misma política que el antiguo validate_origin_middleware:
+- Origin no permitido -> 403 (con Access-Control-Allow-Origin para que el navegador muestre el error)
+- Sin Origin (apps móviles, llamadas directas) -> se deja pasar sin cabeceras CORS
+- OPTIONS -> respuesta de preflight directa
+- Origin permitido -> se añaden Access-Control-Allow-Origin/Credentials a la respuesta
+
+A diferencia de @app.middleware("http") (BaseHTTPMiddleware) no crea una
+tarea ni reenvuelve el cuerpo de la respuesta: solo añade cabeceras al
+mensaje http.response.start. Los orígenes se buscan en un frozenset y las
+cabeceras fijas se calculan una sola vez.
+"""
+import json
+import logging
+from typing import Iterable, List, Tuple
+
+logger = logging.getLogger("njoy.origin")
+
+_CORS_RESPONSE_HEADERS = (b"access-control-allow-origin", b"access-control-allow-credentials")
+
+_FORBIDDEN_BODY = json.dumps({
+    "detail": "Origin not allowed",
+    "error": "CORS policy: This origin is not authorized to access this API",
+}, separators=(",", ":")).encode()
+
+_PREFLIGHT_HEADERS: List[Tuple[bytes, bytes]] = [
+    (b"access-control-allow-methods", b"*"),
+    (b"access-control-allow-headers", b"*"),
+    (b"access-control-allow-credentials", b"true"),
+    (b"access-control-max-age", b"3600"),
+    (b"content-length", b"0"),
+]
+
+
+class OriginValidationMiddleware:
+    """Rechaza orígenes no autorizados y responde a los preflight"""
+
+    def __init__(self, app, allowed_origins: Iterable[str]):
+        self.app = app
+        self.allowed = frozenset(allowed_origins)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        origin = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value or None
+                break
+
+        origin_str = origin.decode("latin-1") if origin else None
+        allowed = origin is None or origin_str in self.allowed
+
+        if not allowed:
+            # LOG SECURITY EVENT
+            logger.warning(
+                "Petición bloqueada por origen no autorizado",
+                extra={"origin": origin_str, "path": scope["path"], "method": scope["method"]},
+            )
+            await send({
+                "type": "http.response.start",
+                "status": 403,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(_FORBIDDEN_BODY)).encode()),
+                    (b"access-control-allow-origin", origin),  # Required for browser to show error
+                ],
+            })
+            await send({"type": "http.response.body", "body": _FORBIDDEN_BODY})
+            return
+
+        if scope["method"] == "OPTIONS":
+            headers = list(_PREFLIGHT_HEADERS)
+            if origin is not None:
+                headers.insert(0, (b"access-control-allow-origin", origin))
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if origin is None:
+            # No origin header (mobile app, server-to-server, etc.): no CORS headers needed
+            return await self.app(scope, receive, send)
+
+        cors_headers = [
+            (b"access-control-allow-origin", origin),
+            (b"access-control-allow-credentials", b"true"),
+        ]
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                headers = [h for h in message.get("headers", ()) if h[0].lower() not in _CORS_RESPONSE_HEADERS]
+                message = {**message, "headers": headers + cors_headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
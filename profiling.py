@@ -0,0 +1,207 @@
+"""
+Perfilado bajo demanda de peticiones concretas (solo admin)
+
+Un admin añade la cabecera X-Profile a una petición cualquiera:
+- X-Profile: 1       -> el perfil se guarda y la respuesta lleva X-Profile-Id
+                        (descarga en GET /admin/profiles/{id})
+- X-Profile: inline  -> la respuesta es directamente el perfil
+
+El perfil es un muestreo de pilas: un hilo toma cada
+PROFILE_SAMPLE_INTERVAL_MS las pilas de todos los hilos ocupados del proceso
+(sys._current_frames) y las cuenta en formato "collapsed stacks"
+(func1;func2;func3 N), que abren speedscope o flamegraph.pl.
+
+Los endpoints síncronos se ejecutan en hilos del threadpool, por eso se
+muestrean todos los hilos. En Vercel cada instancia atiende una petición a
+la vez; en un servidor con tráfico concurrente también aparecerán las
+pilas de otras peticiones.
+"""
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Optional
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Response
+
+from auth import Principal, get_current_active_user, get_current_admin, get_principal_from_token
+from config import settings
+from database import SessionLocal
+
+# Hilos en espera (threadpools libres, event loop sin trabajo): no se muestrean
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py", "concurrent/futures/thread.py")
+_MAX_DEPTH = 128
+
+
+class Sampler:
+    """Muestreador de pilas en un hilo aparte"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    continue
+                names = []
+                while frame is not None and len(names) < _MAX_DEPTH:
+                    code = frame.f_code
+                    names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+# Perfiles guardados: id -> metadatos + texto (los más antiguos se descartan)
+_profiles: "OrderedDict[str, dict]" = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+def _store(method: str, path: str, status_code: int, duration: float, sampler: Sampler) -> str:
+    profile_id = uuid.uuid4().hex[:12]
+    with _profiles_lock:
+        _profiles[profile_id] = {
+            "id": profile_id,
+            "method": method,
+            "path": path,
+            "status": status_code,
+            "duration_ms": round(duration * 1000, 1),
+            "samples": sampler.samples,
+            "created_at": datetime.now().isoformat(),
+            "collapsed": sampler.collapsed(),
+        }
+        while len(_profiles) > settings.PROFILE_MAX_STORED:
+            _profiles.popitem(last=False)
+    return profile_id
+
+
+def _is_admin(token: str) -> bool:
+    """Las mismas comprobaciones que get_current_admin (activo, no baneado, admin)"""
+    db = SessionLocal()
+    try:
+        get_current_admin(get_current_active_user(get_principal_from_token(token, db)))
+        return True
+    except Exception:
+        return False
+    finally:
+        db.close()
+
+
+# ============================================
+# MIDDLEWARE
+# ============================================
+
+class ProfilingMiddleware:
+    """Middleware ASGI que perfila las peticiones con X-Profile de un admin"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        mode = token = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                mode = value.decode("latin-1").strip().lower()
+            elif name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                token = token if scheme.lower() == "bearer" else None
+        if mode not in ("1", "inline") or not token:
+            return await self.app(scope, receive, send)
+        # Sin permiso se ignora la cabecera (no se revela que existe)
+        if not await anyio.to_thread.run_sync(_is_admin, token):
+            return await self.app(scope, receive, send)
+
+        # X-Profile-Id va en http.response.start y el id existe cuando termina
+        # el perfil: la respuesta se retiene entera mientras tanto
+        messages = []
+
+        async def buffer(message):
+            messages.append(message)
+
+        start = time.perf_counter()
+        with Sampler(settings.PROFILE_SAMPLE_INTERVAL_MS / 1000) as sampler:
+            await self.app(scope, receive, buffer)
+        duration = time.perf_counter() - start
+
+        start_message = next((m for m in messages if m["type"] == "http.response.start"), None)
+        status_code = start_message["status"] if start_message else 500
+        profile_id = _store(scope["method"], scope["path"], status_code, duration, sampler)
+
+        if mode == "inline" or start_message is None:
+            body = sampler.collapsed().encode()
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"x-profile-id", profile_id.encode()),
+                    (b"x-profile-status", str(status_code).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        for message in messages:
+            if message is start_message:
+                headers = list(message.get("headers", ())) + [(b"x-profile-id", profile_id.encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+
+# ============================================
+# DESCARGA DE PERFILES (ADMIN)
+# ============================================
+
+router = APIRouter()
+
+
+@router.get("/admin/profiles", tags=["Admin"])
+def list_profiles(current_user: Principal = Depends(get_current_admin)):
+    """Perfiles guardados en esta instancia, del más reciente al más antiguo (solo admin)"""
+    with _profiles_lock:
+        profiles = list(_profiles.values())
+    return [
+        {key: value for key, value in profile.items() if key != "collapsed"}
+        for profile in reversed(profiles)
+    ]
+
+
+@router.get("/admin/profiles/{profile_id}", tags=["Admin"])
+def download_profile(
+    profile_id: str,
+    current_user: Principal = Depends(get_current_admin)
+):
+    """Descargar un perfil en formato collapsed stacks (solo admin)"""
+    with _profiles_lock:
+        profile: Optional[dict] = _profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return Response(
+        content=profile["collapsed"],
+        media_type="text/plain",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.collapsed.txt"'},
+    )
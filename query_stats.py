@@ -0,0 +1,138 @@
+"""
+Contador de consultas SQL por petición y detector de N+1
+
+Un listener de SQLAlchemy cuenta las sentencias y el tiempo de BD de la
+petición en curso (contextvar: los endpoints síncronos se ejecutan en el
+threadpool con una copia del contexto, así que comparten el mismo objeto).
+
+Al terminar la petición:
+- Cabecera Server-Timing: db;dur=<ms>;desc="<n> queries"
+- Log con los totales
+- Aviso si una misma sentencia se repite más de QUERY_REPEAT_THRESHOLD veces
+  (típico bucle N+1: una consulta por elemento de una lista)
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import settings
+
+logger = logging.getLogger("njoy.queries")
+
+
+class QueryStats:
+    """Consultas ejecutadas durante una petición"""
+
+    __slots__ = ("count", "duration", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        # Texto SQL con parámetros (sin valores) -> veces ejecutado
+        self.statements: Counter = Counter()
+
+    def repeated(self, threshold: int):
+        """Sentencias ejecutadas más de `threshold` veces"""
+        return [(sql, n) for sql, n in self.statements.most_common() if n > threshold]
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current() -> Optional[QueryStats]:
+    """Estadísticas de la petición en curso (None fuera de una petición)"""
+    return _current.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # En el contexto de la ejecución y no en una pila de la conexión: una
+    # sentencia que falla no llega a after_cursor_execute
+    if _current.get() is not None and context is not None:
+        context.query_stats_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    start = getattr(context, "query_stats_start", None)
+    if start is not None:
+        stats.duration += time.perf_counter() - start
+    stats.count += 1
+    stats.statements[statement] += 1
+
+
+# ============================================
+# MIDDLEWARE
+# ============================================
+
+class QueryStatsMiddleware:
+    """Middleware ASGI que activa el contador y añade Server-Timing"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                header = f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"'
+                message = {**message, "headers": list(message.get("headers", ())) + [(b"server-timing", header.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            if stats.count:
+                logger.info(
+                    "%s %s: %d queries, %.1f ms de BD",
+                    scope["method"], scope["path"], stats.count, stats.duration * 1000,
+                )
+            for sql, n in stats.repeated(settings.QUERY_REPEAT_THRESHOLD):
+                logger.warning(
+                    "Posible N+1 en %s %s: sentencia repetida %d veces: %s",
+                    scope["method"], scope["path"], n, " ".join(sql.split())[:200],
+                )
+
+
+# ============================================
+# AYUDA PARA TESTS
+# ============================================
+
+_SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def queries_from_response(response) -> Optional[int]:
+    """Número de consultas según la cabecera Server-Timing de una respuesta"""
+    match = _SERVER_TIMING_QUERIES.search(response.headers.get("server-timing", ""))
+    return int(match.group(1)) if match else None
+
+
+def assert_max_queries(response, max_queries: int) -> None:
+    """
+    Comprobar el presupuesto de consultas de un endpoint (para pytest)
+
+    Ejemplo:
+        response = client.get("/tickets/my-tickets", headers=auth_headers)
+        assert_max_queries(response, 3)
+    """
+    count = queries_from_response(response)
+    assert count is not None, "La respuesta no tiene Server-Timing (¿QUERY_STATS_ENABLED?)"
+    request = response.request
+    assert count <= max_queries, (
+        f"{request.method} {request.url.path}: {count} consultas (máximo {max_queries})"
+    )
@@ -0,0 +1,235 @@
+"""
+Limitación de peticiones (token bucket) para los endpoints sensibles
+
+Cada regla es un cubo de `capacity` tokens que se rellena a razón de
+`capacity / window` tokens por segundo; cada petición consume uno. Se
+guarda solo (tokens, último acceso) por clave, así que la memoria es O(1)
+por IP/usuario y las claves menos usadas se expulsan (LRU).
+
+Las claves son por IP (X-Forwarded-For en Vercel) o por usuario (sub del
+token, sin consultar la base de datos). Con varios workers en la misma
+máquina se puede compartir el estado con RATE_LIMIT_STORE=sqlite:///ruta.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import anyio
+
+from config import settings
+
+
+@dataclass(frozen=True)
+class Rule:
+    """Como máximo `capacity` peticiones cada `window` segundos, por IP o por usuario"""
+    scope: str  # "ip" | "user"
+    capacity: int
+    window: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.window
+
+
+# (método, ruta o prefijo acabado en "/") -> reglas
+ROUTE_LIMITS: Dict[Tuple[str, str], List[Rule]] = {
+    ("POST", "/login"): [Rule("ip", 10, 60)],
+    ("POST", "/register"): [Rule("ip", 5, 600)],
+    ("POST", "/resend-verification"): [Rule("ip", 3, 600)],
+    ("POST", "/tickets/purchase"): [Rule("user", 10, 60), Rule("ip", 30, 60)],
+    ("POST", "/tickets/scan/"): [Rule("user", 120, 60)],
+}
+
+
+def match_rules(method: str, path: str) -> Optional[Tuple[str, List[Rule]]]:
+    """Reglas aplicables a una petición, con la ruta que las define"""
+    rules = ROUTE_LIMITS.get((method, path))
+    if rules is not None:
+        return path, rules
+    for (rule_method, route), rules in ROUTE_LIMITS.items():
+        if rule_method == method and route.endswith("/") and path.startswith(route):
+            return route, rules
+    return None
+
+
+# ============================================
+# ALMACENES DE CUBOS
+# ============================================
+
+class MemoryBucketStore:
+    """Cubos en memoria del proceso, LRU acotado"""
+
+    blocking = False
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rule: Rule, now: float) -> float:
+        """Consumir un token; devuelve 0 si se permite o los segundos hasta el siguiente token"""
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (rule.capacity, now))
+            tokens = min(rule.capacity, tokens + (now - updated) * rule.rate)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / rule.rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return retry_after
+
+
+class SQLiteBucketStore:
+    """Cubos en un fichero SQLite compartido por los workers de una máquina"""
+
+    blocking = True
+    # Cada cuántas operaciones se borran los cubos sin uso
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str, max_idle_seconds: float = 3600):
+        self.path = path
+        self.max_idle_seconds = max_idle_seconds
+        self._local = threading.local()
+        self._ops = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_bucket "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rule: Rule, now: float) -> float:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM rate_limit_bucket WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (rule.capacity, now)
+            tokens = min(rule.capacity, tokens + (now - updated) * rule.rate)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / rule.rate
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limit_bucket (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens, now),
+            )
+            self._ops += 1
+            if self._ops % self.PURGE_EVERY == 0:
+                conn.execute("DELETE FROM rate_limit_bucket WHERE updated < ?", (now - self.max_idle_seconds,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return retry_after
+
+
+def create_store():
+    """Almacén según RATE_LIMIT_STORE ("memory" o "sqlite:///ruta")"""
+    if settings.RATE_LIMIT_STORE.startswith("sqlite:///"):
+        return SQLiteBucketStore(settings.RATE_LIMIT_STORE[len("sqlite:///"):])
+    return MemoryBucketStore(max_keys=settings.RATE_LIMIT_MAX_KEYS)
+
+
+# ============================================
+# IDENTIFICACIÓN DEL CLIENTE
+# ============================================
+
+def client_ip(scope) -> str:
+    """
+    IP del cliente: la de la conexión, o con RATE_LIMIT_TRUST_FORWARDED la
+    primera de X-Forwarded-For (el edge de Vercel sobrescribe la cabecera)
+    """
+    if settings.RATE_LIMIT_TRUST_FORWARDED:
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def client_user(scope) -> Optional[str]:
+    """Id de usuario del token Bearer (sin consultar la BD); None si no hay o no es válido"""
+    # Import diferido: auth importa la base de datos
+    from auth import decode_token_cached
+
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return None
+            try:
+                return str(decode_token_cached(token).get("sub"))
+            except Exception:
+                # Token inválido: el endpoint responderá 401, aquí basta el límite por IP
+                return None
+    return None
+
+
+# ============================================
+# MIDDLEWARE
+# ============================================
+
+class RateLimitMiddleware:
+    """Middleware ASGI que aplica ROUTE_LIMITS y responde 429 con Retry-After"""
+
+    def __init__(self, app, store=None):
+        self.app = app
+        self.store = store or create_store()
+
+    def check(self, scope, route: str, rules: List[Rule]) -> float:
+        """Consumir un token de cada regla aplicable; devuelve el mayor Retry-After"""
+        now = time.time()
+        retry_after = 0.0
+        for rule in rules:
+            if rule.scope == "user":
+                user = client_user(scope)
+                if user is None:
+                    continue
+                key = f"{route}|user:{user}"
+            else:
+                key = f"{route}|ip:{client_ip(scope)}"
+            retry_after = max(retry_after, self.store.take(key, rule, now))
+        return retry_after
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        matched = match_rules(scope["method"], scope["path"])
+        if matched is None:
+            return await self.app(scope, receive, send)
+
+        if self.store.blocking:
+            retry_after = await anyio.to_thread.run_sync(self.check, scope, *matched)
+        else:
+            retry_after = self.check(scope, *matched)
+
+        if retry_after <= 0:
+            return await self.app(scope, receive, send)
+
+        body = json.dumps({"detail": "Demasiadas peticiones, inténtalo más tarde"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, int(retry_after + 0.999))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import List
 from datetime import datetime
 
 from database import SessionLocal
 from models import Team, TeamMember, Usuario
-from auth import get_current_active_user, get_db
+from auth import Principal, get_current_active_user, get_db
 import team_schemas
 
 router = APIRouter(
@@ -18,7 +19,7 @@ router = APIRouter(
 
 @router.get("/events", response_model=List[team_schemas.EventResponse]) # We need to ensure EventResponse is available in team_schemas or use properties
 def get_team_events(
-    current_user: Usuario = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     from models import Evento, TeamMember, Team
@@ -28,17 +29,12 @@ def get_team_events(
     led_teams = db.query(Team).filter(Team.leader_id == current_user.id).all()
     leader_ids = {t.leader_id for t in led_teams}
     
-    # Teams where user is member
-    memberships = db.query(TeamMember).filter(
+    # Leaders of the teams where user is member (una sola consulta)
+    member_leaders = db.query(Team.leader_id).join(TeamMember, TeamMember.team_id == Team.id).filter(
         TeamMember.user_id == current_user.id,
         TeamMember.status == 'accepted'
     ).all()
-    
-    for m in memberships:
-        # Get the team to find the leader
-        team = db.query(Team).filter(Team.id == m.team_id).first()
-        if team:
-            leader_ids.add(team.leader_id)
+    leader_ids.update(leader_id for (leader_id,) in member_leaders)
             
     if not leader_ids:
         return []
@@ -53,7 +49,7 @@ def get_team_events(
 @router.post("/", response_model=team_schemas.TeamResponse)
 def create_team(
     team: team_schemas.TeamCreate,
-    current_user: Usuario = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     if current_user.role not in ["promotor", "admin", "owner"]:
@@ -75,7 +71,7 @@ def create_team(
 
 @router.get("/managed", response_model=List[team_schemas.TeamListResponse])
 def get_managed_teams(
-    current_user: Usuario = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     # Get teams where user is leader
@@ -84,10 +80,16 @@ def get_managed_teams(
     # Add member count logic if needed manually, but better to do in query or property
     # For now, let's just return them, pydantic will handle member_count if we add a property to model or hack it
     # Pydantic hack:
+    # Miembros aceptados de todos los equipos en una sola consulta
+    counts = dict(
+        db.query(TeamMember.team_id, func.count(TeamMember.id))
+        .filter(TeamMember.team_id.in_([t.id for t in teams]), TeamMember.status == 'accepted')
+        .group_by(TeamMember.team_id)
+        .all()
+    ) if teams else {}
     results = []
     for t in teams:
-        count = db.query(TeamMember).filter(TeamMember.team_id == t.id, TeamMember.status == 'accepted').count()
-        t.member_count = count
+        t.member_count = counts.get(t.id, 0)
         results.append(t)
         
     return results
@@ -98,7 +100,7 @@ def get_managed_teams(
 def invite_user(
     team_id: int,
     invite: team_schemas.TeamInvite,
-    current_user: Usuario = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     team = db.query(Team).filter(Team.id == team_id).first()
@@ -146,18 +148,18 @@ def invite_user(
 
 @router.get("/my-invitations", response_model=List[team_schemas.TeamInvitationResponse])
 def get_my_invitations(
-    current_user: Usuario = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    invitations = db.query(TeamMember).filter(
+    # Con el nombre del equipo en la misma consulta
+    invitations = db.query(TeamMember, Team).outerjoin(Team, Team.id == TeamMember.team_id).filter(
         TeamMember.user_id == current_user.id,
         TeamMember.status == 'pending'
     ).all()
     
     # Manual mapping to include Team Name
     results = []
-    for inv in invitations:
-        team = db.query(Team).filter(Team.id == inv.team_id).first()
+    for inv, team in invitations:
         results.append({
             "id": inv.id,
             "team_id": inv.team_id,
@@ -173,7 +175,7 @@ def get_my_invitations(
 def respond_invitation(
     member_id: int,
     status_update: str, # accepted or rejected
-    current_user: Usuario = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     if status_update not in ['accepted', 'rejected']:
@@ -195,11 +197,11 @@ def respond_invitation(
 
 @router.get("/my-teams", response_model=List[team_schemas.TeamListResponse])
 def get_my_teams(
-    current_user: Usuario = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     # Teams where I am a member
-    memberships = db.query(TeamMember).filter(
+    memberships = db.query(TeamMember).options(joinedload(TeamMember.team)).filter(
         TeamMember.user_id == current_user.id,
         TeamMember.status == 'accepted'
     ).all()
@@ -221,10 +223,12 @@ def get_my_teams(
 @router.get("/{team_id}", response_model=team_schemas.TeamResponse)
 def get_team_details(
     team_id: int,
-    current_user: Usuario = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    team = db.query(Team).filter(Team.id == team_id).first()
+    team = db.query(Team).options(
+        selectinload(Team.members).joinedload(TeamMember.user)
+    ).filter(Team.id == team_id).first()
     if not team:
         raise HTTPException(status_code=404, detail="Team not found")
     
@@ -240,7 +244,7 @@ def get_team_details(
 
     # Enroll user emails for response
     for member in team.members:
-        user_obj = db.query(Usuario).filter(Usuario.id == member.user_id).first()
+        user_obj = member.user
         if user_obj:
             member.user_email = user_obj.email
             member.user_name = f"{user_obj.nombre} {user_obj.apellidos}"
@@ -0,0 +1,148 @@
+"""
+Presupuesto de consultas SQL de los endpoints con riesgo de N+1
+
+Cada endpoint se llama con N elementos (tickets, equipos, invitaciones,
+miembros) y se comprueba con query_stats.assert_max_queries que el número
+de consultas no depende de N. Usa una base SQLite temporal propia.
+
+Uso:
+    cd tests && python -m pytest test_query_budgets.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Antes de importar la aplicación: config.py lee el entorno al importarse
+_db_dir = tempfile.mkdtemp(prefix="njoy_budgets_")
+os.environ["ENV"] = "local"
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_dir}/budgets.db"
+os.environ["RATE_LIMIT_ENABLED"] = "False"
+os.environ["QUERY_STATS_ENABLED"] = "True"
+
+import pytest
+from fastapi.testclient import TestClient
+
+import database
+import main
+import models
+from auth import create_access_token
+from query_stats import assert_max_queries, queries_from_response
+
+# Elementos por lista: con un N+1 el número de consultas crece con N
+N = 6
+
+
+def _user(db, email, role="user"):
+    user = models.Usuario(
+        nombre=email.split("@")[0], apellidos="Prueba", email=email,
+        fecha_nacimiento=date(1990, 1, 1), password="x", role=role,
+    )
+    db.add(user)
+    db.flush()
+    return user
+
+
+@pytest.fixture(scope="module")
+def client():
+    db = database.SessionLocal()
+    try:
+        user = _user(db, "user@budgets.test")
+        leader = _user(db, "leader@budgets.test", role="promotor")
+        localidad = models.Localidad(ciudad="Girona", latitud=41.98, longitud=2.82)
+        db.add(localidad)
+        db.flush()
+
+        team = models.Team(name="Equipo del líder", leader_id=leader.id)
+        db.add(team)
+        db.flush()
+        for i in range(N):
+            # Un equipo del que el usuario es miembro, con un evento de su líder,
+            # y otro del líder principal que le ha invitado
+            other_leader = _user(db, f"leader{i}@budgets.test", role="promotor")
+            evento = models.Evento(
+                nombre=f"Evento {i}", descripcion="Prueba", localidad_id=localidad.id, recinto="Sala",
+                plazas=100, fechayhora=datetime.now() + timedelta(days=i + 1), tipo="Concierto",
+                precio=10.0, creador_id=other_leader.id,
+            )
+            db.add(evento)
+            db.flush()
+            db.add(models.Ticket(codigo_ticket=f"BUDGET-{i}", evento_id=evento.id, usuario_id=user.id))
+
+            member_of = models.Team(name=f"Equipo {i}", leader_id=other_leader.id)
+            invited_to = models.Team(name=f"Invitación {i}", leader_id=leader.id)
+            db.add_all([member_of, invited_to])
+            db.flush()
+            db.add(models.TeamMember(team_id=member_of.id, user_id=user.id, status="accepted"))
+            db.add(models.TeamMember(team_id=invited_to.id, user_id=user.id, status="pending"))
+
+            # Miembros del equipo del líder
+            member = _user(db, f"member{i}@budgets.test", role="scanner")
+            db.add(models.TeamMember(team_id=team.id, user_id=member.id, status="accepted"))
+        db.commit()
+        ids = {"user": user.id, "leader": leader.id, "team": team.id}
+    finally:
+        db.close()
+
+    with TestClient(main.app) as test_client:
+        test_client.ids = ids
+        yield test_client
+    asyncio.run(database.dispose_async_engine())
+
+
+def _headers(user_id):
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': str(user_id)})}"}
+
+
+def _get(client, path, user_id=None):
+    headers = _headers(user_id) if user_id is not None else {}
+    # La primera petición de un usuario carga su principal (una consulta más)
+    client.get(path, headers=headers)
+    response = client.get(path, headers=headers)
+    assert response.status_code == 200, response.text
+    return response
+
+
+@pytest.mark.parametrize("path, max_queries", [
+    ("/tickets/my-tickets", 2),
+    ("/tickets/my-tickets?include_history=true", 3),
+    ("/teams/events", 3),
+    ("/teams/my-invitations", 1),
+    ("/teams/my-teams", 1),
+])
+def test_user_endpoints_budget(client, path, max_queries):
+    response = _get(client, path, client.ids["user"])
+    assert len(response.json()) == N
+    assert_max_queries(response, max_queries)
+
+
+def test_team_details_budget(client):
+    response = _get(client, f"/teams/{client.ids['team']}", client.ids["leader"])
+    assert len(response.json()["members"]) == N
+    assert_max_queries(response, 3)
+
+
+def test_managed_teams_budget(client):
+    response = _get(client, "/teams/managed", client.ids["leader"])
+    assert len(response.json()) == N + 1
+    assert_max_queries(response, 2)
+
+
+@pytest.mark.parametrize("path, max_queries", [
+    ("/evento/", 2),
+    ("/localidad/", 2),
+    ("/evento/search?tipo=Concierto", 4),
+    ("/evento/search?user_lat=41.4&user_lon=2.2&order_by_distance=true", 5),
+])
+def test_public_listings_budget(client, path, max_queries):
+    response = _get(client, path)
+    assert_max_queries(response, max_queries)
+
+
+def test_budget_counts_only_the_request(client):
+    response = _get(client, "/")
+    assert queries_from_response(response) in (None, 0)
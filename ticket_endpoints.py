@@ -4,7 +4,7 @@ from typing import List
 from datetime import datetime, timedelta
 import uuid
 import models
-from auth import get_db, get_current_active_user, get_current_scanner
+from auth import Principal, get_db, get_current_active_user, get_current_scanner
 
 router = APIRouter()
 
@@ -13,7 +13,7 @@ def purchase_tickets(
     evento_id: int,
     cantidad: int = 1,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Comprar entradas para un evento
@@ -93,27 +93,41 @@ def purchase_tickets(
 
 @router.get("/tickets/my-tickets", tags=["Tickets"])
 def get_my_tickets(
+    include_history: bool = False,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Obtener todos los tickets del usuario autenticado
     
-    Retorna los tickets con información del evento
+    Retorna los tickets con información del evento. Los de eventos pasados
+    ya archivados (TICKET_ARCHIVE) solo se incluyen con include_history=true.
     """
     tickets = db.query(models.Ticket).filter(
         models.Ticket.usuario_id == current_user.id
     ).all()
+    archivados = []
+    if include_history:
+        archivados = db.query(models.TicketArchive).filter(
+            models.TicketArchive.usuario_id == current_user.id
+        ).all()
+    
+    # Enriquecer con información del evento (una sola consulta para todos)
+    evento_ids = {ticket.evento_id for ticket in tickets + archivados}
+    eventos = {
+        evento.id: evento
+        for evento in db.query(models.Evento).filter(models.Evento.id.in_(evento_ids))
+    } if evento_ids else {}
     
-    # Enriquecer con información del evento
     tickets_with_events = []
-    for ticket in tickets:
-        evento = db.query(models.Evento).filter(models.Evento.id == ticket.evento_id).first()
+    for ticket in tickets + archivados:
+        evento = eventos.get(ticket.evento_id)
         if evento:
             tickets_with_events.append({
                 "ticket_id": ticket.id,
                 "codigo": ticket.codigo_ticket,  # Added code
                 "activado": ticket.activado,
+                "archivado": isinstance(ticket, models.TicketArchive),
                 "evento": {
                     "id": evento.id,
                     "nombre": evento.nombre,
@@ -132,7 +146,7 @@ def get_my_tickets(
 def get_ticket_detail(
     ticket_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Obtener detalle de un ticket específico
@@ -182,7 +196,7 @@ def get_ticket_detail(
 def toggle_event_sales(
     evento_id: int,
     db: Session = Depends(get_db),
-    current_user: models.Usuario = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """
     Pausar o reanudar ventas de un evento
@@ -0,0 +1,209 @@
+"""
+Captura de tráfico real para reproducirlo después (benchmarks/replay_traffic.py)
+
+Con TRAFFIC_CAPTURE_ENABLED, una fracción de las peticiones
+(TRAFFIC_CAPTURE_SAMPLE_RATE) se añade como una línea JSON a
+TRAFFIC_CAPTURE_PATH:
+
+    {"ts": 1760000000.123, "method": "GET", "path": "/evento/12",
+     "query": "skip=0&limit=20", "route": "/evento/{item_id}", "status": 200,
+     "duration_ms": 41.2, "user": "3f9a0c1d2b4e", "role": "user",
+     "content_type": null, "body": null, "body_size": 0}
+
+Nunca se guardan credenciales ni datos personales:
+- Authorization no se guarda: solo un seudónimo estable del usuario
+  (HMAC del id con SECRET_KEY) y su rol, para que el replay use un usuario
+  local del mismo rol
+- Lista blanca: solo se guardan los valores de los campos de SAFE_FIELDS
+  (ids, cantidades, filtros del catálogo...). El resto (contraseñas, tokens,
+  emails, nombres, códigos de ticket, texto libre...) se sustituye por "***"
+  en el cuerpo JSON, la query y los parámetros de ruta; un campo nuevo queda
+  borrado hasta que se añade a la lista
+- La ruta se reconstruye desde la plantilla de la ruta (/tickets/scan/***),
+  no sustituyendo texto en la URL
+- Los cuerpos que no son JSON o pasan de TRAFFIC_CAPTURE_MAX_BODY_BYTES no se
+  guardan (solo su tamaño)
+
+En Vercel solo se puede escribir en /tmp (TRAFFIC_CAPTURE_PATH por defecto).
+Cada línea se escribe en una sola llamada en modo append: varios workers
+pueden compartir el fichero. Un error de escritura se registra y no afecta a
+la respuesta.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import random
+import re
+import time
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode
+
+from auth import cached_role, decode_token_cached
+from config import settings
+
+logger = logging.getLogger("njoy.traffic")
+
+SCRUBBED = "***"
+
+# Campos (de cuerpo, query o ruta) cuyo valor se guarda; el de cualquier otro
+# se sustituye por SCRUBBED
+SAFE_FIELDS = frozenset({
+    # Ids y paginación
+    "id", "item_id", "evento_id", "ticket_id", "user_id", "usuario_id", "team_id", "member_id",
+    "localidad_id", "genero_id", "creador_id", "equipos_ids", "skip", "limit",
+    # Compras y escaneo
+    "cantidad", "metodo_pago", "include_history",
+    # Filtros del catálogo, calendario y mapa
+    "tipo", "fecha_desde", "fecha_hasta", "month", "per_day", "precio_min", "precio_max",
+    "order_by_distance", "bbox", "zoom", "tiles",
+    # Gestión (admin / promotor)
+    "role", "is_active", "is_banned", "activado", "venta_pausada", "estado", "status_update",
+    "plazas", "precio", "fechayhora", "dry_run", "max_batches", "retention_days",
+})
+
+# Parámetro de una plantilla de ruta: {nombre} o {nombre:convertidor}
+_ROUTE_PARAM = re.compile(r"{(\w+)(?::\w+)?}")
+
+_file = None
+
+
+def _safe(key: str) -> bool:
+    return key.lower() in SAFE_FIELDS
+
+
+def scrub(value):
+    """Copia de un cuerpo JSON con solo los valores de SAFE_FIELDS"""
+    if isinstance(value, dict):
+        return {
+            key: scrub(item) if _safe(key) or item is None or isinstance(item, (dict, list)) else SCRUBBED
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [scrub(item) for item in value]
+    return value
+
+
+def _scrub_query(query_string: bytes) -> str:
+    pairs = parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)
+    scrubbed = [(key, value if _safe(key) else SCRUBBED) for key, value in pairs]
+    return urlencode(scrubbed, safe="*")
+
+
+def _scrub_path(scope) -> str:
+    """Ruta rellenada desde su plantilla, con los parámetros que no son seguros borrados"""
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        # Sin ruta (404): no hay parámetros que separar de la URL
+        return scope["path"]
+    params = scope.get("path_params") or {}
+
+    def fill(match):
+        name = match.group(1)
+        return str(params.get(name, SCRUBBED)) if _safe(name) else SCRUBBED
+
+    return _ROUTE_PARAM.sub(fill, template)
+
+
+def _user(token: Optional[str]):
+    """(seudónimo, rol) del usuario del token; el rol sale de la caché de principals"""
+    if not token:
+        return None, None
+    try:
+        user_id = int(decode_token_cached(token)["sub"])
+    except Exception:
+        return None, None
+    digest = hmac.new(settings.SECRET_KEY.encode(), str(user_id).encode(), hashlib.sha256).hexdigest()
+    return digest[:12], cached_role(user_id)
+
+
+def _write(record: dict) -> None:
+    """Añadir una línea a la captura; un error de E/S se registra y la línea se pierde"""
+    global _file
+    try:
+        if _file is None:
+            _file = open(settings.TRAFFIC_CAPTURE_PATH, "a", encoding="utf-8")
+        _file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        _file.flush()
+    except OSError:
+        logger.exception("No se pudo escribir la captura de tráfico en %s", settings.TRAFFIC_CAPTURE_PATH)
+        if _file is not None:
+            try:
+                _file.close()
+            except OSError:
+                pass
+            # Se vuelve a abrir en la siguiente petición
+            _file = None
+
+
+# ============================================
+# MIDDLEWARE
+# ============================================
+
+class TrafficCaptureMiddleware:
+    """Middleware ASGI que guarda una muestra de las peticiones"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= settings.TRAFFIC_CAPTURE_SAMPLE_RATE:
+            return await self.app(scope, receive, send)
+
+        content_type = token = None
+        for name, value in scope["headers"]:
+            if name == b"content-type":
+                content_type = value.decode("latin-1")
+            elif name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                token = token if scheme.lower() == "bearer" else None
+
+        chunks = []
+        body_size = 0
+        status_code = 500
+
+        async def receive_and_keep():
+            nonlocal body_size
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                body_size += len(body)
+                if body_size <= settings.TRAFFIC_CAPTURE_MAX_BODY_BYTES:
+                    chunks.append(body)
+            return message
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        ts = time.time()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_and_keep, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            body = None
+            if chunks and body_size <= settings.TRAFFIC_CAPTURE_MAX_BODY_BYTES and "json" in (content_type or ""):
+                try:
+                    body = scrub(json.loads(b"".join(chunks)))
+                except ValueError:
+                    body = None
+            user, role = _user(token)
+            route = scope.get("route")
+            _write({
+                "ts": round(ts, 3),
+                "method": scope["method"],
+                "path": _scrub_path(scope),
+                "query": _scrub_query(scope.get("query_string", b"")),
+                "route": getattr(route, "path", None),
+                "status": status_code,
+                "duration_ms": round(duration * 1000, 1),
+                "user": user,
+                "role": role,
+                "content_type": content_type,
+                "body": body,
+                "body_size": body_size,
+            })